@@ -0,0 +1,177 @@
+# backend/admission.py
+"""
+Control de admisión de la API de ingesta
+- Limita las requests de ingesta en vuelo
+- Mide la presión del servidor: lag del event loop, llenado de las colas
+  del dispatcher y requests en vuelo
+- Bajo presión responde 503 con Retry-After calculado (barato) en vez de
+  encolar trabajo que terminaría en timeout
+- Descarta primero los tipos de menor valor: walkers antes que donaciones
+"""
+import math
+import random
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from backend import event_dispatcher
+from backend import event_schemas
+from backend import metrics
+from backend.utils.logger import log_sampled
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+INGEST_ROUTES = ("/simulate_donation", "/events/bulk",
+                 "/rooms/{room}/simulate_donation", "/rooms/{room}/events/bulk")
+
+MAX_INFLIGHT = 256          # requests de ingesta simultáneas (tope duro)
+LOOP_LAG_LIMIT = 0.2        # segundos de lag que cuentan como presión 1.0
+QUEUE_FILL_LIMIT = 0.8      # fracción de la capacidad de las colas = presión 1.0
+
+# Prioridad por tipo de evento (mayor = se descarta más tarde)
+EVENT_PRIORITY = {
+    "walker": 0,
+    "donation": 2
+}
+DEFAULT_PRIORITY = 1        # eventos personalizados
+BULK_PRIORITY = 1
+
+# Presión a partir de la cual se rechaza cada prioridad
+SHED_THRESHOLDS = {
+    0: 0.5,
+    1: 0.75,
+    2: 1.0
+}
+
+RETRY_AFTER_BASE = 1        # segundos por unidad de presión
+RETRY_AFTER_MAX = 30
+
+# ==========================================
+# ESTADO
+# ==========================================
+inflight = 0
+
+admission_stats = {
+    "admitted": 0,
+    "rejected": 0,
+    # "all": rechazo sin clasificar (tope de requests en vuelo o presión máxima)
+    "rejected_by_priority": {**{str(priority): 0 for priority in SHED_THRESHOLDS}, "all": 0}
+}
+
+admission_rejected = metrics.Counter(
+    "dotlemor_admission_rejected_total", "Requests de ingesta rechazadas con 503",
+    ("route", "priority")
+)
+metrics.Gauge(
+    "dotlemor_admission_inflight", "Requests de ingesta en vuelo",
+    collect=lambda: inflight
+)
+metrics.Gauge(
+    "dotlemor_admission_pressure", "Presión actual del servidor (1.0 = límite)",
+    collect=lambda: pressure()
+)
+
+# ==========================================
+# PRESIÓN
+# ==========================================
+def pressure() -> float:
+    """
+    Presión del servidor: el máximo de las señales normalizadas
+    (1.0 = en el límite configurado)
+    """
+    lag = metrics.event_loop_lag.value / LOOP_LAG_LIMIT
+
+    capacity = len(event_dispatcher.connected_clients) * event_dispatcher.SEND_QUEUE_SIZE
+    queued = event_dispatcher.backpressure_stats["queued_messages"]
+    queue_fill = (queued / capacity) / QUEUE_FILL_LIMIT if capacity else 0.0
+
+    return max(lag, queue_fill, inflight / MAX_INFLIGHT)
+
+def retry_after(current: float, priority: Optional[int]) -> int:
+    """
+    Segundos sugeridos: crecen con la presión y son mayores para las
+    prioridades bajas; con jitter para no sincronizar los reintentos
+    """
+    if priority is None:
+        priority = min(SHED_THRESHOLDS)
+    seconds = RETRY_AFTER_BASE * max(current, 1.0) * (1 + max(SHED_THRESHOLDS) - priority)
+    seconds *= 1 + random.random()
+    return max(1, min(RETRY_AFTER_MAX, math.ceil(seconds)))
+
+def overloaded_for(event_type: Optional[str]) -> bool:
+    """
+    True si la presión actual descarta eventos de este tipo
+    (ingesta que no pasa por el middleware, p. ej. acciones por WebSocket)
+    """
+    return pressure() >= SHED_THRESHOLDS[_event_priority(event_type)]
+
+def _event_priority(event_type) -> int:
+    if not isinstance(event_type, str):
+        return DEFAULT_PRIORITY
+    return EVENT_PRIORITY.get(event_type, DEFAULT_PRIORITY)
+
+async def _request_priority(request: web.Request) -> int:
+    """Prioridad de una request de ingesta según el tipo de evento"""
+    if metrics.route_label(request).endswith("/events/bulk"):
+        # El bulk puede ser NDJSON en streaming: no se lee el body aquí
+        return BULK_PRIORITY
+    try:
+        # Lectura acotada y cacheada en la request: el handler no la repite
+        data = await event_schemas.read_json_body(request)
+    except Exception:
+        return DEFAULT_PRIORITY   # el handler responderá 400 / 413
+    if not isinstance(data, dict):
+        return DEFAULT_PRIORITY
+    return _event_priority(data.get("type"))
+
+def _reject(request: web.Request, current: float, priority: Optional[int]) -> web.Response:
+    label = "all" if priority is None else str(priority)
+    admission_stats["rejected"] += 1
+    admission_stats["rejected_by_priority"][label] += 1
+    admission_rejected.labels(metrics.route_label(request), label).inc()
+    seconds = retry_after(current, priority)
+    log_sampled(
+        f"🚦 Sobrecarga (presión {current:.2f}): 503 a {request.remote} en {request.path}",
+        level="warning", priority=label
+    )
+    return web.json_response(
+        {"status": "error", "message": "Server overloaded, retry later", "retry_after": seconds},
+        status=503,
+        headers={"Retry-After": str(seconds)}
+    )
+
+# ==========================================
+# MIDDLEWARE
+# ==========================================
+@web.middleware
+async def admission_middleware(request: web.Request, handler):
+    """Admite o rechaza (503) las requests de ingesta según la presión"""
+    global inflight
+    if request.method != "POST" or metrics.route_label(request) not in INGEST_ROUTES:
+        return await handler(request)
+
+    current = pressure()
+
+    if inflight >= MAX_INFLIGHT or current >= SHED_THRESHOLDS[max(SHED_THRESHOLDS)]:
+        # Ni las donaciones entran: rechazar sin leer el body
+        return _reject(request, current, None)
+    if current >= SHED_THRESHOLDS[min(SHED_THRESHOLDS)]:
+        priority = await _request_priority(request)
+        if current >= SHED_THRESHOLDS[priority]:
+            return _reject(request, current, priority)
+
+    admission_stats["admitted"] += 1
+    inflight += 1
+    try:
+        return await handler(request)
+    finally:
+        inflight -= 1
+
+def get_stats() -> Dict:
+    return {
+        **admission_stats,
+        "inflight": inflight,
+        "max_inflight": MAX_INFLIGHT,
+        "pressure": round(pressure(), 3)
+    }
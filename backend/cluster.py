@@ -0,0 +1,560 @@
+# backend/cluster.py
+"""
+Modo multi-proceso de DotLemor
+- N workers comparten el puerto con SO_REUSEPORT
+- Un broker local (socket Unix en el proceso maestro) reparte cada evento
+  de broadcast() a todos los workers, incluido el que lo originó
+- Cada worker publica sus estadísticas para que /stats y /ws/stats
+  reporten totales del cluster
+
+Protocolo del broker: una línea por mensaje
+    H<worker_id>\\n      saludo inicial del worker
+    E<json>\\n           evento publicado por un worker
+    E<seq> <json>\\n     evento reenviado por el broker con su número de
+                        secuencia global (el JSON no se parsea)
+    B<n> <json>\\n        lote de n eventos (lista JSON) publicado por un worker
+    B<seq> <json>\\n      lote reenviado; <seq> es la secuencia del primero
+    S<json>\\n           estadísticas de un worker / tabla de todos los workers
+    I<id> <json>\\n       worker: reclama una Idempotency-Key ([ruta, ip, clave]);
+                        broker: respuesta a ese reclamo (ver idempotency)
+    R<json>\\n           resultado de una clave reclamada {"key", "result"}
+Los eventos de una sala que no es la por defecto llevan el prefijo
+"@<sala> " tras la letra (E@<sala> <json>, B@<sala> <seq> <json>...);
+el broker numera cada sala por separado. Recuerda las MAX_ROOM_SEQS salas
+usadas más recientemente; una sala olvidada que vuelve a publicar sigue
+por encima de toda secuencia ya emitida (nunca retrocede para un cliente)
+"""
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from backend import event_dispatcher
+from backend import idempotency
+from backend import metrics
+from backend.utils.logger import log, log_sampled
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+STATS_INTERVAL = 1.0                 # segundos entre reportes de estadísticas
+MAX_LINE = 16 * 1024 * 1024          # tamaño máximo de un mensaje del broker
+MAX_WORKER_BUFFER = 64 * 1024 * 1024 # buffer de salida máximo hacia un worker
+RESTART_DELAY = 1.0                  # espera antes de relanzar un worker caído
+RECONNECT_DELAY = 0.5                # primera espera para reconectar al broker
+RECONNECT_MAX_DELAY = 10.0           # espera máxima entre reintentos (backoff x2)
+MAX_ROOM_SEQS = 4 * event_dispatcher.MAX_ROOMS  # salas cuya secuencia recuerda el broker
+
+# ==========================================
+# ESTADO DEL WORKER
+# ==========================================
+worker_state = {
+    "worker_id": None,
+    "workers": {},     # worker_id -> {fuente: estadísticas}
+    "message_errors": 0,  # mensajes del broker descartados por error
+    "reconnects": 0
+}
+
+# fuente -> (función que retorna estadísticas locales, claves no sumables)
+stats_sources: Dict[str, tuple] = {}
+
+def register_stats_source(name: str, collect: Callable[[], dict], keep: tuple = ()):
+    """
+    Registra una fuente de estadísticas que se agrega entre workers
+    Las claves en `keep` (configuración) se toman del worker local sin sumar
+    """
+    stats_sources[name] = (collect, frozenset(keep))
+
+def is_worker() -> bool:
+    return worker_state["worker_id"] is not None
+
+def aggregate(name: str, local: dict) -> dict:
+    """
+    Suma las estadísticas locales con las últimas reportadas por los demás
+    workers. Las listas solo se reportan del worker local.
+    Fuera del modo cluster retorna `local` sin cambios.
+    """
+    if not is_worker():
+        return local
+
+    keep = stats_sources.get(name, (None, frozenset()))[1]
+    own_id = str(worker_state["worker_id"])
+    total = dict(local)
+    for worker_id, snapshot in worker_state["workers"].items():
+        if worker_id != own_id and name in snapshot:
+            total = _sum_stats(total, snapshot[name], keep)
+
+    total["cluster"] = {
+        "worker_id": worker_state["worker_id"],
+        "workers": max(len(worker_state["workers"]), 1),
+        "message_errors": worker_state["message_errors"],
+        "reconnects": worker_state["reconnects"]
+    }
+    return total
+
+def _sum_stats(base: dict, other: dict, keep: frozenset) -> dict:
+    """Suma recursiva de valores numéricos (bool y claves en `keep` se conservan)"""
+    result = dict(base)
+    for key, value in other.items():
+        current = result.get(key)
+        if key in keep or isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)) and isinstance(current, (int, float)):
+            result[key] = current + value
+        elif isinstance(value, dict) and isinstance(current, dict):
+            result[key] = _sum_stats(current, value, keep)
+        elif current is None:
+            result[key] = value
+    return result
+
+def _strip_lists(stats: dict) -> dict:
+    """Quita listas (p. ej. client_list) de un reporte para el broker"""
+    return {
+        key: _strip_lists(value) if isinstance(value, dict) else value
+        for key, value in stats.items()
+        if not isinstance(value, list)
+    }
+
+# ==========================================
+# WORKER
+# ==========================================
+async def join_cluster(worker_id: int, broker_path: str) -> asyncio.Task:
+    """
+    Conecta este worker al broker e instala el publicador del dispatcher
+    Retorna la tarea que mantiene el enlace (reconecta si se cae)
+    """
+    worker_state["worker_id"] = worker_id
+    metrics.set_constant_labels(worker=worker_id)
+    link = await _connect(worker_id, broker_path)
+    log(f"🔗 Worker {worker_id} conectado al broker")
+    return asyncio.create_task(_stay_connected(worker_id, broker_path, link))
+
+async def _connect(worker_id: int, broker_path: str) -> tuple:
+    """
+    Abre el socket del broker, saluda e instala publicador y coordinador
+    Retorna (reader, writer, reclamos pendientes, liberar)
+    """
+    reader, writer = await asyncio.open_unix_connection(broker_path, limit=MAX_LINE)
+    writer.write(f"H{worker_id}\n".encode())
+
+    async def publish(events: list, room: str = event_dispatcher.DEFAULT_ROOM):
+        prefix = b"" if room == event_dispatcher.DEFAULT_ROOM else b"@%s " % room.encode()
+        if len(events) == 1:
+            writer.write(b"E" + prefix + json.dumps(events[0]).encode() + b"\n")
+        else:
+            writer.write(b"B%s%d %s\n" % (prefix, len(events), json.dumps(events).encode()))
+        await writer.drain()
+
+    # Reclamos de Idempotency-Key pendientes: id -> (futuro, clave)
+    claims: Dict[int, tuple] = {}
+    claim_ids = itertools.count(1)
+
+    async def claim(key: list) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        request_id = next(claim_ids)
+        claims[request_id] = (future, key)
+        writer.write(b"I%d %s\n" % (request_id, json.dumps(key).encode()))
+        try:
+            return await future
+        finally:
+            # Cancelado: la respuesta del broker se atiende igual (_resolve_claim)
+            if not future.done():
+                future.cancel()
+
+    def release(key: list, result: Optional[dict]):
+        writer.write(b"R" + json.dumps({"key": key, "result": result}).encode() + b"\n")
+
+    event_dispatcher.set_publisher(publish)
+    idempotency.set_coordinator(claim, release)
+    return reader, writer, claims, release
+
+async def _stay_connected(worker_id: int, broker_path: str, link: tuple):
+    """
+    Atiende el enlace con el broker y lo restablece si se cae
+    Mientras tanto el worker entrega solo localmente
+    """
+    while True:
+        await _worker_loop(*link)
+        delay = RECONNECT_DELAY
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                link = await _connect(worker_id, broker_path)
+                break
+            except OSError as e:
+                log_sampled(f"⚠️ Worker {worker_id}: broker no disponible ({e})", level="warning")
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        worker_state["reconnects"] += 1
+        log(f"🔗 Worker {worker_id} reconectado al broker")
+
+def _resolve_claim(claims: Dict[int, tuple], line: bytes, release: Callable):
+    """Entrega la respuesta del broker a un reclamo de Idempotency-Key"""
+    request_id, _, reply = line[1:-1].partition(b" ")
+    future, key = claims.pop(int(request_id), (None, None))
+    if future is None:
+        return
+    reply = json.loads(reply)
+    if future.done():
+        # Quien reclamó ya no espera: devolver la clave si quedó a su cargo
+        if reply.get("owner"):
+            release(key, None)
+        return
+    future.set_result(reply)
+
+def _handle_broker_line(line: bytes, claims: Dict[int, tuple], release: Callable):
+    """Procesa un mensaje del broker"""
+    kind = line[:1]
+    if kind == b"E":
+        room, body = _split_room(line[1:-1])
+        seq, _, message = body.decode().partition(" ")
+        event_dispatcher.deliver_local(json.loads(message), message, int(seq), room)
+    elif kind == b"B":
+        room, body = _split_room(line[1:-1])
+        first_seq, _, payload = body.partition(b" ")
+        event_dispatcher.deliver_local_many(json.loads(payload), int(first_seq), room)
+    elif kind == b"S":
+        worker_state["workers"] = json.loads(line[1:])
+    elif kind == b"I":
+        _resolve_claim(claims, line, release)
+
+async def _worker_loop(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                       claims: Dict[int, tuple], release: Callable):
+    """
+    Recibe eventos/estadísticas del broker y reporta las propias
+    Retorna cuando se pierde la conexión. Un mensaje que falla se descarta
+    sin cortar el enlace
+    """
+    reporter = asyncio.create_task(_report_stats(writer))
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                _handle_broker_line(line, claims, release)
+            except Exception as e:
+                worker_state["message_errors"] += 1
+                log_sampled(f"❌ Mensaje del broker descartado ({line[:1]!r}): {e}", level="error")
+
+    except Exception as e:
+        # Lectura fallida (conexión rota o línea sobre MAX_LINE)
+        log(f"❌ Error en conexión con el broker: {e}", level="error")
+    finally:
+        reporter.cancel()
+        # Sin broker, seguir entregando localmente (y deduplicar por worker)
+        event_dispatcher.set_publisher(None)
+        idempotency.set_coordinator(None)
+        for future, _ in claims.values():
+            if not future.done():
+                future.set_exception(ConnectionError("broker desconectado"))
+        claims.clear()
+        writer.close()
+        log("⚠️ Worker desconectado del broker; entrega solo local", level="warning")
+
+def _split_room(body: bytes) -> tuple:
+    """Separa el prefijo "@<sala> " de un mensaje. Retorna (sala o None, resto)"""
+    if body[:1] != b"@":
+        return None, body
+    room, _, rest = body[1:].partition(b" ")
+    return room.decode(), rest
+
+async def _report_stats(writer: asyncio.StreamWriter):
+    """Envía periódicamente las estadísticas locales al broker"""
+    while True:
+        await asyncio.sleep(STATS_INTERVAL)
+        try:
+            snapshot = {
+                name: _strip_lists(collect())
+                for name, (collect, _) in stats_sources.items()
+            }
+            writer.write(b"S" + json.dumps(snapshot).encode() + b"\n")
+            await writer.drain()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log(f"❌ Error al reportar estadísticas: {e}", level="error")
+
+# ==========================================
+# BROKER
+# ==========================================
+class SharedKeys:
+    """
+    Idempotency-Keys de todo el cluster (en el broker)
+    La primera request con una clave queda a cargo del worker que la
+    reclamó; los reclamos de otros workers esperan su resultado. LRU con
+    TTL y los mismos topes que la caché de cada worker
+    """
+
+    def __init__(self, reply: Callable[[str, int, dict], None]):
+        self.reply = reply
+        # clave (JSON) -> [dueño o None, resultado o None, vence, bytes, esperando]
+        self.entries: "OrderedDict[bytes, list]" = OrderedDict()
+        self.bytes = 0
+
+    def claim(self, worker_id: str, request_id: int, key: bytes):
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] is None and entry[2] <= now:
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.entries[key] = [worker_id, None, now + idempotency.TTL, 0, []]
+            self._evict(now)
+            self.reply(worker_id, request_id, {"owner": True})
+        elif entry[1] is not None:
+            self.entries.move_to_end(key)
+            self.reply(worker_id, request_id, entry[1])
+        else:
+            entry[4].append((worker_id, request_id))
+
+    def release(self, worker_id: str, key: bytes, result: Optional[dict]):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != worker_id:
+            return
+        waiting = entry[4]
+        if result is None:
+            # Sin respuesta reutilizable: el siguiente en espera la procesa
+            if not waiting:
+                self._drop(key)
+                return
+            entry[0], request_id = waiting.pop(0)
+            self.reply(entry[0], request_id, {"owner": True})
+            return
+        entry[0] = None
+        entry[1] = result
+        entry[3] = len(result.get("body") or "")
+        self.bytes += entry[3]
+        entry[4] = []
+        for waiter_id, request_id in waiting:
+            self.reply(waiter_id, request_id, result)
+        self._evict(time.monotonic())
+
+    def forget_worker(self, worker_id: str):
+        """Libera las claves a cargo de un worker desconectado"""
+        for key, entry in list(self.entries.items()):
+            entry[4] = [waiter for waiter in entry[4] if waiter[0] != worker_id]
+            if entry[0] == worker_id:
+                self.release(worker_id, key, None)
+
+    def _drop(self, key: bytes):
+        entry = self.entries.pop(key)
+        self.bytes -= entry[3]
+
+    def _evict(self, now: float):
+        """
+        Expulsa desde el extremo LRU hasta respetar los topes
+        Las claves en curso se saltean sin detener el barrido
+        """
+        excess = len(self.entries) - idempotency.MAX_ENTRIES
+        excess_bytes = self.bytes - idempotency.MAX_BYTES
+        victims = []
+        for key, entry in self.entries.items():
+            if entry[2] > now and excess <= 0 and excess_bytes <= 0:
+                break
+            if entry[0] is not None:
+                # En curso (con quienes la esperan): se conserva
+                continue
+            victims.append(key)
+            excess -= 1
+            excess_bytes -= entry[3]
+        for key in victims:
+            self._drop(key)
+
+class Broker:
+    """Reparte eventos entre workers y consolida sus estadísticas"""
+
+    def __init__(self):
+        self.writers: Dict[str, asyncio.StreamWriter] = {}
+        self.keys = SharedKeys(self._reply)
+        self.snapshots: Dict[str, dict] = {}
+        self.events_forwarded = 0
+        # Secuencia por sala (b"": la sala por defecto), LRU acotada.
+        # seq_floor: la mayor secuencia de una sala olvidada
+        self.seqs: "OrderedDict[bytes, int]" = OrderedDict()
+        self.seq_floor = 0
+
+    async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        hello = await reader.readline()
+        if hello[:1] != b"H":
+            writer.close()
+            return
+        worker_id = hello[1:-1].decode()
+        self.writers[worker_id] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                kind = line[:1]
+                if kind == b"E":
+                    self._forward(line)
+                elif kind == b"B":
+                    self._forward_batch(line)
+                elif kind == b"S":
+                    self.snapshots[worker_id] = json.loads(line[1:])
+                elif kind == b"I":
+                    request_id, _, key = line[1:-1].partition(b" ")
+                    self.keys.claim(worker_id, int(request_id), key)
+                elif kind == b"R":
+                    message = json.loads(line[1:])
+                    key = json.dumps(message["key"]).encode()
+                    self.keys.release(worker_id, key, message["result"])
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log(f"❌ Broker: error con worker {worker_id}: {e}", level="error")
+        finally:
+            # Sin reemplazo por una reconexión (o expulsado por lento)
+            if self.writers.get(worker_id, writer) is writer:
+                self.writers.pop(worker_id, None)
+                self.snapshots.pop(worker_id, None)
+                self.keys.forget_worker(worker_id)
+            writer.close()
+
+    def _reply(self, worker_id: str, request_id: int, reply: dict):
+        writer = self.writers.get(worker_id)
+        if writer is not None:
+            writer.write(b"I%d %s\n" % (request_id, json.dumps(reply).encode()))
+
+    def _room_prefix(self, body: bytes) -> tuple:
+        """Retorna (prefijo "@<sala> " o b"", resto del mensaje)"""
+        if body[:1] != b"@":
+            return b"", body
+        room, _, rest = body.partition(b" ")
+        return room + b" ", rest
+
+    def _forward(self, line: bytes):
+        """
+        Reenvía un evento a todos los workers sin parsearlo
+        Le antepone el número de secuencia de su sala: un único orden total
+        por sala
+        """
+        prefix, message = self._room_prefix(line[1:])
+        seq = self._reserve_seqs(prefix, 1)
+        self.events_forwarded += 1
+        self._send_all(b"E%s%d %s" % (prefix, seq, message))
+
+    def _forward_batch(self, line: bytes):
+        """Reenvía un lote reservando un rango consecutivo de secuencias de su sala"""
+        prefix, body = self._room_prefix(line[1:])
+        count, _, payload = body.partition(b" ")
+        first_seq = self._reserve_seqs(prefix, int(count))
+        self.events_forwarded += int(count)
+        self._send_all(b"B%s%d %s" % (prefix, first_seq, payload))
+
+    def _reserve_seqs(self, prefix: bytes, count: int) -> int:
+        """
+        Reserva `count` secuencias consecutivas de una sala. Retorna la primera
+        Una sala nueva (u olvidada) empieza sobre seq_floor: los workers que
+        aún la tienen abierta no ven retroceder la secuencia
+        """
+        last = self.seqs.pop(prefix, None)
+        if last is None:
+            last = self.seq_floor
+        self.seqs[prefix] = last + count
+        if len(self.seqs) > MAX_ROOM_SEQS:
+            _, forgotten = self.seqs.popitem(last=False)
+            self.seq_floor = max(self.seq_floor, forgotten)
+        return last + 1
+
+    def _send_all(self, line: bytes):
+        for worker_id, writer in list(self.writers.items()):
+            if writer.transport.get_write_buffer_size() > MAX_WORKER_BUFFER:
+                log(f"🐢 Broker: worker {worker_id} no consume eventos, desconectado", level="warning")
+                del self.writers[worker_id]
+                self.keys.forget_worker(worker_id)
+                writer.close()
+                continue
+            writer.write(line)
+
+    async def publish_stats(self):
+        """Envía la tabla de estadísticas de todos los workers a cada worker"""
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            line = b"S" + json.dumps(self.snapshots).encode() + b"\n"
+            for writer in list(self.writers.values()):
+                writer.write(line)
+
+# ==========================================
+# PROCESO MAESTRO
+# ==========================================
+def run_cluster(workers: int, config: dict = None):
+    """
+    Lanza el broker y `workers` procesos que comparten el puerto
+    `config` se aplica sobre main.CONFIG en cada worker
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("SO_REUSEPORT no está disponible en esta plataforma")
+
+    broker_path = os.path.join(tempfile.gettempdir(), f"dotlemor-{os.getpid()}.sock")
+    try:
+        asyncio.run(_master(workers, broker_path, config or {}))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(broker_path):
+            os.unlink(broker_path)
+
+async def _master(workers: int, broker_path: str, config: dict):
+    broker = Broker()
+    server = await asyncio.start_unix_server(broker.handle_worker, broker_path, limit=MAX_LINE)
+    stats_task = asyncio.create_task(broker.publish_stats())
+    log(f"🧩 Broker escuchando en {broker_path} ({workers} workers)")
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = {}
+
+    def spawn(worker_id: int):
+        process = ctx.Process(
+            target=_worker_entry,
+            args=(worker_id, broker_path, config),
+            name=f"dotlemor-worker-{worker_id}"
+        )
+        process.start()
+        processes[worker_id] = process
+
+    for worker_id in range(workers):
+        spawn(worker_id)
+
+    # SIGTERM detiene el cluster igual que Ctrl+C
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), RESTART_DELAY)
+                break
+            except asyncio.TimeoutError:
+                pass
+            for worker_id, process in list(processes.items()):
+                if not process.is_alive():
+                    log(f"⚠️ Worker {worker_id} terminó (código {process.exitcode}); relanzando", level="warning")
+                    spawn(worker_id)
+    finally:
+        stats_task.cancel()
+        # terminate() envía SIGTERM: cada worker drena sus WebSockets
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            process.join(event_dispatcher.DRAIN_TIMEOUT + 5)
+        server.close()
+        log("👋 Cluster finalizado")
+
+def _worker_entry(worker_id: int, broker_path: str, config: dict):
+    """Punto de entrada de cada proceso worker"""
+    from backend import main as server
+
+    server.CONFIG.update(config)
+    try:
+        asyncio.run(server.main(worker_id=worker_id, broker_path=broker_path))
+    except KeyboardInterrupt:
+        pass
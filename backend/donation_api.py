@@ -1,44 +1,77 @@
 # backend/donation_api.py
 import asyncio
+import json
 from aiohttp import web
 import aiohttp_cors
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime
 
 # Importar tus utilidades existentes
 from backend.utils.logger import log
-from backend.event_dispatcher import broadcast
+from backend.event_dispatcher import broadcast, broadcast_many, broadcast_to_client, add_message_handler
+from backend import event_dispatcher
+from backend import rate_limiter
+from backend import admission
+from backend import cluster
+from backend import event_ledger
+from backend import event_schemas
+from backend import idempotency
+from backend.instrumentation import phase
 
 # ==========================================
 # CONFIGURACIÓN
 # ==========================================
 RATE_LIMIT_REQUESTS = 10  # máximo de requests
 RATE_LIMIT_WINDOW = 60    # por minuto
-MAX_AMOUNT = 10000
-MAX_USER_LENGTH = 50
-MAX_MESSAGE_LENGTH = 200
+MAX_AMOUNT = event_schemas.MAX_AMOUNT
+MAX_USER_LENGTH = event_schemas.MAX_USER_LENGTH
+MAX_MESSAGE_LENGTH = event_schemas.MAX_MESSAGE_LENGTH
+MAX_EVENT_BODY = event_schemas.MAX_EVENT_BODY   # bytes máximos de un evento
+
+# Ingesta masiva (/events/bulk)
+BULK_RATE_LIMIT_REQUESTS = 10        # requests masivas por ventana
+BULK_CHUNK_SIZE = 100                # eventos aceptados por broadcast
+BULK_MAX_BODY = 1024 * 1024          # bytes máximos de un array JSON
+BULK_MAX_EVENTS = 1000               # eventos máximos por request (array o NDJSON)
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/jsonlines")
 
 # ==========================================
 # RATE LIMITING
 # ==========================================
-request_tracker = defaultdict(list)
+rate_limiter.configure_route("/simulate_donation", RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW)
+rate_limiter.configure_route("/events/bulk", BULK_RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW)
 
-def check_rate_limit(ip: str) -> bool:
-    """Verifica si la IP ha excedido el rate limit"""
-    now = datetime.now()
-    cutoff = now - timedelta(seconds=RATE_LIMIT_WINDOW)
-    
-    # Limpiar requests antiguos
-    request_tracker[ip] = [
-        req_time for req_time in request_tracker[ip] 
-        if req_time > cutoff
-    ]
-    
-    if len(request_tracker[ip]) >= RATE_LIMIT_REQUESTS:
-        return False
-    
-    request_tracker[ip].append(now)
-    return True
+def check_rate_limit(ip: str, route: str = "/simulate_donation", room: str = None) -> bool:
+    """
+    Verifica si la IP ha excedido el rate limit de la ruta
+    Cada sala tiene su propio cupo por IP
+    """
+    return rate_limiter.check_route(route, ip if room is None else f"{ip}@{room}")
+
+# ==========================================
+# SALAS
+# ==========================================
+def request_room(request) -> tuple:
+    """
+    Sala de la request: /rooms/{room}/... (None: la sala por defecto)
+    Retorna (sala o None, respuesta de error o None)
+    """
+    name = request.match_info.get("room")
+    if name is None or name == event_dispatcher.DEFAULT_ROOM:
+        return None, None
+    if not event_dispatcher.valid_room_name(name):
+        return None, web.json_response({"status": "error", "message": "Invalid room name"}, status=404)
+    room = event_dispatcher.get_room(name)
+    if room is None:
+        return None, web.json_response(
+            {"status": "error", "message": "Too many rooms"},
+            status=503, headers={"Retry-After": "30"}
+        )
+    return room, None
+
+ROOM_LIMITED = "Room rate limit exceeded"
+
+def room_limited_response() -> web.Response:
+    return web.json_response({"status": "error", "message": ROOM_LIMITED}, status=429)
 
 # ==========================================
 # VALIDACIONES
@@ -46,64 +79,83 @@ def check_rate_limit(ip: str) -> bool:
 def validate_donation_data(data: dict) -> tuple[bool, str, dict]:
     """
     Valida y sanitiza los datos de donación
+    Delegado al registro de esquemas compilados (event_schemas)
     Retorna: (es_válido, mensaje_error, datos_sanitizados)
     """
+    return event_schemas.validate_event(data)
+
+# ==========================================
+# INGESTA
+# ==========================================
+async def ingest_event(data, client_ip: str, room=None) -> tuple[bool, str, dict]:
+    """
+    Valida, persiste y difunde un evento individual
+    Compartido por /simulate_donation y las acciones por WebSocket
+    `room`: sala destino (None: la sala por defecto). Solo los eventos
+    válidos consumen su cupo; si lo excede, el error es ROOM_LIMITED
+    Retorna: (es_válido, mensaje_error, evento_sanitizado)
+    """
+    # Validar y sanitizar
+    with phase("validate"):
+        is_valid, error_msg, sanitized_event = validate_donation_data(data)
+    if not is_valid:
+        log(f"❌ Validación fallida desde {client_ip}: {error_msg}", level="error")
+        return False, error_msg, {}
+    if room is not None:
+        if not room.admit():
+            return False, ROOM_LIMITED, {}
+        sanitized_event["room"] = room.name
+    
+    # Log del evento
+    event_type = sanitized_event.get("type")
+    if event_type == "walker":
+        log(f"🚶 Walker creado: {sanitized_event.get('user')} (IP: {client_ip})")
+    elif event_type == "donation":
+        log(f"💸 Donación: ${sanitized_event.get('amount')} de {sanitized_event.get('user')} (IP: {client_ip})")
+    else:
+        log(f"✨ Evento {event_type} desde {client_ip}")
+    
+    # Persistir en el ledger (solo encola: el fsync va en lote)
+    event_ledger.append(sanitized_event)
+    
+    # Broadcasting a WebSockets
     try:
-        # Tipo de evento
-        event_type = data.get("type", "donation")
-        
-        # Usuario
-        user = str(data.get("user", "Anónimo"))[:MAX_USER_LENGTH]
-        
-        if event_type == "walker":
-            # Para walkers solo necesitamos el usuario
-            sanitized = {
-                "type": "walker",
-                "user": user,
-                "timestamp": datetime.now().isoformat()
-            }
-            return True, "", sanitized
-            
-        elif event_type == "donation":
-            # Para donaciones validamos el monto
-            amount = data.get("amount")
-            
-            # Validar que amount sea numérico
-            try:
-                amount = float(amount)
-            except (TypeError, ValueError):
-                return False, "Amount must be a number", {}
-            
-            # Validar rango
-            if amount <= 0:
-                return False, "Amount must be positive", {}
-            if amount > MAX_AMOUNT:
-                return False, f"Amount exceeds maximum (${MAX_AMOUNT})", {}
-            
-            # Mensaje opcional
-            message = str(data.get("message", ""))[:MAX_MESSAGE_LENGTH]
-            
-            sanitized = {
-                "type": "donation",
-                "user": user,
-                "amount": round(amount, 2),
-                "message": message,
-                "timestamp": datetime.now().isoformat()
-            }
-            return True, "", sanitized
-            
-        else:
-            # Evento personalizado
-            sanitized = {
-                "type": event_type,
-                "data": data,
-                "timestamp": datetime.now().isoformat()
-            }
-            return True, "", sanitized
-            
+        with phase("broadcast"):
+            await broadcast(sanitized_event, room and room.name)
     except Exception as e:
-        log(f"❌ Error en validación: {e}")
-        return False, "Invalid data format", {}
+        log(f"⚠️ Error en broadcast: {e}", level="warning")
+        # No fallar la request por error en broadcast
+    
+    return True, "", sanitized_event
+
+async def handle_ws_action(record, data: dict):
+    """
+    Acción enviada por WebSocket: {"type": "action", "id": ..., "event": {...}}
+    Mismo límite por IP, control de admisión y validación que
+    /simulate_donation; el evento va a la sala del cliente.
+    Responde {"type": "action_result", ...} al cliente
+    """
+    result = {"type": "action_result"}
+    action_id = data.get("id")
+    if isinstance(action_id, int) or (isinstance(action_id, str) and len(action_id) <= 64):
+        result["id"] = action_id
+    
+    event = data.get("event")
+    room = None if record.room is event_dispatcher.default_room else record.room
+    if not check_rate_limit(record.ip or "", room=room and room.name):
+        result.update(status="error", message="Rate limit exceeded")
+    elif admission.overloaded_for(event.get("type", "donation") if isinstance(event, dict) else None):
+        result.update(status="error", message="Server overloaded, retry later")
+    else:
+        is_valid, error_msg, sanitized_event = await ingest_event(event, record.ip, room)
+        if is_valid:
+            result.update(status="ok", event=sanitized_event)
+        else:
+            result.update(status="error", message=error_msg)
+    
+    await broadcast_to_client(record.ws, result)
+
+add_message_handler("action", handle_ws_action)
 
 # ==========================================
 # RUTAS
@@ -111,69 +163,254 @@ def validate_donation_data(data: dict) -> tuple[bool, str, dict]:
 routes = web.RouteTableDef()
 
 @routes.post("/simulate_donation")
+@routes.post("/rooms/{room}/simulate_donation")
 async def simulate_donation(request):
     """
     Endpoint para simular donaciones, walkers y eventos personalizados.
+    /rooms/{room}/simulate_donation difunde solo a los clientes de la sala
     """
     client_ip = request.remote
+    room, error = request_room(request)
+    if error is not None:
+        return error
+    room_name = room and room.name
     
     try:
-        # 1. Rate limiting
-        if not check_rate_limit(client_ip):
-            log(f"⚠️ Rate limit excedido: {client_ip}")
+        # 1. Rate limiting (por IP y sala; el cupo total de la sala se
+        #    consume al ingerir, solo con eventos válidos)
+        if not check_rate_limit(client_ip, room=room_name):
+            log(f"⚠️ Rate limit excedido: {client_ip}", level="warning")
             return web.json_response(
                 {"status": "error", "message": "Rate limit exceeded"},
                 status=429
             )
-        
-        # 2. Parsear datos
+        # 2. Parsear datos (con tope: el body se rechaza antes de parsearlo)
         try:
-            data = await request.json()
+            with phase("parse"):
+                data = await event_schemas.read_json_body(request, MAX_EVENT_BODY)
+        except event_schemas.BodyTooLarge as e:
+            log(f"⚠️ Body demasiado grande desde {client_ip}", level="warning")
+            return event_schemas.body_too_large_response(e)
         except Exception:
             return web.json_response(
                 {"status": "error", "message": "Invalid JSON"},
                 status=400
             )
         
-        # 3. Validar y sanitizar
-        is_valid, error_msg, sanitized_event = validate_donation_data(data)
+        # 3-6. Validar, persistir y difundir
+        is_valid, error_msg, sanitized_event = await ingest_event(data, client_ip, room)
         
+        if error_msg is ROOM_LIMITED:
+            return room_limited_response()
         if not is_valid:
-            log(f"❌ Validación fallida desde {client_ip}: {error_msg}")
             return web.json_response(
                 {"status": "error", "message": error_msg},
                 status=400
             )
         
-        # 4. Log del evento
-        event_type = sanitized_event.get("type")
-        if event_type == "walker":
-            log(f"🚶 Walker creado: {sanitized_event['user']} (IP: {client_ip})")
-        elif event_type == "donation":
-            log(f"💸 Donación: ${sanitized_event['amount']} de {sanitized_event['user']} (IP: {client_ip})")
-        else:
-            log(f"✨ Evento {event_type} desde {client_ip}")
-        
-        # 5. Broadcasting a WebSockets
-        try:
-            await broadcast(sanitized_event)
-        except Exception as e:
-            log(f"⚠️ Error en broadcast: {e}")
-            # No fallar la request por error en broadcast
-        
-        # 6. Respuesta exitosa
+        # 7. Respuesta exitosa
         return web.json_response({
             "status": "ok",
             "event": sanitized_event
         }, status=200)
         
     except Exception as e:
-        log(f"❌ Error interno en simulate_donation: {e}")
+        log(f"❌ Error interno en simulate_donation: {e}", level="error")
+        return web.json_response(
+            {"status": "error", "message": "Internal server error"},
+            status=500
+        )
+
+@routes.post("/events/bulk")
+@routes.post("/rooms/{room}/events/bulk")
+async def bulk_events(request):
+    """
+    Ingesta masiva de eventos
+    - Body JSON array: responde con un resultado por item
+    - Body NDJSON (application/x-ndjson): se procesa en streaming y la
+      respuesta es NDJSON, un resultado por línea más un resumen final
+    Los eventos aceptados se difunden juntos, en bloques de BULK_CHUNK_SIZE
+    El rate limit cuenta requests: cada una admite hasta BULK_MAX_EVENTS
+    En una sala, cada evento consume cupo de la sala; los que lo exceden
+    se rechazan individualmente
+    """
+    client_ip = request.remote
+    room, error = request_room(request)
+    if error is not None:
+        return error
+    
+    if not check_rate_limit(client_ip, "/events/bulk", room and room.name):
+        log(f"⚠️ Rate limit excedido (bulk): {client_ip}", level="warning")
+        return web.json_response(
+            {"status": "error", "message": "Rate limit exceeded"},
+            status=429
+        )
+    
+    try:
+        if request.content_type in NDJSON_CONTENT_TYPES:
+            return await _bulk_ndjson(request, client_ip, room)
+        return await _bulk_json_array(request, client_ip, room)
+        
+    except Exception as e:
+        log(f"❌ Error interno en bulk_events: {e}", level="error")
         return web.json_response(
             {"status": "error", "message": "Internal server error"},
             status=500
         )
 
+def _validate_bulk_item(index: int, item, room=None) -> tuple[dict, dict]:
+    """Valida un item de la ingesta masiva. Retorna (resultado, evento o None)"""
+    if not isinstance(item, dict):
+        return {"index": index, "status": "error", "message": "Item must be an object"}, None
+    
+    with phase("validate"):
+        is_valid, error_msg, sanitized_event = validate_donation_data(item)
+    if not is_valid:
+        return {"index": index, "status": "error", "message": error_msg}, None
+    if room is not None:
+        if not room.admit():
+            return {"index": index, "status": "error", "message": ROOM_LIMITED}, None
+        sanitized_event["room"] = room.name
+    return {"index": index, "status": "ok"}, sanitized_event
+
+async def _flush_bulk_chunk(chunk: list, room=None):
+    """Persiste y difunde un bloque de eventos aceptados"""
+    if not chunk:
+        return
+    for event in chunk:
+        event_ledger.append(event)
+    try:
+        with phase("broadcast"):
+            await broadcast_many(chunk, room and room.name)
+    except Exception as e:
+        log(f"⚠️ Error en broadcast masivo: {e}", level="warning")
+    chunk.clear()
+
+async def _bulk_json_array(request, client_ip: str, room=None):
+    """Procesa un body JSON array de tamaño acotado"""
+    try:
+        with phase("parse"):
+            body = await event_schemas.read_body(request, BULK_MAX_BODY)
+            items = json.loads(body or b"null")
+    except event_schemas.BodyTooLarge as e:
+        return event_schemas.body_too_large_response(e, ", use NDJSON")
+    except Exception:
+        return web.json_response(
+            {"status": "error", "message": "Invalid JSON"},
+            status=400
+        )
+    
+    if not isinstance(items, list):
+        return web.json_response(
+            {"status": "error", "message": "Body must be a JSON array"},
+            status=400
+        )
+    if len(items) > BULK_MAX_EVENTS:
+        return web.json_response(
+            {"status": "error", "message": f"Too many events (max {BULK_MAX_EVENTS})"},
+            status=413
+        )
+    
+    results = []
+    chunk = []
+    accepted = 0
+    for index, item in enumerate(items):
+        result, event = _validate_bulk_item(index, item, room)
+        results.append(result)
+        if event is not None:
+            accepted += 1
+            chunk.append(event)
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                await _flush_bulk_chunk(chunk, room)
+    await _flush_bulk_chunk(chunk, room)
+    
+    rejected = len(results) - accepted
+    log(f"📥 Ingesta masiva desde {client_ip}: {accepted} aceptado(s), {rejected} rechazado(s)")
+    
+    return web.json_response({
+        "status": "ok",
+        "accepted": accepted,
+        "rejected": rejected,
+        "results": results
+    })
+
+async def _bulk_ndjson(request, client_ip: str, room=None):
+    """
+    Procesa un body NDJSON en streaming
+    La memoria usada es O(BULK_CHUNK_SIZE) sin importar el largo del stream
+    Tras prepare() la respuesta ya empezó: los errores se informan en la
+    línea de resumen, nunca con otra respuesta
+    """
+    response = web.StreamResponse(
+        status=200,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    await response.prepare(request)
+    
+    accepted = 0
+    rejected = 0
+    index = 0
+    chunk = []
+    pending_results = []
+    error = None
+    
+    try:
+        async for line in request.content:
+            line = line.strip()
+            if not line:
+                continue
+            if index >= BULK_MAX_EVENTS:
+                error = f"Too many events (max {BULK_MAX_EVENTS})"
+                break
+            
+            if len(line) > MAX_EVENT_BODY:
+                # Tope por evento, igual que en /simulate_donation
+                result, event = {"index": index, "status": "error",
+                                 "message": f"Event exceeds {MAX_EVENT_BODY} bytes"}, None
+            else:
+                try:
+                    with phase("parse"):
+                        item = json.loads(line)
+                except ValueError:
+                    result, event = {"index": index, "status": "error", "message": "Invalid JSON"}, None
+                else:
+                    result, event = _validate_bulk_item(index, item, room)
+            index += 1
+            
+            pending_results.append(json.dumps(result))
+            if event is not None:
+                accepted += 1
+                chunk.append(event)
+            else:
+                rejected += 1
+            
+            if len(pending_results) >= BULK_CHUNK_SIZE:
+                await _flush_bulk_chunk(chunk, room)
+                await response.write(("\n".join(pending_results) + "\n").encode())
+                pending_results.clear()
+                
+    except ValueError:
+        # Línea más larga que el buffer del lector
+        error = "Line too long"
+    except Exception as e:
+        log(f"❌ Error interno en ingesta NDJSON: {e}", level="error")
+        error = "Internal server error"
+    
+    await _flush_bulk_chunk(chunk, room)
+    
+    summary = {"status": "error" if error else "done", "accepted": accepted, "rejected": rejected}
+    if error:
+        summary["message"] = error
+    pending_results.append(json.dumps(summary))
+    try:
+        await response.write(("\n".join(pending_results) + "\n").encode())
+        await response.write_eof()
+    except ConnectionError as e:
+        log(f"⚠️ Cliente desconectado durante la ingesta NDJSON: {e}", level="warning")
+    
+    log(f"📥 Ingesta NDJSON desde {client_ip}: {accepted} aceptado(s), {rejected} rechazado(s)")
+    return response
+
 @routes.get("/health")
 async def health_check(request):
     """Endpoint para verificar salud del servidor"""
@@ -183,17 +420,25 @@ async def health_check(request):
         "version": "1.0.0"
     })
 
+def collect_stats() -> dict:
+    """Estadísticas de la API de este proceso"""
+    limits = rate_limiter.get_stats()
+    
+    return {
+        "total_requests_last_minute": sum(l["allowed_last_minute"] for l in limits.values()),
+        "active_ips": max((l["active_keys"] for l in limits.values()), default=0),
+        "rate_limits": limits,
+        "ledger": event_ledger.get_stats(),
+        "admission": admission.get_stats(),
+        "idempotency": idempotency.get_stats()
+    }
+
 @routes.get("/stats")
 async def get_stats(request):
-    """Endpoint para estadísticas del servidor"""
-    total_requests = sum(len(reqs) for reqs in request_tracker.values())
-    active_ips = len(request_tracker)
-    
-    return web.json_response({
-        "total_requests_last_minute": total_requests,
-        "active_ips": active_ips,
-        "timestamp": datetime.now().isoformat()
-    })
+    """Endpoint para estadísticas del servidor (agregadas entre workers)"""
+    stats = cluster.aggregate("api", collect_stats())
+    stats["timestamp"] = datetime.now().isoformat()
+    return web.json_response(stats)
 
 # ==========================================
 # INICIALIZACIÓN DEL SERVIDOR
@@ -1,37 +1,412 @@
 # backend/event_dispatcher.py
 import asyncio
+import itertools
 import json
-from typing import Set
+import math
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Union
 from aiohttp import web, WSMsgType
-from backend.utils.logger import log
+from backend.utils.logger import log, log_sampled
+from backend import liveness
+from backend import metrics
+from backend import rate_limiter
+from backend import wire
 
-# Set de clientes WebSocket conectados
-connected_clients: Set[web.WebSocketResponse] = set()
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+SEND_QUEUE_SIZE = 256               # mensajes pendientes máximos por cliente
+SLOW_CLIENT_POLICY = "drop_oldest"  # política para clientes lentos
+SLOW_CLIENT_POLICIES = ("drop_oldest", "drop_newest", "disconnect")
+
+BATCH_ENABLED = False               # agrupar eventos en frames "batch"
+BATCH_WINDOW_MS = 25                # ventana máxima de espera de un lote
+BATCH_MAX_EVENTS = 100              # tamaño máximo de un lote
+
+REPLAY_BUFFER_SIZE = 1000           # eventos recientes guardados para reconexión
+REPLAY_MAX_AGE = 300                # segundos máximos de antigüedad para replay
+
+MAX_TOPICS_PER_CLIENT = 32          # tipos de evento por suscripción
+MAX_TOPIC_LENGTH = 50
+
+# permessage-deflate (si el cliente lo ofrece). Comprime por cliente:
+# ahorra egress a cambio de CPU. DOTLEMOR_WS_COMPRESS=0 lo desactiva
+WS_COMPRESS = os.environ.get("DOTLEMOR_WS_COMPRESS", "1") != "0"
+
+CLIENT_PAGE_SIZE = 50              # clientes por página en /ws/stats
+CLIENT_PAGE_MAX = 500
+
+# Mensajes entrantes (cliente -> servidor)
+MAX_INBOUND_BYTES = 4096            # frames más grandes: cierre 1009 (aiohttp)
+INBOUND_RATE = 10                   # mensajes por segundo por conexión
+INBOUND_BURST = 20
+INBOUND_IP_REQUESTS = 100           # mensajes por IP (todas sus conexiones)
+INBOUND_IP_WINDOW = 2               # por cada 2 segundos
+MAX_VIOLATIONS = 20                 # mensajes rechazados tolerados...
+VIOLATION_WINDOW = 10               # ...por cada 10 segundos
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_INTERNAL_ERROR = 1011         # fallo al enviar: el cliente debe reconectar
+WRITER_CLOSE_TIMEOUT = 2.0          # espera máxima del cierre tras un fallo de envío
+
+# Drenado al apagar (SIGTERM)
+DRAIN_TIMEOUT = 20.0                # segundos máximos para cerrar a todos
+DRAIN_WAVE_SIZE = 200               # clientes cerrados por ola
+DRAIN_WAVE_INTERVAL = 0.25          # segundos entre olas (se acorta si no alcanza)
+DRAIN_FLUSH_TIMEOUT = 2.0           # espera máxima a que se vacíe una cola
+RECONNECT_RATE = 200                # reconexiones por segundo a repartir
+RECONNECT_MIN = 1.0                 # segundos mínimos sugeridos para reconectar
+CLOSE_SERVICE_RESTART = 1012
+
+# Carriles de prioridad por cliente
+# - alto: donaciones, control y todo lo demás (orden de secuencia)
+# - bajo: tipos de poco valor; solo se envían con el carril alto vacío
+# Si un cliente se atrasa, los eventos bajos pendientes se fusionan en
+# un único frame (tipo bajo -> tipo fusionado)
+LOW_PRIORITY_TYPES = {"walker": "walkers"}
+LOW_LANE_SIZE = 64                  # entradas bajas pendientes por cliente
+CONFLATE_MAX_USERS = 20             # usuarios listados en un frame fusionado
+
+# Salas (/ws/{sala}, /rooms/{sala}/...): cada stream tiene su propio
+# registro, secuencia, replay, límites y estadísticas. /ws usa DEFAULT_ROOM
+DEFAULT_ROOM = "default"
+ROOM_NAME_PATTERN = re.compile(r"[a-z0-9][a-z0-9_-]{0,31}")
+MAX_ROOMS = 1000                    # salas activas por proceso
+ROOM_MAX_CLIENTS = 10_000           # conexiones por sala
+ROOM_IDLE_TTL = REPLAY_MAX_AGE      # segundos que sobrevive una sala vacía
+ROOM_EVENT_RATE = 50                # eventos ingeridos por segundo por sala
+ROOM_EVENT_BURST = 500
+
+# ==========================================
+# REGISTRO DE CLIENTES
+# ==========================================
+class ClientRecord:
+    """
+    Estado y contadores de una conexión WebSocket
+    topics=None: suscrito a todos los tipos
+    """
+    __slots__ = ("id", "ws", "ip", "room", "connected_at", "binary", "high", "low", "wakeup", "writer",
+                 "topics", "bytes_sent", "frames_sent", "dropped", "conflated", "acked_seq", "acked_at",
+                 "last_received", "last_sent", "ping_sent_at",
+                 "inbound", "violations", "messages_received", "messages_rejected")
+
+    def __init__(self, client_id: int, ws: web.WebSocketResponse, ip: Optional[str], binary: bool,
+                 room: "Room"):
+        self.id = client_id
+        self.ws = ws
+        self.ip = ip
+        self.room = room
+        self.connected_at = time.time()
+        self.binary = binary
+        # Carriles de salida (ver LOW_PRIORITY_TYPES) y aviso a la escritora
+        self.high: deque = deque()
+        self.low: deque = deque()
+        self.wakeup = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.topics: Optional[FrozenSet[str]] = None
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.acked_seq: Optional[int] = None
+        self.acked_at: Optional[float] = None
+        # Liveness (instantes monotónicos, los inicializa liveness.watch)
+        self.last_received = 0.0
+        self.last_sent = 0.0
+        self.ping_sent_at: Optional[float] = None
+        # Límites de mensajes entrantes
+        self.inbound = rate_limiter.TokenBucket(INBOUND_RATE, INBOUND_BURST)
+        self.violations = rate_limiter.TokenBucket(MAX_VIOLATIONS / VIOLATION_WINDOW, MAX_VIOLATIONS)
+        self.messages_received = 0
+        self.messages_rejected = 0
+
+    def pending(self) -> int:
+        """Mensajes en cola entre ambos carriles"""
+        return len(self.high) + len(self.low)
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        return {
+            "id": self.id,
+            "ip": self.ip,
+            "room": self.room.name,
+            "connected_for": round(now - self.connected_at, 1),
+            "protocol": wire.PROTOCOL_MSGPACK if self.binary else wire.PROTOCOL_JSON,
+            "topics": ["*"] if self.topics is None else sorted(self.topics),
+            "closed": self.ws.closed,
+            "queue_depth": len(self.high),
+            "low_queue_depth": len(self.low),
+            "bytes_sent": self.bytes_sent,
+            "frames_sent": self.frames_sent,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "messages_received": self.messages_received,
+            "messages_rejected": self.messages_rejected,
+            "acked_seq": self.acked_seq,
+            "ack_lag": None if self.acked_seq is None else max(0, self.room.last_seq - self.acked_seq),
+            "acked_ago": None if self.acked_at is None else round(now - self.acked_at, 1)
+        }
+
+class Room:
+    """
+    Sala: un stream con su propio registro de clientes, suscripciones,
+    secuencia, replay, lote pendiente, límite de ingesta y contadores
+    Un broadcast solo recorre los clientes de su sala
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # Clientes de la sala: WebSocket -> registro, y por id en orden de conexión
+        self.clients: Dict[web.WebSocketResponse, ClientRecord] = {}
+        self.clients_by_id: Dict[int, ClientRecord] = {}
+        # Suscripciones por tipo de evento
+        # - wildcard_clients: reciben todo (por defecto al conectar)
+        # - topic_index: tipo -> clientes suscritos a ese tipo
+        self.wildcard_clients: Set[web.WebSocketResponse] = set()
+        self.topic_index: Dict[str, Set[web.WebSocketResponse]] = {}
+        self.clients_per_ip: Dict[str, int] = {}
+        # Agregados mantenidos incrementalmente (nunca se recorren los clientes)
+        # - binary: clientes con el subprotocolo MessagePack
+        # - acked / acked_seq_sum: clientes que confirmaron y suma de sus seq
+        #   (lag medio = last_seq - acked_seq_sum / acked)
+        self.aggregates = {
+            "binary": 0,
+            "acked": 0,
+            "acked_seq_sum": 0,
+            "bytes_sent": 0,
+            "frames_sent": 0,
+            "peak_clients": 0,
+            "queued_messages": 0,
+            "dropped_messages": 0,
+            "events": 0,
+            "rejected_events": 0
+        }
+        # Número de secuencia del último evento y buffer circular de replay
+        # Entradas: (seq, instante monotónico, evento)
+        self.last_seq = 0
+        self.replay_buffer: deque = deque(maxlen=REPLAY_BUFFER_SIZE)
+        # Lote de eventos pendiente y su temporizador de flush
+        self.pending_batch: list = []
+        self.batch_timer: Optional[asyncio.TimerHandle] = None
+        # Límite de ingesta de la sala (todas las IPs): una sala muy activa
+        # no consume el event loop de las demás
+        self.ingest = rate_limiter.TokenBucket(ROOM_EVENT_RATE, ROOM_EVENT_BURST)
+        self.teardown_timer: Optional[asyncio.TimerHandle] = None
+        self.created_at = time.time()
+
+    def admit(self, count: int = 1) -> bool:
+        """Consume cupo de ingesta de la sala. False: la sala excede su límite"""
+        if self.ingest.take(count):
+            return True
+        self.aggregates["rejected_events"] += count
+        return False
+
+    def is_full(self) -> bool:
+        return len(self.clients) >= ROOM_MAX_CLIENTS
+
+# Salas activas. La sala por defecto (/ws y rutas sin sala) nunca se elimina
+rooms: Dict[str, Room] = {}
+default_room = rooms[DEFAULT_ROOM] = Room(DEFAULT_ROOM)
+
+room_stats = {
+    "created": 0,
+    "torn_down": 0,
+    "rejected_full": 0,      # salas nuevas rechazadas por MAX_ROOMS
+    "rejected_clients": 0    # conexiones rechazadas por sala llena
+}
+
+# Clientes conectados de todas las salas: WebSocket -> registro (búsqueda y baja en O(1))
+connected_clients: Dict[web.WebSocketResponse, ClientRecord] = {}
+clients_by_id: Dict[int, ClientRecord] = {}
+_client_ids = itertools.count(1)
+
+# Agregados del proceso (todas las salas)
+client_aggregates = {
+    "binary": 0,
+    "bytes_sent": 0,
+    "frames_sent": 0,
+    "peak_clients": 0
+}
+
+# Publicador externo (modo cluster): recibe una lista de eventos y su sala
+# y los entrega a todos los workers, incluido este, a través de deliver_local()
+_publisher: Optional[Callable[[list, str], Awaitable[None]]] = None
+
+# Observadores de los eventos entregados (agregados derivados, p. ej. el
+# leaderboard). Se llaman en cada worker con cada evento secuenciado de
+# la sala por defecto
+event_listeners: List[Callable[[dict], None]] = []
+
+# Proveedores de un mensaje inicial para cada cliente nuevo de la sala por
+# defecto (p. ej. el snapshot del mundo). Retornan un evento o None
+join_listeners: List[Callable[[web.WebSocketResponse], Optional[dict]]] = []
+
+# Handlers de mensajes del cliente por tipo: handler(registro, datos)
+MessageHandler = Callable[["ClientRecord", dict], Union[None, Awaitable[None]]]
+message_handlers: Dict[str, MessageHandler] = {}
+
+# True durante el apagado: no se aceptan WebSockets nuevos
+draining = False
+drain_stats = {
+    "closed": 0,
+    "waves": 0,
+    "unflushed": 0           # clientes cerrados con mensajes aún en cola
+}
+
+inbound_stats = {
+    "received": 0,
+    "rejected": 0,           # por límite de conexión o de IP
+    "invalid": 0,            # JSON/MessagePack inválido o tipo desconocido
+    "abusive_closes": 0
+}
+
+# Contadores de backpressure
+backpressure_stats = {
+    "queued_messages": 0,      # total en todas las colas (mantenido incrementalmente)
+    "dropped_messages": 0,
+    "slow_disconnects": 0
+}
+
+# Carril bajo: eventos fusionados y descartados bajo presión
+lane_stats = {
+    "low_enqueued": 0,
+    "conflated_frames": 0,   # frames fusionados enviados
+    "conflated_events": 0,   # eventos que viajaron dentro de esos frames
+    "folds": 0,              # entradas plegadas en la siguiente al llenarse el carril
+    "low_dropped": 0
+}
+
+batch_stats = {
+    "batches_sent": 0,
+    "batched_events": 0
+}
+
+# Métricas leídas al momento del scrape: O(1) (o O(salas)), sin recorrer clientes
+metrics.Gauge(
+    "dotlemor_ws_connected_clients", "Clientes WebSocket conectados",
+    collect=lambda: len(connected_clients)
+)
+metrics.Gauge(
+    "dotlemor_ws_queued_messages", "Mensajes pendientes en las colas de salida",
+    collect=lambda: backpressure_stats["queued_messages"]
+)
+metrics.Gauge(
+    "dotlemor_ws_dropped_messages", "Mensajes descartados por clientes lentos",
+    collect=lambda: backpressure_stats["dropped_messages"]
+)
+metrics.Gauge(
+    "dotlemor_ws_conflated_events", "Eventos de baja prioridad fusionados en un solo frame",
+    collect=lambda: lane_stats["conflated_events"]
+)
+metrics.Gauge(
+    "dotlemor_replay_buffered_events", "Eventos en los buffers de replay",
+    collect=lambda: sum(len(room.replay_buffer) for room in rooms.values())
+)
+metrics.Gauge(
+    "dotlemor_rooms_active", "Salas activas en este proceso",
+    collect=lambda: len(rooms)
+)
+
+# ==========================================
+# SALAS
+# ==========================================
+
+def valid_room_name(name: str) -> bool:
+    return isinstance(name, str) and ROOM_NAME_PATTERN.fullmatch(name) is not None
+
+def get_room(name: Optional[str] = None, create: bool = True) -> Optional[Room]:
+    """
+    Sala por nombre (None: la sala por defecto). Se crea al primer uso
+    Retorna None si no existe (create=False) o si ya hay MAX_ROOMS salas
+    El nombre debe validarse antes con valid_room_name()
+    """
+    if name is None or name == DEFAULT_ROOM:
+        return default_room
+    room = rooms.get(name)
+    if room is not None or not create:
+        return room
+    if len(rooms) >= MAX_ROOMS:
+        room_stats["rejected_full"] += 1
+        log_sampled(f"🚪 Límite de salas alcanzado ({MAX_ROOMS}): rechazada '{name}'", level="warning")
+        return None
+    room = rooms[name] = Room(name)
+    room_stats["created"] += 1
+    log(f"🚪 Sala creada: {name} (activas: {len(rooms)})")
+    _schedule_teardown(room)
+    return room
+
+def _schedule_teardown(room: Room):
+    """
+    (Re)programa la eliminación de una sala sin clientes
+    Sobrevive ROOM_IDLE_TTL para que una reconexión encuentre su replay
+    """
+    if room is default_room:
+        return
+    if room.teardown_timer is not None:
+        room.teardown_timer.cancel()
+    room.teardown_timer = asyncio.get_running_loop().call_later(ROOM_IDLE_TTL, _teardown_room, room)
+
+def _teardown_room(room: Room):
+    room.teardown_timer = None
+    if room.clients or rooms.get(room.name) is not room:
+        return
+    if room.batch_timer is not None:
+        room.batch_timer.cancel()
+        room.batch_timer = None
+    del rooms[room.name]
+    room_stats["torn_down"] += 1
+    log(f"🚪 Sala inactiva eliminada: {room.name} (activas: {len(rooms)})")
 
 # ==========================================
 # GESTIÓN DE CLIENTES
 # ==========================================
 
-async def register_client(ws: web.WebSocketResponse) -> bool:
+async def register_client(ws: web.WebSocketResponse, ip: str = None, binary: bool = False,
+                          room: Room = None) -> bool:
     """
-    Registra un nuevo cliente WebSocket
+    Registra un nuevo cliente WebSocket en una sala (por defecto, la general)
+    Crea su registro, su cola de salida acotada y su tarea escritora
     Retorna True si se registró exitosamente
     """
+    room = room or default_room
     try:
-        connected_clients.add(ws)
-        log(f"✅ Cliente WebSocket conectado. Total: {len(connected_clients)}")
-        
-        # Enviar mensaje de bienvenida
+        record = ClientRecord(next(_client_ids), ws, ip, binary, room)
+        connected_clients[ws] = record
+        clients_by_id[record.id] = record
+        room.clients[ws] = record
+        room.clients_by_id[record.id] = record
+        room.wildcard_clients.add(ws)
+        if room.teardown_timer is not None:
+            room.teardown_timer.cancel()
+            room.teardown_timer = None
+        if binary:
+            client_aggregates["binary"] += 1
+            room.aggregates["binary"] += 1
+        if ip is not None:
+            room.clients_per_ip[ip] = room.clients_per_ip.get(ip, 0) + 1
+        client_aggregates["peak_clients"] = max(client_aggregates["peak_clients"], len(connected_clients))
+        room.aggregates["peak_clients"] = max(room.aggregates["peak_clients"], len(room.clients))
+        record.writer = asyncio.create_task(_client_writer(record))
+        liveness.watch(record)
+        metrics.ws_connections_opened.inc()
+        log(f"✅ Cliente WebSocket conectado ({room.name}). Total: {len(connected_clients)}")
+
+        # Enviar mensaje de bienvenida (por la cola, para conservar el orden)
         welcome_msg = {
             "type": "connection",
             "status": "connected",
-            "message": "Conectado al servidor DotLemor"
+            "message": "Conectado al servidor DotLemor",
+            "room": room.name,
+            "last_seq": room.last_seq
         }
-        await ws.send_json(welcome_msg)
-        return True
-        
+        return _enqueue(ws, json.dumps(welcome_msg))
+
     except Exception as e:
-        log(f"❌ Error al registrar cliente: {e}")
+        log(f"❌ Error al registrar cliente: {e}", level="error")
+        _remove_client(ws)
         return False
 
 async def unregister_client(ws: web.WebSocketResponse) -> bool:
@@ -40,100 +415,755 @@ async def unregister_client(ws: web.WebSocketResponse) -> bool:
     Retorna True si se eliminó exitosamente
     """
     try:
-        if ws in connected_clients:
-            connected_clients.remove(ws)
+        if _remove_client(ws):
             log(f"👋 Cliente WebSocket desconectado. Total: {len(connected_clients)}")
             return True
         return False
     except Exception as e:
-        log(f"❌ Error al desregistrar cliente: {e}")
+        log(f"❌ Error al desregistrar cliente: {e}", level="error")
         return False
 
+def _remove_client(ws: web.WebSocketResponse) -> bool:
+    """
+    Elimina el cliente y cancela su tarea escritora
+    Una sala que queda vacía se elimina tras ROOM_IDLE_TTL
+    Retorna True si el cliente estaba registrado
+    """
+    record = connected_clients.pop(ws, None)
+    if record is None:
+        return False
+    room = record.room
+
+    del clients_by_id[record.id]
+    del room.clients[ws]
+    del room.clients_by_id[record.id]
+    liveness.unwatch(record)
+    pending = record.pending()
+    backpressure_stats["queued_messages"] -= pending
+    room.aggregates["queued_messages"] -= pending
+    if record.writer is not None and record.writer is not asyncio.current_task():
+        record.writer.cancel()
+    _clear_subscription(record)
+
+    if record.binary:
+        client_aggregates["binary"] -= 1
+        room.aggregates["binary"] -= 1
+    if record.acked_seq is not None:
+        room.aggregates["acked"] -= 1
+        room.aggregates["acked_seq_sum"] -= record.acked_seq
+    if record.ip is not None:
+        remaining = room.clients_per_ip[record.ip] - 1
+        if remaining:
+            room.clients_per_ip[record.ip] = remaining
+        else:
+            del room.clients_per_ip[record.ip]
+    if not room.clients:
+        _schedule_teardown(room)
+
+    metrics.ws_connections_closed.inc()
+    return True
+
 def get_connected_count() -> int:
     """Retorna el número de clientes conectados"""
     return len(connected_clients)
 
+def get_client(ws: web.WebSocketResponse) -> Optional[ClientRecord]:
+    """Registro de un cliente conectado (o None)"""
+    return connected_clients.get(ws)
+
+def record_ack(ws: web.WebSocketResponse, seq: int) -> bool:
+    """
+    Registra la última secuencia confirmada por un cliente
+    ({"type": "ack", "seq": N}). Las confirmaciones no retroceden
+    """
+    record = connected_clients.get(ws)
+    if record is None or seq > record.room.last_seq:
+        return False
+    aggregates = record.room.aggregates
+    if record.acked_seq is None:
+        aggregates["acked"] += 1
+        aggregates["acked_seq_sum"] += seq
+        record.acked_seq = seq
+    elif seq > record.acked_seq:
+        aggregates["acked_seq_sum"] += seq - record.acked_seq
+        record.acked_seq = seq
+    record.acked_at = time.time()
+    return True
+
+# ==========================================
+# SUSCRIPCIONES
+# ==========================================
+
+def parse_topics(raw) -> Optional[list]:
+    """
+    Valida una lista de tipos de evento enviada por un cliente
+    Retorna None para "todos" ("*"); lanza ValueError si es inválida
+    """
+    if isinstance(raw, str):
+        raw = [topic for topic in raw.split(",") if topic]
+    if not isinstance(raw, list) or not all(isinstance(topic, str) for topic in raw):
+        raise ValueError("topics must be a list of strings")
+    if len(raw) > MAX_TOPICS_PER_CLIENT:
+        raise ValueError(f"too many topics (max {MAX_TOPICS_PER_CLIENT})")
+    if any(len(topic) > MAX_TOPIC_LENGTH for topic in raw):
+        raise ValueError(f"topic too long (max {MAX_TOPIC_LENGTH})")
+    if "*" in raw:
+        return None
+    return raw
+
+def subscribe(ws: web.WebSocketResponse, topics: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    """
+    Reemplaza la suscripción de un cliente
+    topics=None suscribe a todos los tipos. Retorna los tipos suscritos
+    """
+    record = connected_clients.get(ws)
+    if record is None:
+        return None
+
+    _clear_subscription(record)
+    if topics is None:
+        record.room.wildcard_clients.add(ws)
+        return None
+
+    topics = frozenset(topics)
+    record.topics = topics
+    topic_index = record.room.topic_index
+    for topic in topics:
+        topic_index.setdefault(topic, set()).add(ws)
+    return topics
+
+def unsubscribe(ws: web.WebSocketResponse, topics: Iterable[str]) -> Optional[FrozenSet[str]]:
+    """
+    Quita tipos de la suscripción explícita de un cliente
+    Un cliente suscrito a todos no cambia (primero debe elegir tipos)
+    """
+    record = connected_clients.get(ws)
+    if record is None or record.topics is None:
+        return None
+    return subscribe(ws, record.topics - set(topics))
+
+def _clear_subscription(record: ClientRecord):
+    ws = record.ws
+    room = record.room
+    room.wildcard_clients.discard(ws)
+    for topic in record.topics or ():
+        subscribers = room.topic_index.get(topic)
+        if subscribers is not None:
+            subscribers.discard(ws)
+            if not subscribers:
+                del room.topic_index[topic]
+    record.topics = None
+
+def _topic_of(event_data: dict) -> str:
+    topic = event_data.get("type")
+    return topic if isinstance(topic, str) else ""
+
+def _wants(ws: web.WebSocketResponse, event_data: dict) -> bool:
+    """True si el cliente está suscrito al tipo del evento"""
+    record = connected_clients.get(ws)
+    if record is None:
+        return False
+    if ws in record.room.wildcard_clients:
+        return True
+    return record.topics is not None and _topic_of(event_data) in record.topics
+
+# ==========================================
+# COLAS DE SALIDA
+# ==========================================
+
+async def _client_writer(record: ClientRecord):
+    """
+    Tarea escritora de un cliente: vacía sus colas hacia el socket
+    Un cliente lento solo se bloquea a sí mismo
+    El carril bajo solo se atiende con el alto vacío
+    Envía texto JSON o binario MessagePack según el subprotocolo negociado
+    """
+    ws = record.ws
+    high = record.high
+    binary = record.binary
+    room_aggregates = record.room.aggregates
+    sent = wire.bytes_sent.labels(wire.PROTOCOL_MSGPACK if binary else wire.PROTOCOL_JSON)
+    try:
+        while True:
+            if high:
+                message = high.popleft()
+                backpressure_stats["queued_messages"] -= 1
+                room_aggregates["queued_messages"] -= 1
+            elif record.low:
+                message = _take_low(record)
+            else:
+                record.wakeup.clear()
+                await record.wakeup.wait()
+                continue
+            if ws.closed:
+                log(f"⚠️ WebSocket ya cerrado, marcado para eliminación", level="warning")
+                metrics.ws_send_failures.labels("closed").inc()
+                break
+            if binary:
+                payload = wire.as_binary(message)
+                if payload.__class__ is bytes:
+                    await ws.send_bytes(payload)
+                else:
+                    await ws.send_str(payload)
+            else:
+                payload = wire.as_text(message)
+                await ws.send_str(payload)
+            size = len(payload)
+            record.last_sent = time.monotonic()
+            sent.inc(size)
+            record.bytes_sent += size
+            record.frames_sent += 1
+            client_aggregates["bytes_sent"] += size
+            client_aggregates["frames_sent"] += 1
+            room_aggregates["bytes_sent"] += size
+            room_aggregates["frames_sent"] += 1
+            
+    except asyncio.CancelledError:
+        return
+        
+    except ConnectionResetError:
+        log(f"⚠️ Conexión reseteada por cliente", level="warning")
+        metrics.ws_send_failures.labels("reset").inc()
+        
+    except Exception as e:
+        log(f"❌ Error al enviar a cliente: {type(e).__name__}: {e}", level="error")
+        metrics.ws_send_failures.labels("error").inc()
+    
+    # Cerrar antes de desregistrar (eso cancela esta tarea): sin el cierre
+    # el navegador seguiría "conectado" sin recibir nada y sin reconectar
+    if not ws.closed:
+        try:
+            await asyncio.wait_for(
+                ws.close(code=CLOSE_INTERNAL_ERROR, message=b"Send failure"), WRITER_CLOSE_TIMEOUT
+            )
+        except Exception:
+            pass
+    await unregister_client(ws)
+
+def _enqueue(ws: web.WebSocketResponse, message: wire.Message, low: tuple = None) -> bool:
+    """
+    Encola un mensaje ya serializado para un cliente sin bloquear
+    low: entrada del carril bajo (ver _low_entry); si no, va al carril alto
+    Aplica SLOW_CLIENT_POLICY si el carril alto está lleno
+    Retorna True si el mensaje quedó encolado
+    """
+    record = connected_clients.get(ws)
+    if record is None:
+        return False
+    if low is not None:
+        return _enqueue_low(record, low)
+    high = record.high
+    
+    if len(high) < SEND_QUEUE_SIZE:
+        high.append(message)
+        backpressure_stats["queued_messages"] += 1
+        record.room.aggregates["queued_messages"] += 1
+        record.wakeup.set()
+        return True
+    
+    if SLOW_CLIENT_POLICY == "drop_newest":
+        record.dropped += 1
+        backpressure_stats["dropped_messages"] += 1
+        record.room.aggregates["dropped_messages"] += 1
+        metrics.ws_send_failures.labels("dropped").inc()
+        return False
+    
+    if SLOW_CLIENT_POLICY == "disconnect":
+        _disconnect_slow_client(ws)
+        metrics.ws_send_failures.labels("slow_disconnect").inc()
+        return False
+    
+    # drop_oldest: descartar el mensaje más antiguo y encolar el nuevo
+    high.popleft()
+    high.append(message)
+    record.dropped += 1
+    backpressure_stats["dropped_messages"] += 1
+    record.room.aggregates["dropped_messages"] += 1
+    metrics.ws_send_failures.labels("dropped").inc()
+    return True
+
+def _enqueue_low(record: ClientRecord, entry: tuple) -> bool:
+    """
+    Encola en el carril bajo. Lleno: la entrada más antigua se pliega en
+    la siguiente (se conserva el conteo, no su frame) en vez de crecer
+    """
+    low = record.low
+    aggregates = record.room.aggregates
+    if len(low) >= LOW_LANE_SIZE:
+        kind, count, users, seq, _ = low.popleft()
+        backpressure_stats["queued_messages"] -= 1
+        aggregates["queued_messages"] -= 1
+        head = low[0] if low else None
+        if head is not None and head[0] == kind:
+            low[0] = (kind, count + head[1], (users + head[2])[:CONFLATE_MAX_USERS],
+                      max(seq, head[3]), None)
+            lane_stats["folds"] += 1
+        else:
+            record.dropped += count
+            lane_stats["low_dropped"] += count
+    low.append(entry)
+    backpressure_stats["queued_messages"] += 1
+    aggregates["queued_messages"] += 1
+    lane_stats["low_enqueued"] += 1
+    record.wakeup.set()
+    return True
+
+def _take_low(record: ClientRecord) -> wire.Message:
+    """
+    Saca del carril bajo el próximo mensaje a enviar
+    Una sola entrada se envía tal cual; varias del mismo tipo (el cliente
+    se atrasó) se fusionan: {"type": "walkers", "count": N, "users": [...]}
+    """
+    low = record.low
+    kind, count, users, seq, message = low.popleft()
+    taken = 1
+    if message is None or (low and low[0][0] == kind):
+        users = list(users)
+        while low and low[0][0] == kind:
+            _, more, more_users, more_seq, _ = low.popleft()
+            taken += 1
+            count += more
+            users.extend(more_users[:CONFLATE_MAX_USERS - len(users)])
+            seq = max(seq, more_seq)
+        frame = {"type": kind, "count": count, "users": users}
+        if seq:
+            # Posición para reanudar: el carril alto ya envió todo lo anterior
+            frame["seq"] = seq
+        message = json.dumps(frame)
+        record.conflated += count
+        lane_stats["conflated_frames"] += 1
+        lane_stats["conflated_events"] += count
+    backpressure_stats["queued_messages"] -= taken
+    record.room.aggregates["queued_messages"] -= taken
+    return message
+
+def _low_entry(events) -> Optional[tuple]:
+    """
+    Metadatos de carril bajo de un mensaje: (tipo fusionado, conteo,
+    usuarios, seq máxima), o None si algún evento es de prioridad alta
+    """
+    kinds = {LOW_PRIORITY_TYPES.get(_topic_of(event_data)) for event_data in events}
+    if len(kinds) != 1 or None in kinds:
+        return None
+    users = tuple(str(event_data.get("user", ""))
+                  for event_data in itertools.islice(events, CONFLATE_MAX_USERS))
+    return (kinds.pop(), len(events), users, max(event_data.get("seq", 0) for event_data in events))
+
+def _disconnect_slow_client(ws: web.WebSocketResponse):
+    """Desconecta un cliente cuya cola de salida se llenó"""
+    backpressure_stats["slow_disconnects"] += 1
+    _remove_client(ws)
+    log(f"🐢 Cliente lento desconectado. Total: {len(connected_clients)}")
+    if not ws.closed:
+        asyncio.create_task(ws.close(code=1008, message=b"Slow consumer"))
+
 # ==========================================
 # BROADCASTING
 # ==========================================
 
-async def broadcast(event_data: dict) -> dict:
+async def broadcast(event_data: dict, room: str = None) -> dict:
     """
-    Envía un evento JSON a todos los clientes WebSocket conectados
-    Retorna estadísticas del envío: {success: int, failed: int, total: int}
+    Encola un evento JSON para todos los clientes WebSocket de una sala
+    (None: la sala por defecto)
+    Serializa una sola vez y retorna sin esperar a los envíos
+    En modo cluster el evento se publica al broker, que lo reparte a
+    todos los workers (incluido este)
+    Retorna estadísticas del encolado: {success: int, failed: int, total: int}
     """
-    if not connected_clients:
-        log("⚠️ No hay clientes WebSocket conectados")
+    if _publisher is not None:
+        await _publisher([event_data], room or DEFAULT_ROOM)
+        return {"success": 0, "failed": 0, "total": len(connected_clients), "published": True}
+
+    return deliver_local(event_data, room=room)
+
+async def broadcast_many(events: list, room: str = None) -> dict:
+    """
+    Difunde varios eventos juntos: números de secuencia consecutivos y
+    un único frame {"type": "batch"} serializado una sola vez
+    """
+    if not events:
+        return {"success": 0, "failed": 0, "total": len(connected_clients)}
+
+    if _publisher is not None:
+        await _publisher(events, room or DEFAULT_ROOM)
+        return {"success": 0, "failed": 0, "total": len(connected_clients), "published": True}
+
+    return deliver_local_many(events, room=room)
+
+def deliver_local(event_data: dict, message: str = None, seq: int = None, room: str = None) -> dict:
+    """
+    Entrega un evento a los clientes de una sala conectados a este proceso
+    Le asigna el número de secuencia de la sala (o usa `seq`, asignado por
+    el broker) y lo guarda en el buffer de replay de la sala
+    `message` es el evento ya serializado, si se tiene (evita re-serializar)
+    Con BATCH_ENABLED el evento se agrega al lote pendiente
+    """
+    target = get_room(room)
+    if target is None:
         return {"success": 0, "failed": 0, "total": 0}
 
-    message = json.dumps(event_data)
-    total_clients = len(connected_clients)
-    
-    log(f"📢 Enviando evento a {total_clients} cliente(s): {event_data.get('type', 'unknown')}")
+    target.last_seq = target.last_seq + 1 if seq is None else seq
+    target.aggregates["events"] += 1
+    event_data = {**event_data, "seq": target.last_seq}
+    if message is not None:
+        message = _with_seq(message, target.last_seq)
+    _remember(target, event_data)
+
+    stats = _deliver(target, event_data, message)
+    _notify_listeners(target, (event_data,))
+    return stats
+
+def deliver_local_many(events: list, first_seq: int = None, room: str = None) -> dict:
+    """
+    Entrega varios eventos a los clientes locales de una sala como un solo lote
+    `first_seq` es la secuencia del primero, si la asignó el broker
+    """
+    target = get_room(room)
+    if target is None:
+        return {"success": 0, "failed": 0, "total": 0}
+
+    if first_seq is not None:
+        target.last_seq = first_seq - 1
+
+    stamped = []
+    for event_data in events:
+        target.last_seq += 1
+        event_data = {**event_data, "seq": target.last_seq}
+        _remember(target, event_data)
+        stamped.append(event_data)
+    target.aggregates["events"] += len(stamped)
+
+    if not target.clients:
+        stats = {"success": 0, "failed": 0, "total": 0}
+        _schedule_teardown(target)
+    elif BATCH_ENABLED:
+        for event_data in stamped:
+            stats = _add_to_batch(target, event_data)
+    else:
+        stats = _fanout_events(target, stamped)
+
+    _notify_listeners(target, stamped)
+    return stats
+
+def notify(event_data: dict, room: str = None) -> dict:
+    """
+    Entrega un evento solo a los clientes locales de una sala, sin número
+    de secuencia ni replay (eventos derivados o efímeros: leaderboard_delta)
+    """
+    target = get_room(room, create=False)
+    if target is None:
+        return {"success": 0, "failed": 0, "total": 0}
+    return _deliver(target, event_data)
+
+def add_event_listener(listener: Callable[[dict], None]):
+    """Registra un observador llamado con cada evento entregado (sala por defecto)"""
+    event_listeners.append(listener)
+
+def add_join_listener(listener: Callable[[web.WebSocketResponse], Optional[dict]]):
+    """Registra un proveedor de mensaje inicial para clientes nuevos (sala por defecto)"""
+    join_listeners.append(listener)
+
+def remove_event_listener(listener: Callable[[dict], None]):
+    """Quita un observador registrado con add_event_listener (si está)"""
+    if listener in event_listeners:
+        event_listeners.remove(listener)
+
+def remove_join_listener(listener: Callable[[web.WebSocketResponse], Optional[dict]]):
+    """Quita un proveedor registrado con add_join_listener (si está)"""
+    if listener in join_listeners:
+        join_listeners.remove(listener)
 
+def _send_join_messages(ws: web.WebSocketResponse):
+    for listener in join_listeners:
+        try:
+            event_data = listener(ws)
+            if event_data is not None and _wants(ws, event_data):
+                _enqueue(ws, json.dumps(event_data))
+        except Exception as e:
+            log(f"❌ Error en mensaje inicial: {e}", level="error")
+
+def _notify_listeners(room: Room, events):
+    # Los agregados derivados (leaderboard, mundo) son de la sala por defecto
+    if room is not default_room:
+        return
+    for listener in event_listeners:
+        for event_data in events:
+            try:
+                listener(event_data)
+            except Exception as e:
+                log(f"❌ Error en observador de eventos: {e}", level="error")
+
+def _deliver(room: Room, event_data: dict, message: str = None) -> dict:
+    """Encola (o agrega al lote) un evento para los clientes locales de la sala"""
+    if not room.clients:
+        log(f"⚠️ No hay clientes WebSocket conectados ({room.name})", level="debug")
+        _schedule_teardown(room)
+        return {"success": 0, "failed": 0, "total": 0}
+
+    if BATCH_ENABLED:
+        return _add_to_batch(room, event_data)
+
+    total_clients = len(room.clients)
+    log(f"📢 Enviando evento a {total_clients} cliente(s) de {room.name}: "
+        f"{event_data.get('type', 'unknown')}", level="debug")
+
+    stats = _fanout(
+        room,
+        message if message is not None else json.dumps(event_data),
+        _topic_of(event_data),
+        _low_entry((event_data,))
+    )
+
+    log(f"📊 Broadcast encolado: {stats['success']}/{stats['total']} exitosos", level="debug")
+    return stats
+
+def _with_seq(message: str, seq: int) -> str:
+    """Inserta "seq" en un objeto JSON ya serializado sin re-serializarlo"""
+    if message == "{}":
+        return f'{{"seq": {seq}}}'
+    return f'{{"seq": {seq}, {message[1:]}'
+
+def set_publisher(publisher: Optional[Callable[[list, str], Awaitable[None]]]):
+    """Instala (o quita, con None) el publicador externo de eventos"""
+    global _publisher
+    _publisher = publisher
+
+def _fanout(room: Room, message: str, topic: str = None, low: tuple = None) -> dict:
+    """
+    Encola un mensaje ya serializado para los clientes interesados de la sala
+    topic=None: todos los clientes; si no, solo los suscritos a ese tipo
+    (índice tipo -> clientes: no se visitan conexiones no interesadas)
+    low: metadatos de carril bajo (ver _low_entry)
+    Retorna estadísticas: {success: int, failed: int, total: int}
+    """
+    if topic is None:
+        targets = list(room.clients)
+    else:
+        targets = list(room.wildcard_clients)
+        subscribers = room.topic_index.get(topic)
+        if subscribers:
+            targets.extend(subscribers)
+    return _enqueue_all(room, targets, message, low)
+
+def _fanout_events(room: Room, events: list) -> dict:
+    """
+    Encola varios eventos como frame "batch"
+    Los clientes con suscripción explícita reciben solo sus tipos: el
+    frame se serializa una vez por grupo de suscripción, no por cliente
+    Los eventos de baja prioridad viajan en su propio frame por el carril bajo
+    """
+    high = [event for event in events if _topic_of(event) not in LOW_PRIORITY_TYPES]
+    if high and len(high) < len(events):
+        stats = _fanout_events(room, high)
+        low_stats = _fanout_events(room, [event for event in events if _topic_of(event) in LOW_PRIORITY_TYPES])
+        for key in ("success", "failed", "total"):
+            stats[key] += low_stats[key]
+        return stats
+
+    if len(events) == 1:
+        return _fanout(room, json.dumps(events[0]), _topic_of(events[0]), _low_entry(events))
+
+    stats = _enqueue_all(room, list(room.wildcard_clients), json.dumps({"type": "batch", "events": events}),
+                         _low_entry(events))
+    if not room.topic_index:
+        return stats
+
+    groups: Dict[FrozenSet[str], list] = {}
+    for topic in {_topic_of(event) for event in events}:
+        for ws in room.topic_index.get(topic, ()):
+            groups.setdefault(room.clients[ws].topics, set()).add(ws)
+
+    for topics, clients in groups.items():
+        selected = [event for event in events if _topic_of(event) in topics]
+        if len(selected) == 1:
+            message = json.dumps(selected[0])
+        else:
+            message = json.dumps({"type": "batch", "events": selected})
+        group_stats = _enqueue_all(room, list(clients), message, _low_entry(selected))
+        for key in ("success", "failed", "total"):
+            stats[key] += group_stats[key]
+    return stats
+
+def _enqueue_all(room: Room, targets: list, message: str, low: tuple = None) -> dict:
+    """
+    Encola `message` para cada cliente de `targets` (clientes de `room`)
+    Todas las colas comparten un mismo Frame: la variante binaria se
+    codifica una vez, la primera vez que un cliente MessagePack la envía
+    low: metadatos de carril bajo; la entrada también se comparte
+    """
+    start = time.perf_counter()
+    wire.frames_encoded.labels(wire.PROTOCOL_JSON).inc()
+    if room.aggregates["binary"]:
+        message = wire.Frame(message)
+    if low is not None:
+        low = (*low, message)
+    total_clients = len(targets)
     success_count = 0
     failed_count = 0
     clients_to_remove = set()
 
-    # Enviar a cada cliente con manejo de errores individual
-    for ws in connected_clients:
-        try:
-            # Verificar si el WebSocket está cerrado
-            if ws.closed:
-                log(f"⚠️ WebSocket ya cerrado, marcado para eliminación")
-                clients_to_remove.add(ws)
-                failed_count += 1
-                continue
-            
-            # Intentar enviar el mensaje
-            await ws.send_str(message)
-            success_count += 1
-            
-        except ConnectionResetError:
-            log(f"⚠️ Conexión reseteada por cliente")
+    # Encolar para cada cliente (copia: la política "disconnect" modifica los sets)
+    for ws in targets:
+        if ws.closed:
             clients_to_remove.add(ws)
             failed_count += 1
-            
-        except Exception as e:
-            log(f"❌ Error al enviar a cliente: {type(e).__name__}: {e}")
-            clients_to_remove.add(ws)
+            continue
+
+        if _enqueue(ws, message, low):
+            success_count += 1
+        else:
             failed_count += 1
 
     # Limpiar clientes muertos
     if clients_to_remove:
         for ws in clients_to_remove:
-            await unregister_client(ws)
+            _remove_client(ws)
         log(f"🧹 Limpiados {len(clients_to_remove)} cliente(s) muerto(s)")
 
-    stats = {
+    metrics.broadcast_duration.observe(time.perf_counter() - start)
+    metrics.broadcast_fanout.observe(success_count)
+    return {
         "success": success_count,
         "failed": failed_count,
         "total": total_clients
     }
-    
-    log(f"📊 Broadcast completado: {success_count}/{total_clients} exitosos")
+
+# ==========================================
+# MICRO-BATCHING
+# ==========================================
+
+def _add_to_batch(room: Room, event_data: dict) -> dict:
+    """
+    Agrega un evento al lote pendiente de la sala
+    El lote se envía al cumplirse BATCH_WINDOW_MS o BATCH_MAX_EVENTS
+    """
+    room.pending_batch.append(event_data)
+
+    if len(room.pending_batch) >= BATCH_MAX_EVENTS:
+        flush_batch(room)
+    elif room.batch_timer is None:
+        loop = asyncio.get_running_loop()
+        room.batch_timer = loop.call_later(BATCH_WINDOW_MS / 1000, flush_batch, room)
+
+    return {
+        "success": 0,
+        "failed": 0,
+        "total": len(room.clients),
+        "pending": len(room.pending_batch)
+    }
+
+def flush_batch(room: Room = None) -> dict:
+    """
+    Envía el lote pendiente de una sala (por defecto, la general) como un
+    único frame {"type": "batch", "events": [...]} serializado una sola vez.
+    Un lote de un solo evento se envía sin envolver.
+    """
+    room = room or default_room
+    if room.batch_timer is not None:
+        room.batch_timer.cancel()
+        room.batch_timer = None
+
+    if not room.pending_batch:
+        return {"success": 0, "failed": 0, "total": len(room.clients)}
+
+    events = room.pending_batch[:]
+    room.pending_batch.clear()
+
+    batch_stats["batches_sent"] += 1
+    batch_stats["batched_events"] += len(events)
+
+    stats = _fanout_events(room, events)
+    log(f"📦 Lote de {len(events)} evento(s) encolado: {stats['success']}/{stats['total']} exitosos", level="debug")
     return stats
 
 async def broadcast_to_client(ws: web.WebSocketResponse, event_data: dict) -> bool:
     """
-    Envía un evento a un cliente específico
-    Retorna True si se envió exitosamente
+    Encola un evento para un cliente específico
+    Retorna True si se encoló exitosamente
     """
     try:
         if ws.closed:
-            log(f"⚠️ Intento de enviar a WebSocket cerrado")
+            log(f"⚠️ Intento de enviar a WebSocket cerrado", level="warning")
             await unregister_client(ws)
             return False
-        
+
         message = json.dumps(event_data)
-        await ws.send_str(message)
-        return True
-        
+        return _enqueue(ws, message)
+
     except Exception as e:
-        log(f"❌ Error al enviar a cliente específico: {e}")
+        log(f"❌ Error al enviar a cliente específico: {e}", level="error")
         await unregister_client(ws)
         return False
 
+# ==========================================
+# REPLAY / REANUDACIÓN
+# ==========================================
+
+def _remember(room: Room, event_data: dict):
+    """Guarda un evento en el buffer circular de la sala y descarta los muy antiguos"""
+    now = time.monotonic()
+    room.replay_buffer.append((event_data["seq"], now, event_data))
+    _expire_replay(room, now)
+
+def _expire_replay(room: Room, now: float):
+    cutoff = now - REPLAY_MAX_AGE
+    replay_buffer = room.replay_buffer
+    while replay_buffer and replay_buffer[0][1] < cutoff:
+        replay_buffer.popleft()
+
+def get_missed_events(since: int, room: Room = None) -> Optional[list]:
+    """
+    Retorna los eventos de la sala con seq > since, o None si el hueco ya
+    no está en el buffer (el cliente debe resincronizar)
+    """
+    room = room or default_room
+    _expire_replay(room, time.monotonic())
+    replay_buffer = room.replay_buffer
+
+    if since >= room.last_seq:
+        # Al día, o el servidor se reinició y la secuencia volvió a empezar
+        return [] if since == room.last_seq else None
+
+    oldest = replay_buffer[0][0] if replay_buffer else room.last_seq + 1
+    if since + 1 < oldest:
+        return None
+
+    # Las secuencias del buffer son consecutivas: saltar directo al índice
+    start = since + 1 - oldest
+    return [event for seq, _, event in itertools.islice(replay_buffer, start, None) if seq > since]
+
+def send_catch_up(ws: web.WebSocketResponse, since: int) -> bool:
+    """
+    Envía a un cliente que se reconecta los eventos perdidos de su sala en
+    un solo lote (solo los tipos a los que está suscrito), o una señal
+    "resync" si el hueco es demasiado antiguo
+    """
+    record = connected_clients.get(ws)
+    if record is None:
+        return False
+    room = record.room
+    missed = get_missed_events(since, room)
+    if missed and ws not in room.wildcard_clients:
+        missed = [event for event in missed if _wants(ws, event)]
+
+    if missed is None:
+        log(f"🔁 Reconexión con hueco demasiado antiguo (since={since}, last_seq={room.last_seq})")
+        return _enqueue(ws, json.dumps({
+            "type": "resync",
+            "reason": "gap_too_old",
+            "last_seq": room.last_seq
+        }))
+
+    if not missed:
+        return True
+
+    log(f"🔁 Reenviando {len(missed)} evento(s) perdidos (since={since})")
+    return _enqueue(ws, json.dumps({
+        "type": "batch",
+        "catch_up": True,
+        "events": missed
+    }))
+
 # ==========================================
 # HANDLER WEBSOCKET
 # ==========================================
@@ -142,48 +1172,83 @@ async def websocket_handler(request: web.Request) -> web.WebSocketResponse:
     """
     Handler principal para conexiones WebSocket
     """
+    if draining:
+        # Apagándose: que el cliente reintente (con su backoff) en otro proceso
+        return web.Response(status=503, text="Server restarting", headers={"Retry-After": "5"})
+
+    room_name = request.match_info.get("room", DEFAULT_ROOM)
+    if not valid_room_name(room_name):
+        return web.Response(status=404, text="Invalid room name")
+    room = get_room(room_name)
+    if room is None:
+        return web.Response(status=503, text="Too many rooms", headers={"Retry-After": "30"})
+    if room.is_full():
+        room_stats["rejected_clients"] += 1
+        return web.Response(status=503, text="Room is full", headers={"Retry-After": "30"})
+    
+    # Sin heartbeat/autoping de aiohttp: los pings los reparte liveness
     ws = web.WebSocketResponse(
-        heartbeat=30.0,  # Enviar ping cada 30 segundos
-        timeout=60.0     # Timeout de 60 segundos
+        heartbeat=None,
+        autoping=False,
+        timeout=60.0,    # Timeout de 60 segundos
+        max_msg_size=MAX_INBOUND_BYTES,
+        protocols=wire.PROTOCOLS,
+        compress=WS_COMPRESS
     )
     
     await ws.prepare(request)
+    client_ip = request.remote
     
-    # Registrar cliente
-    registered = await register_client(ws)
+    # Registrar cliente (binario si negoció el subprotocolo MessagePack)
+    registered = await register_client(ws, client_ip, ws.ws_protocol == wire.PROTOCOL_MSGPACK, room)
     if not registered:
         await ws.close(code=1011, message="Error al registrar cliente")
         return ws
-    
-    client_ip = request.remote
+    record = connected_clients[ws]
+
     log(f"🔌 Nueva conexión WebSocket desde {client_ip}")
     
+    # Suscripción inicial: ?topics=donation,walker
+    topics = request.query.get("topics")
+    if topics is not None:
+        try:
+            subscribe(ws, parse_topics(topics))
+        except ValueError as e:
+            log(f"⚠️ Parámetro topics inválido desde {client_ip}: {e}", level="warning")
+    
+    # Reanudación: ?since=<seq> recibe solo los eventos perdidos
+    since = request.query.get("since")
+    if since is not None:
+        try:
+            send_catch_up(ws, int(since))
+        except ValueError:
+            log(f"⚠️ Parámetro since inválido desde {client_ip}: {since[:20]}", level="warning")
+    
+    # Estado inicial (snapshot) después del catch-up; los agregados
+    # (leaderboard, mundo) son de la sala por defecto
+    if room is default_room:
+        _send_join_messages(ws)
+    
     try:
         # Loop principal para recibir mensajes
         async for msg in ws:
-            if msg.type == WSMsgType.TEXT:
-                log(f"📨 Mensaje recibido de {client_ip}: {msg.data[:100]}")
+            # Cualquier frame recibido (incluido un pong) prueba que está vivo
+            record.last_received = time.monotonic()
+            
+            if msg.type == WSMsgType.PONG:
+                continue
                 
-                try:
-                    # Parsear mensaje del cliente
-                    data = json.loads(msg.data)
-                    
-                    # Responder con echo (opcional)
-                    response = {
-                        "type": "echo",
-                        "original": data,
-                        "timestamp": asyncio.get_event_loop().time()
-                    }
-                    await ws.send_json(response)
-                    
-                except json.JSONDecodeError:
-                    await ws.send_json({
-                        "type": "error",
-                        "message": "Invalid JSON"
-                    })
+            elif msg.type in (WSMsgType.PING, WSMsgType.TEXT, WSMsgType.BINARY):
+                close_reason = await _handle_inbound(record, msg)
+                if close_reason is not None:
+                    inbound_stats["abusive_closes"] += 1
+                    log_sampled(f"🚫 Conexión cerrada por abuso desde {client_ip}: {close_reason}",
+                                level="warning", client_ip=client_ip)
+                    await ws.close(code=CLOSE_POLICY_VIOLATION, message=close_reason.encode())
+                    break
                     
             elif msg.type == WSMsgType.ERROR:
-                log(f"❌ Error en WebSocket de {client_ip}: {ws.exception()}")
+                log(f"❌ Error en WebSocket de {client_ip}: {ws.exception()}", level="error")
                 break
                 
             elif msg.type == WSMsgType.CLOSE:
@@ -191,10 +1256,10 @@ async def websocket_handler(request: web.Request) -> web.WebSocketResponse:
                 break
                 
     except asyncio.CancelledError:
-        log(f"⚠️ Conexión cancelada para {client_ip}")
+        log(f"⚠️ Conexión cancelada para {client_ip}", level="warning")
         
     except Exception as e:
-        log(f"❌ Error inesperado en WebSocket de {client_ip}: {e}")
+        log(f"❌ Error inesperado en WebSocket de {client_ip}: {e}", level="error")
         
     finally:
         # Cleanup
@@ -206,66 +1271,289 @@ async def websocket_handler(request: web.Request) -> web.WebSocketResponse:
     return ws
 
 # ==========================================
-# UTILIDADES
+# MENSAJES DEL CLIENTE
 # ==========================================
 
-async def cleanup_dead_connections():
+def add_message_handler(msg_type: str, handler: MessageHandler):
     """
-    Limpia conexiones WebSocket muertas periódicamente
-    Llamar esta función en un task separado
+    Registra el handler de un tipo de mensaje cliente -> servidor
+    handler(registro, datos) puede ser síncrono o async
     """
-    while True:
-        try:
-            await asyncio.sleep(30)  # Cada 30 segundos
-            
-            dead_clients = set()
-            for ws in connected_clients:
-                if ws.closed:
-                    dead_clients.add(ws)
-            
-            if dead_clients:
-                for ws in dead_clients:
-                    await unregister_client(ws)
-                log(f"🧹 Limpieza automática: {len(dead_clients)} conexiones muertas")
-                
-        except asyncio.CancelledError:
-            break
-        except Exception as e:
-            log(f"❌ Error en limpieza automática: {e}")
+    message_handlers[msg_type] = handler
 
-async def send_heartbeat():
+async def _handle_inbound(record: ClientRecord, msg) -> Optional[str]:
     """
-    Envía heartbeat a todos los clientes para mantener conexiones vivas
+    Procesa un frame entrante: límites, parseo y despacho por tipo
+    Retorna el motivo de cierre si la conexión debe cerrarse por abuso
+    El costo por mensaje queda acotado: los rechazados no se parsean
     """
-    while True:
-        try:
-            await asyncio.sleep(25)  # Cada 25 segundos
-            
-            if connected_clients:
-                heartbeat = {
-                    "type": "heartbeat",
-                    "timestamp": asyncio.get_event_loop().time()
-                }
-                await broadcast(heartbeat)
-                
-        except asyncio.CancelledError:
-            break
-        except Exception as e:
-            log(f"❌ Error en heartbeat: {e}")
+    ws = record.ws
+    record.messages_received += 1
+    inbound_stats["received"] += 1
+    
+    if not record.inbound.take() or not rate_limiter.check_route("/ws", record.ip or ""):
+        record.messages_rejected += 1
+        inbound_stats["rejected"] += 1
+        metrics.ws_inbound_rejected.labels("rate_limit").inc()
+        return None if record.violations.take() else "Rate limit exceeded"
+    
+    if msg.type == WSMsgType.PING:
+        await ws.pong(msg.data)
+        return None
+    
+    try:
+        # Parsear mensaje del cliente (JSON o MessagePack)
+        if msg.type == WSMsgType.TEXT:
+            data = json.loads(msg.data)
+        else:
+            data = wire.unpackb(msg.data)
+    except (ValueError, RecursionError):
+        # RecursionError: JSON anidado en exceso
+        return await _reject_inbound(record, "invalid",
+                                     "Invalid JSON" if msg.type == WSMsgType.TEXT else "Invalid MessagePack")
+    
+    msg_type = data.get("type") if isinstance(data, dict) else None
+    handler = message_handlers.get(msg_type) if isinstance(msg_type, str) else None
+    if handler is None:
+        return await _reject_inbound(record, "unknown_type", "Unknown message type")
+    
+    result = handler(record, data)
+    if asyncio.iscoroutine(result):
+        await result
+    return None
+
+async def _reject_inbound(record: ClientRecord, reason: str, message: str) -> Optional[str]:
+    """Responde un error y cuenta la falta; cierra si se agotó la tolerancia"""
+    record.messages_rejected += 1
+    inbound_stats["invalid"] += 1
+    metrics.ws_inbound_rejected.labels(reason).inc()
+    if not record.violations.take():
+        return message
+    await broadcast_to_client(record.ws, {"type": "error", "message": message})
+    return None
+
+async def _handle_subscription(record: ClientRecord, data: dict):
+    """Procesa {"type": "subscribe"|"unsubscribe", "topics": [...]}"""
+    ws = record.ws
+    try:
+        topics = parse_topics(data.get("topics", ["*"]))
+    except ValueError as e:
+        await broadcast_to_client(ws, {"type": "error", "message": str(e)})
+        return
+    
+    if data["type"] == "subscribe":
+        subscribe(ws, topics)
+    elif topics is not None:
+        unsubscribe(ws, topics)
+    
+    await broadcast_to_client(ws, {
+        "type": "subscribed",
+        "topics": ["*"] if record.topics is None else sorted(record.topics)
+    })
+
+def _handle_ack(record: ClientRecord, data: dict):
+    """{"type": "ack", "seq": N}: última secuencia recibida por el cliente"""
+    seq = data.get("seq")
+    if isinstance(seq, int) and not isinstance(seq, bool):
+        record_ack(record.ws, seq)
+
+add_message_handler("subscribe", _handle_subscription)
+add_message_handler("unsubscribe", _handle_subscription)
+add_message_handler("ack", _handle_ack)
+rate_limiter.configure_route("/ws", INBOUND_IP_REQUESTS, INBOUND_IP_WINDOW)
+
+# ==========================================
+# UTILIDADES
+# ==========================================
+
+def _reap_dead_client(record: ClientRecord, reason: str):
+    """Elimina un cliente que liveness detectó como muerto"""
+    ws = record.ws
+    _remove_client(ws)
+    metrics.ws_send_failures.labels(reason).inc()
+    log_sampled(f"💀 Cliente sin respuesta eliminado ({reason}). Total: {len(connected_clients)}",
+                level="warning", reason=reason)
+    if not ws.closed:
+        asyncio.create_task(ws.close(code=1001, message=b"Ping timeout"))
+
+liveness.set_dead_handler(_reap_dead_client)
+
+# ==========================================
+# DRENADO
+# ==========================================
+
+async def drain() -> dict:
+    """
+    Cierra todas las conexiones de forma escalonada (apagado con SIGTERM)
+    - Deja de aceptar WebSockets nuevos y envía el lote pendiente
+    - Cierra en olas de DRAIN_WAVE_SIZE, después de vaciar la cola de
+      cada cliente, con código 1012 (Service Restart)
+    - El motivo del cierre lleva {"reconnect_ms": N} aleatorio, repartido
+      en una ventana proporcional a la cantidad de clientes, para que la
+      reconexión no llegue toda junta al proceso nuevo
+    """
+    global draining
+    draining = True
+    for room in list(rooms.values()):
+        flush_batch(room)
+    
+    records = list(connected_clients.values())
+    if not records:
+        return drain_stats
+    
+    waves = math.ceil(len(records) / DRAIN_WAVE_SIZE)
+    interval = min(DRAIN_WAVE_INTERVAL, DRAIN_TIMEOUT / waves)
+    window = max(RECONNECT_MIN * 5, len(records) / RECONNECT_RATE)
+    log(f"🚰 Drenando {len(records)} cliente(s) en {waves} ola(s); reconexión repartida en {window:.0f}s")
+    
+    for start in range(0, len(records), DRAIN_WAVE_SIZE):
+        wave = records[start:start + DRAIN_WAVE_SIZE]
+        await asyncio.gather(*(_drain_client(record, window) for record in wave))
+        drain_stats["waves"] += 1
+        await asyncio.sleep(interval)
+    
+    log(f"🚰 Drenado completo: {drain_stats['closed']} cliente(s) cerrado(s)")
+    return drain_stats
+
+async def _drain_client(record: ClientRecord, window: float):
+    """Espera a que se vacíe la cola del cliente y lo cierra con la sugerencia"""
+    ws = record.ws
+    deadline = time.monotonic() + DRAIN_FLUSH_TIMEOUT
+    while record.pending() and not ws.closed and time.monotonic() < deadline:
+        await asyncio.sleep(0.02)
+    if record.pending():
+        drain_stats["unflushed"] += 1
+    if ws.closed:
+        return
+    
+    reconnect_ms = int(random.uniform(RECONNECT_MIN, window) * 1000)
+    reason = json.dumps({"reconnect_ms": reconnect_ms}, separators=(",", ":")).encode()
+    drain_stats["closed"] += 1
+    try:
+        # Sin esperar indefinidamente el cierre del otro lado
+        await asyncio.wait_for(ws.close(code=CLOSE_SERVICE_RESTART, message=reason), DRAIN_FLUSH_TIMEOUT)
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
 
 # ==========================================
 # ESTADÍSTICAS
 # ==========================================
 
 def get_stats() -> dict:
-    """Retorna estadísticas del dispatcher"""
+    """
+    Retorna estadísticas del dispatcher
+    Solo agregados (O(1) en la cantidad de clientes); el detalle por
+    cliente se pide paginado con get_client_page()
+    clients/subscriptions/replay son de la sala por defecto; las demás
+    salas se consultan con get_room_stats()
+    """
+    binary = client_aggregates["binary"]
     return {
         "connected_clients": len(connected_clients),
-        "client_list": [
-            {
-                "closed": ws.closed,
-                "id": id(ws)
-            }
-            for ws in connected_clients
-        ]
-    }
\ No newline at end of file
+        "send_queue_size": SEND_QUEUE_SIZE,
+        "slow_client_policy": SLOW_CLIENT_POLICY,
+        "queued_messages": backpressure_stats["queued_messages"],
+        "dropped_messages": backpressure_stats["dropped_messages"],
+        "slow_disconnects": backpressure_stats["slow_disconnects"],
+        "lanes": {
+            **lane_stats,
+            "low_priority_types": sorted(LOW_PRIORITY_TYPES),
+            "low_lane_size": LOW_LANE_SIZE
+        },
+        **_room_sections(default_room),
+        "rooms": {
+            **room_stats,
+            "active": len(rooms),
+            "max": MAX_ROOMS,
+            "max_clients": ROOM_MAX_CLIENTS,
+            "event_rate": ROOM_EVENT_RATE
+        },
+        "draining": draining,
+        "liveness": liveness.get_stats(),
+        "inbound": {
+            **inbound_stats,
+            "handlers": sorted(message_handlers)
+        },
+        "protocols": {
+            "msgpack": binary,
+            "json": len(connected_clients) - binary,
+            "compress": WS_COMPRESS
+        },
+        "batching": {
+            "enabled": BATCH_ENABLED,
+            "window_ms": BATCH_WINDOW_MS,
+            "max_events": BATCH_MAX_EVENTS,
+            "pending": sum(len(room.pending_batch) for room in rooms.values()),
+            "batches_sent": batch_stats["batches_sent"],
+            "batched_events": batch_stats["batched_events"]
+        }
+    }
+
+def _room_sections(room: Room) -> dict:
+    """Clientes, suscripciones y replay de una sala"""
+    aggregates = room.aggregates
+    acked = aggregates["acked"]
+    return {
+        "clients": {
+            "connected": len(room.clients),
+            "peak": aggregates["peak_clients"],
+            "unique_ips": len(room.clients_per_ip),
+            "acked": acked,
+            "mean_ack_lag": round(room.last_seq - aggregates["acked_seq_sum"] / acked, 1) if acked else None,
+            "bytes_sent": aggregates["bytes_sent"],
+            "frames_sent": aggregates["frames_sent"]
+        },
+        "subscriptions": {
+            "wildcard": len(room.wildcard_clients),
+            "topics": {topic: len(clients) for topic, clients in room.topic_index.items()}
+        },
+        "replay": {
+            "last_seq": room.last_seq,
+            "buffered": len(room.replay_buffer),
+            "buffer_size": REPLAY_BUFFER_SIZE,
+            "max_age": REPLAY_MAX_AGE
+        }
+    }
+
+def get_room_stats(name: str) -> Optional[dict]:
+    """Estadísticas de una sala activa (None si no existe)"""
+    room = get_room(name, create=False)
+    if room is None:
+        return None
+    aggregates = room.aggregates
+    return {
+        "room": room.name,
+        "created_at": room.created_at,
+        "events": aggregates["events"],
+        "rejected_events": aggregates["rejected_events"],
+        "queued_messages": aggregates["queued_messages"],
+        "dropped_messages": aggregates["dropped_messages"],
+        "pending": len(room.pending_batch),
+        **_room_sections(room)
+    }
+
+def get_client_page(offset: int = 0, limit: int = CLIENT_PAGE_SIZE, room: str = None) -> dict:
+    """
+    Página de registros de clientes en orden de conexión (de una sala,
+    o de todas con room=None)
+    Cuesta O(offset + limit), no O(clientes)
+    """
+    offset = max(0, offset)
+    limit = max(1, min(limit, CLIENT_PAGE_MAX))
+    if room is None:
+        registry = clients_by_id
+    else:
+        target = get_room(room, create=False)
+        registry = target.clients_by_id if target is not None else {}
+    page = itertools.islice(registry.values(), offset, offset + limit)
+    return {
+        "offset": offset,
+        "limit": limit,
+        "total": len(registry),
+        "clients": [record.to_dict() for record in page]
+    }
+
+def get_client_by_id(client_id: int) -> Optional[dict]:
+    """Detalle de un cliente por id (O(1))"""
+    record = clients_by_id.get(client_id)
+    return record.to_dict() if record is not None else None
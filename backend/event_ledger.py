@@ -0,0 +1,366 @@
+# backend/event_ledger.py
+"""
+Ledger de eventos append-only y durable
+- append() solo encola: no agrega latencia a la request
+- Un hilo escritor hace group commit: escribe el lote y hace un fsync
+  por lote, no por evento
+- Segmentos rotativos: segment-<primer_id>.log (NDJSON) + .idx
+- El índice (registros fijos <id, fin>) se lee con mmap al arrancar:
+  contar eventos y ubicar cualquier id es O(1) sin parsear el log
+"""
+import glob
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from typing import Iterator, Optional
+
+from backend import metrics
+from backend.utils.logger import log
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+LEDGER_ENABLED = os.environ.get("DOTLEMOR_LEDGER", "1") != "0"
+LEDGER_DIR = os.environ.get("DOTLEMOR_LEDGER_DIR", os.path.join("data", "ledger"))
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024   # rotar segmento al superar este tamaño
+MAX_BATCH = 2048                       # eventos máximos por group commit
+MAX_PENDING = 100_000                  # eventos en cola antes de descartar
+
+INDEX_ENTRY = struct.Struct("<QQ")     # (id, offset de fin del registro)
+
+# ==========================================
+# MÉTRICAS
+# ==========================================
+ledger_appended = metrics.Counter(
+    "dotlemor_ledger_appended_total", "Eventos encolados en el ledger"
+)
+ledger_dropped = metrics.Counter(
+    "dotlemor_ledger_dropped_total", "Eventos descartados por cola llena o error de escritura"
+)
+ledger_commit_size = metrics.Histogram(
+    "dotlemor_ledger_commit_events", "Eventos por group commit",
+    buckets=metrics.SIZE_BUCKETS
+)
+ledger_commit_duration = metrics.Histogram(
+    "dotlemor_ledger_commit_duration_seconds", "Duración de write + fsync por group commit"
+)
+
+# ==========================================
+# SEGMENTOS
+# ==========================================
+class _Segment:
+    """Un segmento: log NDJSON + índice de registros fijos"""
+
+    def __init__(self, directory: str, first_id: int):
+        self.first_id = first_id
+        base = os.path.join(directory, f"segment-{first_id:012d}")
+        self.log_path = base + ".log"
+        self.idx_path = base + ".idx"
+        self.count = 0
+        self.size = 0
+
+    def load(self, repair: bool = True):
+        """
+        Lee el índice con mmap y repara una cola incompleta tras un crash
+        Con repair=False solo lee (segmentos de otro proceso en uso)
+        """
+        self.size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        idx_size = os.path.getsize(self.idx_path) if os.path.exists(self.idx_path) else 0
+        self.count = idx_size // INDEX_ENTRY.size
+
+        # Descartar entradas del índice que apuntan más allá del log
+        last_end = 0
+        if self.count:
+            with open(self.idx_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+                while self.count:
+                    _, last_end = INDEX_ENTRY.unpack_from(index, (self.count - 1) * INDEX_ENTRY.size)
+                    if last_end <= self.size:
+                        break
+                    self.count -= 1
+                    last_end = 0
+        if not repair:
+            self.size = last_end
+            return
+
+        if idx_size != self.count * INDEX_ENTRY.size:
+            with open(self.idx_path, "r+b") as f:
+                f.truncate(self.count * INDEX_ENTRY.size)
+
+        if last_end < self.size:
+            self._recover_tail(last_end)
+
+    def _recover_tail(self, start: int):
+        """Indexa registros completos escritos tras la última entrada; trunca el resto"""
+        with open(self.log_path, "rb") as f:
+            f.seek(start)
+            tail = f.read()
+        entries = []
+        end = start
+        for line in tail.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            end += len(line)
+            entries.append(INDEX_ENTRY.pack(self.first_id + self.count + len(entries), end))
+        with open(self.idx_path, "ab") as f:
+            f.write(b"".join(entries))
+        self.count += len(entries)
+        if end < self.size:
+            with open(self.log_path, "r+b") as f:
+                f.truncate(end)
+            log(f"⚠️ Ledger: cola incompleta truncada en {os.path.basename(self.log_path)}", level="warning")
+        self.size = end
+
+    @property
+    def next_id(self) -> int:
+        return self.first_id + self.count
+
+    def read(self, since_id: int = None) -> Iterator[dict]:
+        """Eventos del segmento con id > since_id (salta directo con el índice)"""
+        skip = 0 if since_id is None else max(0, since_id + 1 - self.first_id)
+        if skip >= self.count:
+            return
+        start = 0
+        if skip:
+            with open(self.idx_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+                _, start = INDEX_ENTRY.unpack_from(index, (skip - 1) * INDEX_ENTRY.size)
+        remaining = self.count - skip
+        with open(self.log_path, "rb") as f:
+            f.seek(start)
+            for line in f:
+                if not remaining:
+                    break
+                remaining -= 1
+                yield json.loads(line)
+
+def _load_segments(directory: str, repair: bool = True) -> list:
+    segments = []
+    for path in sorted(glob.glob(os.path.join(directory, "segment-*.log"))):
+        segment = _Segment(directory, int(os.path.basename(path)[8:-4]))
+        segment.load(repair)
+        segments.append(segment)
+    return segments
+
+# ==========================================
+# LEDGER
+# ==========================================
+class EventLedger:
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.segments: list = []
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._log_file = None
+        self._idx_file = None
+        self.stats = {
+            "appended": 0,
+            "committed": 0,
+            "dropped": 0,
+            "commits": 0,
+            "last_commit_ms": 0.0,
+            "scan_ms": 0.0
+        }
+
+    # ---------- arranque ----------
+    def open(self):
+        """Escanea los segmentos existentes e inicia el hilo escritor"""
+        os.makedirs(self.directory, exist_ok=True)
+        start = time.perf_counter()
+        self.segments = _load_segments(self.directory)
+        if not self.segments:
+            self.segments.append(_Segment(self.directory, 1))
+        self.stats["scan_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        log(f"📒 Ledger: {self.total_events} evento(s) en {len(self.segments)} segmento(s) "
+            f"(escaneo {self.stats['scan_ms']} ms)")
+
+        self._open_files(self.segments[-1])
+        self._thread = threading.Thread(target=self._writer_loop, name="dotlemor-ledger", daemon=True)
+        self._thread.start()
+
+    @property
+    def total_events(self) -> int:
+        return sum(segment.count for segment in self.segments)
+
+    @property
+    def next_id(self) -> int:
+        return self.segments[-1].next_id
+
+    def _open_files(self, segment: _Segment):
+        self._log_file = open(segment.log_path, "ab")
+        self._idx_file = open(segment.idx_path, "ab")
+
+    # ---------- escritura ----------
+    def append(self, event: dict) -> bool:
+        """Encola un evento (no bloquea). Retorna False si se descartó"""
+        if self._queue.qsize() >= MAX_PENDING:
+            self.stats["dropped"] += 1
+            ledger_dropped.inc()
+            return False
+        self._queue.put(event)
+        self.stats["appended"] += 1
+        ledger_appended.inc()
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """Confirma lo pendiente y detiene el hilo escritor"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        self._log_file.close()
+        self._idx_file.close()
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            events = [event for event in batch if event is not None]
+            if events:
+                try:
+                    self._commit(events)
+                except Exception as e:
+                    self.stats["dropped"] += len(events)
+                    ledger_dropped.inc(len(events))
+                    log(f"❌ Ledger: error en group commit: {e}", level="error")
+            if stop:
+                return
+
+    def _commit(self, events: list):
+        """Escribe un lote y hace un solo fsync (group commit)"""
+        start = time.perf_counter()
+        segment = self.segments[-1]
+        if segment.size >= SEGMENT_MAX_BYTES:
+            segment = self._rotate()
+
+        lines = []
+        entries = []
+        end = segment.size
+        next_id = segment.next_id
+        for event in events:
+            line = (json.dumps({"id": next_id, "event": event}, ensure_ascii=False) + "\n").encode()
+            end += len(line)
+            lines.append(line)
+            entries.append(INDEX_ENTRY.pack(next_id, end))
+            next_id += 1
+
+        try:
+            self._log_file.write(b"".join(lines))
+            self._log_file.flush()
+            os.fsync(self._log_file.fileno())
+        except Exception:
+            # Sin confirmar: descartar lo que haya llegado al archivo para
+            # que los offsets del índice sigan coincidiendo con el log
+            self._rollback(segment)
+            raise
+        # El índice se puede reconstruir desde el log: sin fsync propio
+        self._idx_file.write(b"".join(entries))
+        self._idx_file.flush()
+
+        segment.size = end
+        segment.count += len(events)
+
+        elapsed = time.perf_counter() - start
+        self.stats["committed"] += len(events)
+        self.stats["commits"] += 1
+        self.stats["last_commit_ms"] = round(elapsed * 1000, 3)
+        ledger_commit_size.observe(len(events))
+        ledger_commit_duration.observe(elapsed)
+
+    def _rollback(self, segment: _Segment):
+        """Trunca el log del segmento a su último group commit confirmado"""
+        try:
+            self._log_file.close()
+        except OSError:
+            pass
+        with open(segment.log_path, "r+b") as f:
+            f.truncate(segment.size)
+        self._log_file = open(segment.log_path, "ab")
+
+    def _rotate(self) -> _Segment:
+        """Cierra el segmento actual y abre uno nuevo"""
+        self._log_file.close()
+        self._idx_file.close()
+        segment = _Segment(self.directory, self.segments[-1].next_id)
+        self.segments.append(segment)
+        self._open_files(segment)
+        log(f"📒 Ledger: nuevo segmento {os.path.basename(segment.log_path)}")
+        return segment
+
+    # ---------- lectura ----------
+    def replay(self, since_id: int = 0) -> Iterator[dict]:
+        """Eventos confirmados con id > since_id, en orden"""
+        for segment in list(self.segments):
+            for record in segment.read(since_id):
+                yield record["event"]
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "pending": self._queue.qsize(),
+            "segments": len(self.segments),
+            "events": self.total_events,
+            "directory": self.directory
+        }
+
+# ==========================================
+# INSTANCIA DEL PROCESO
+# ==========================================
+ledger: Optional[EventLedger] = None
+
+def start_ledger(directory: str = None) -> Optional[EventLedger]:
+    """Abre el ledger del proceso (no hace nada si está desactivado)"""
+    global ledger
+    if not LEDGER_ENABLED or ledger is not None:
+        return ledger
+    ledger = EventLedger(directory or LEDGER_DIR)
+    ledger.open()
+    return ledger
+
+def stop_ledger():
+    global ledger
+    if ledger is not None:
+        ledger.close()
+        ledger = None
+
+def append(event: dict) -> bool:
+    """Registra un evento aceptado en el ledger (no bloquea)"""
+    if ledger is None:
+        return False
+    return ledger.append(event)
+
+def replay_all(root: str = None) -> Iterator[dict]:
+    """
+    Eventos de todos los ledgers bajo `root`: el del proceso único y los
+    de cada worker (worker-<id>). Los ajenos se leen sin modificarlos
+    Sirve para reconstruir agregados al arrancar, también en modo cluster
+    """
+    root = root or LEDGER_DIR
+    directories = [root] + sorted(glob.glob(os.path.join(root, "worker-*")))
+    own = os.path.abspath(ledger.directory) if ledger is not None else None
+    for directory in directories:
+        if os.path.abspath(directory) == own:
+            yield from ledger.replay()
+            continue
+        for segment in _load_segments(directory, repair=False):
+            for record in segment.read():
+                yield record["event"]
+
+def get_stats() -> dict:
+    if ledger is None:
+        return {"enabled": False}
+    return {"enabled": True, **ledger.get_stats()}
@@ -0,0 +1,348 @@
+# backend/event_schemas.py
+"""
+Registro de esquemas de eventos de ingesta
+- Un esquema por tipo de evento, compilado una sola vez (al registrarlo)
+  en una función de validación generada para ese tipo
+- Los eventos sanitizados llevan solo campos de la lista blanca, acotados
+- Los tipos personalizados sin esquema propio pasan por un esquema genérico
+  acotado (campos escalares, cantidad y tamaño máximos)
+- Hook para registrar tipos personalizados: register_event_type()
+- Lectura del body con tope: se rechaza por Content-Length o al superar el
+  tope durante la lectura, antes de parsear el JSON
+"""
+import json
+import re
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from aiohttp import web
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+MAX_EVENT_BODY = 4 * 1024          # bytes máximos de un evento individual
+MAX_AMOUNT = 10000
+MAX_USER_LENGTH = 50
+MAX_MESSAGE_LENGTH = 200
+
+MAX_TYPE_LENGTH = 50
+TYPE_PATTERN = re.compile(r"^[A-Za-z][A-Za-z0-9_.-]*$")
+
+# Eventos personalizados sin esquema propio
+MAX_CUSTOM_FIELDS = 16
+MAX_CUSTOM_KEY_LENGTH = 50
+MAX_CUSTOM_STRING_LENGTH = 200
+
+# Tipos que emite el servidor: un cliente no puede publicarlos
+RESERVED_TYPES = frozenset({
+    "batch", "connection", "heartbeat", "resync", "echo", "error",
+    "subscribed", "action_result", "leaderboard_delta", "world_snapshot", "world_delta",
+    "walkers"
+})
+
+ValidationResult = Tuple[bool, str, dict]
+
+_INFINITIES = (float("inf"), float("-inf"))
+
+# Enteros que MessagePack puede representar (int64 / uint64)
+_INT_MIN = -2 ** 63
+_INT_MAX = 2 ** 64 - 1
+
+# ==========================================
+# CAMPOS
+# ==========================================
+class Field:
+    """
+    Definición de un campo de esquema
+    kind: "str" (se convierte y trunca) o "number" (float acotado)
+    """
+
+    def __init__(self, kind: str, default=None, required: bool = False,
+                 max_length: int = None, minimum: float = None, maximum: float = None,
+                 exclusive_minimum: bool = False, digits: int = None, label: str = None):
+        self.kind = kind
+        self.default = default
+        self.required = required
+        self.max_length = max_length
+        self.minimum = minimum
+        self.maximum = maximum
+        self.exclusive_minimum = exclusive_minimum
+        self.digits = digits
+        self.label = label
+
+def _field_source(index: int, name: str, field: Field) -> list:
+    """
+    Código Python del chequeo de un campo (las decisiones por tipo de
+    campo se toman aquí, una vez, y no por evento)
+    Deja el valor sanitizado en la variable local v<index>; un campo
+    opcional sin default ausente (o null) queda en None y no se copia
+    Un null explícito vale lo mismo que un campo ausente
+    Las constantes se pasan por el namespace como f<index>_*
+    """
+    label = field.label or name.capitalize()
+    prefix = f"f{index}_"
+    v = f"v{index}"
+    lines = [f"    {v} = data.get({name!r})"]
+
+    if field.required:
+        missing = f"{label} must be a number" if field.kind == "number" else f"{label} is required"
+        lines.append(f"    if {v} is None: return False, {missing!r}, {{}}")
+        present = None
+    elif field.default is not None:
+        lines.append(f"    if {v} is None: {v} = {prefix}default")
+        present = "    else:"
+    else:
+        present = f"    if {v} is not None:"
+
+    if field.kind == "str":
+        body = [f"        {v} = ({v} if {v}.__class__ is str else str({v}))[:{field.max_length}]"]
+    elif field.kind == "number":
+        body = _number_source(v, prefix, name, label, field)
+    else:
+        raise ValueError(f"Tipo de campo desconocido: {field.kind}")
+
+    if present is None:
+        # Requerido: el chequeo va sin bloque condicional
+        return lines + [line[4:] for line in body]
+    return lines + [present] + body
+
+def _number_source(v: str, prefix: str, name: str, label: str, field: Field) -> list:
+    """
+    Conversión a float y chequeo de rango de un campo numérico
+    Un solo chequeo de rango en el camino exitoso (NaN nunca lo cumple;
+    infinito tampoco si hay máximo); el motivo se busca solo al fallar
+    """
+    not_number = f"{label} must be a number"
+    lines = [
+        f"        if {v}.__class__ is not float:",
+        f"            if {v}.__class__ is bool: return False, {not_number!r}, {{}}",
+        f"            try: {v} = float({v})",
+        f"            except (TypeError, ValueError, OverflowError): return False, {not_number!r}, {{}}",
+    ]
+    bounds = []
+    if field.minimum is not None:
+        bounds.append(f"{v} {'>' if field.exclusive_minimum else '>='} {prefix}minimum")
+    else:
+        bounds.append(f"{v} == {v}")
+    if field.maximum is not None:
+        bounds.append(f"{v} <= {prefix}maximum")
+    else:
+        bounds.append(f"{v} not in _INFINITIES")
+    lines += [
+        f"        if not ({' and '.join(bounds)}):",
+        f"            if {v} != {v} or {v} in _INFINITIES: return False, {not_number!r}, {{}}"
+    ]
+    if field.minimum is not None:
+        op = "<=" if field.exclusive_minimum else "<"
+        message = f"{label} must be positive" if field.minimum == 0 else f"{label} below minimum ({field.minimum})"
+        lines.append(f"            if {v} {op} {prefix}minimum: return False, {message!r}, {{}}")
+    if field.maximum is not None:
+        message = f"{label} exceeds maximum (${field.maximum})" if name == "amount" else f"{label} exceeds maximum ({field.maximum})"
+        lines.append(f"            return False, {message!r}, {{}}")
+    if field.digits is not None:
+        # round() cuesta más que todo el resto del chequeo; un valor entero
+        # (el caso común) no cambia al redondear
+        lines.append(f"        if not {v}.is_integer(): {v} = round({v}, {field.digits})")
+    return lines
+
+# ==========================================
+# REGISTRO
+# ==========================================
+# tipo -> validador compilado (datos -> (válido, error, sanitizado))
+_validators: Dict[str, Callable[[dict], ValidationResult]] = {}
+
+def compile_schema(event_type: str, fields: Dict[str, Field],
+                   hook: Callable[[dict, dict], Optional[str]] = None) -> Callable[[dict], ValidationResult]:
+    """
+    Compila un esquema en una función de validación especializada
+    (generada una sola vez, sin recorrer el esquema por evento)
+    Los valores viven en variables locales y el evento sanitizado se arma
+    de una vez, con un literal de dict, al final
+    `hook(datos, sanitizado)` es una validación extra opcional que puede
+    retornar un mensaje de error o completar el evento sanitizado
+    """
+    namespace = {
+        "_now": datetime.now,
+        "_INFINITIES": _INFINITIES,
+        "_hook": hook,
+        "_type": event_type
+    }
+    lines = ["def validate(data):"]
+    always = ["'type': _type"]
+    optional = []
+    # Primero los campos que pueden fallar: un evento inválido se rechaza
+    # sin convertir antes los textos opcionales (que nunca fallan)
+    order = sorted(enumerate(fields.items()), key=lambda item: item[1][1].kind == "str" and not item[1][1].required)
+    for index, (name, field) in order:
+        namespace[f"f{index}_default"] = field.default
+        namespace[f"f{index}_minimum"] = field.minimum
+        namespace[f"f{index}_maximum"] = field.maximum
+        lines += _field_source(index, name, field)
+    for index, (name, field) in enumerate(fields.items()):
+        if field.required or field.default is not None:
+            always.append(f"{name!r}: v{index}")
+        else:
+            optional.append(f"    if v{index} is not None: out[{name!r}] = v{index}")
+
+    if not optional and hook is None:
+        always.append("'timestamp': _now().isoformat()")
+        lines.append(f"    return True, '', {{{', '.join(always)}}}")
+    else:
+        lines.append(f"    out = {{{', '.join(always)}}}")
+        lines += optional
+        if hook is not None:
+            lines += [
+                "    error = _hook(data, out)",
+                "    if error is not None: return False, error, {}"
+            ]
+        lines += [
+            "    out['timestamp'] = _now().isoformat()",
+            "    return True, '', out"
+        ]
+    exec(compile("\n".join(lines), f"<schema {event_type}>", "exec"), namespace)
+    return namespace["validate"]
+
+def register_event_type(event_type: str, fields: Dict[str, Field] = None,
+                        hook: Callable[[dict, dict], Optional[str]] = None):
+    """
+    Registra (o reemplaza) el esquema de un tipo de evento
+    Punto de extensión para tipos personalizados: solo sus campos de la
+    lista blanca llegan a los clientes
+    """
+    if event_type in RESERVED_TYPES:
+        raise ValueError(f"Tipo reservado: {event_type}")
+    _validators[event_type] = compile_schema(event_type, fields or {}, hook)
+
+def registered_types() -> list:
+    return sorted(_validators)
+
+# ==========================================
+# EVENTOS PERSONALIZADOS (sin esquema propio)
+# ==========================================
+def _validate_custom(event_type: str, data: dict) -> ValidationResult:
+    """
+    Esquema genérico acotado: campos escalares (texto truncado, números,
+    booleanos) con cantidad y largo de clave máximos
+    """
+    if len(data) - ("type" in data) > MAX_CUSTOM_FIELDS:
+        return False, f"Too many fields (max {MAX_CUSTOM_FIELDS})", {}
+    fields = {}
+    for key, value in data.items():
+        if key == "type":
+            continue
+        if key.__class__ is not str or len(key) > MAX_CUSTOM_KEY_LENGTH:
+            return False, "Invalid field name", {}
+        cls = value.__class__
+        if cls is str:
+            fields[key] = value[:MAX_CUSTOM_STRING_LENGTH]
+        elif cls is int:
+            if value < _INT_MIN or value > _INT_MAX:
+                return False, f"Field {key} must be a 64-bit integer", {}
+            fields[key] = value
+        elif cls is bool or value is None:
+            fields[key] = value
+        elif cls is float:
+            if value != value or value in _INFINITIES:
+                return False, f"Field {key} must be a finite number", {}
+            fields[key] = value
+        else:
+            return False, f"Field {key} must be a scalar", {}
+    return True, "", {
+        "type": event_type,
+        "data": fields,
+        "timestamp": datetime.now().isoformat()
+    }
+
+# ==========================================
+# VALIDACIÓN
+# ==========================================
+def validate_event(data) -> ValidationResult:
+    """
+    Valida y sanitiza un evento de ingesta
+    Retorna: (es_válido, mensaje_error, datos_sanitizados)
+    """
+    if data.__class__ is not dict and not isinstance(data, dict):
+        return False, "Invalid data format", {}
+
+    # Tipos con esquema primero: un solo lookup en el camino común
+    event_type = data.get("type", "donation")
+    if event_type.__class__ is str:
+        validator = _validators.get(event_type)
+        if validator is not None:
+            return validator(data)
+    if not isinstance(event_type, str) or not event_type:
+        return False, "Event type must be a string", {}
+
+    if len(event_type) > MAX_TYPE_LENGTH or not TYPE_PATTERN.match(event_type):
+        return False, "Invalid event type", {}
+    if event_type in RESERVED_TYPES:
+        return False, f"Event type '{event_type}' is reserved", {}
+    return _validate_custom(event_type, data)
+
+# ==========================================
+# LECTURA DEL BODY CON TOPE
+# ==========================================
+class BodyTooLarge(Exception):
+    """El body excede el tope configurado"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Body exceeds {limit} bytes")
+        self.limit = limit
+
+async def read_body(request: web.Request, max_bytes: int) -> bytes:
+    """
+    Lee el body sin pasar de `max_bytes`
+    Rechaza por Content-Length sin leer nada, o corta la lectura apenas
+    se supera el tope (bodies sin Content-Length / chunked)
+    """
+    if request.content_length is not None and request.content_length > max_bytes:
+        raise BodyTooLarge(max_bytes)
+    chunks = []
+    size = 0
+    while True:
+        chunk = await request.content.read(max_bytes + 1 - size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise BodyTooLarge(max_bytes)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+async def read_json_body(request: web.Request, max_bytes: int = MAX_EVENT_BODY):
+    """
+    Lee y parsea un body JSON acotado. El resultado (o el error) queda en
+    la request: el middleware de admisión y el handler leen una sola vez
+    Lanza BodyTooLarge o ValueError
+    """
+    cached = request.get("json_body")
+    if cached is None:
+        try:
+            cached = (True, json.loads(await read_body(request, max_bytes) or b"null"))
+        except (BodyTooLarge, ValueError) as e:
+            cached = (False, e)
+        request["json_body"] = cached
+    ok, value = cached
+    if not ok:
+        raise value
+    return value
+
+def body_too_large_response(error: BodyTooLarge, hint: str = "") -> web.Response:
+    return web.json_response(
+        {"status": "error", "message": f"Body exceeds {error.limit} bytes{hint}"},
+        status=413
+    )
+
+# ==========================================
+# ESQUEMAS INCORPORADOS
+# ==========================================
+register_event_type("walker", {
+    "user": Field("str", default="Anónimo", max_length=MAX_USER_LENGTH)
+})
+
+register_event_type("donation", {
+    "user": Field("str", default="Anónimo", max_length=MAX_USER_LENGTH),
+    "amount": Field("number", required=True, minimum=0, exclusive_minimum=True,
+                    maximum=MAX_AMOUNT, digits=2),
+    "message": Field("str", default="", max_length=MAX_MESSAGE_LENGTH)
+})
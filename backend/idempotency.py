@@ -0,0 +1,287 @@
+# backend/idempotency.py
+"""
+Deduplicación de reintentos con el header Idempotency-Key
+- Aplica a las rutas de ingesta (/simulate_donation, /events/bulk)
+- La primera request con una clave se procesa y su respuesta se guarda;
+  las repeticiones reciben la misma respuesta sin validar, persistir ni
+  difundir de nuevo (header Idempotent-Replayed: true)
+- Una repetición que llega mientras la original sigue en curso espera
+  su resultado en vez de procesarse en paralelo
+- LRU con TTL y tope fijo de memoria (entradas y bytes): O(1) por consulta
+- Las claves se aíslan por ruta e IP
+- En modo cluster (SO_REUSEPORT) un reintento puede llegar a otro worker:
+  cada clave nueva se reclama en el broker, que guarda la respuesta para
+  todos los workers (ver set_coordinator y cluster.Broker)
+"""
+import asyncio
+import base64
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from aiohttp import web
+
+from backend import metrics
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+IDEMPOTENT_ROUTES = ("/simulate_donation", "/events/bulk",
+                     "/rooms/{room}/simulate_donation", "/rooms/{room}/events/bulk")
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+TTL = 600                           # segundos que se recuerda una clave
+MAX_ENTRIES = 10_000
+MAX_BYTES = 16 * 1024 * 1024        # memoria máxima de respuestas guardadas
+MAX_ENTRY_BYTES = 256 * 1024        # respuestas más grandes no se guardan
+MAX_KEY_LENGTH = 128
+ENTRY_OVERHEAD = 256                # bytes estimados por entrada además del body
+
+# Respuestas transitorias: el reintento debe procesarse de nuevo
+NOT_CACHED_STATUSES = frozenset({429, 503})
+
+# ==========================================
+# ESTADO
+# ==========================================
+class _Entry:
+    __slots__ = ("expires", "status", "body", "content_type", "size", "done")
+
+    def __init__(self, expires: float):
+        self.expires = expires
+        self.status = 0
+        self.body = b""
+        self.content_type = None
+        self.size = ENTRY_OVERHEAD
+        # Resuelto al terminar la request original (True si quedó guardada)
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+# (ruta, ip, clave) -> entrada, en orden LRU
+_cache: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+cached_bytes = 0
+
+# Coordinador entre workers: (reclamar, liberar) o None fuera del cluster
+# - reclamar(clave) -> {"owner": True} si este worker debe procesarla, o
+#   el resultado compartido ({"status", "content_type", "body"} o
+#   {"streamed": True}) si otro worker ya la procesó
+# - liberar(clave, resultado o None): publica el resultado (None: no quedó
+#   respuesta reutilizable; otro worker puede procesarla)
+_coordinator: Optional[Tuple[Callable[[list], Awaitable[dict]], Callable[[list, Optional[dict]], None]]] = None
+
+idempotency_stats = {
+    "hits": 0,
+    "misses": 0,
+    "inflight_waits": 0,
+    "evicted": 0,
+    "expired": 0,
+    "not_cached": 0,
+    "shared_hits": 0,
+    "coordinator_errors": 0
+}
+
+idempotency_lookups = metrics.Counter(
+    "dotlemor_idempotency_lookups_total", "Consultas de Idempotency-Key",
+    ("result",)
+)
+metrics.Gauge(
+    "dotlemor_idempotency_cached_bytes", "Bytes de respuestas guardadas por Idempotency-Key",
+    collect=lambda: cached_bytes
+)
+
+# ==========================================
+# CACHÉ
+# ==========================================
+def _drop(key, entry: _Entry):
+    global cached_bytes
+    if _cache.get(key) is entry:
+        del _cache[key]
+        cached_bytes -= entry.size
+
+def _evict(now: float):
+    """
+    Expulsa desde el extremo LRU hasta respetar los topes
+    Las entradas en curso se saltean sin detener el barrido
+    """
+    excess = len(_cache) - MAX_ENTRIES
+    excess_bytes = cached_bytes - MAX_BYTES
+    victims = []
+    for key, entry in _cache.items():
+        if entry.expires > now and excess <= 0 and excess_bytes <= 0:
+            break
+        if not entry.done.done():
+            # En curso: se conserva para no duplicar su procesamiento
+            continue
+        if entry.expires <= now:
+            idempotency_stats["expired"] += 1
+        else:
+            idempotency_stats["evicted"] += 1
+        victims.append((key, entry))
+        excess -= 1
+        excess_bytes -= entry.size
+    for key, entry in victims:
+        _drop(key, entry)
+
+def _lookup(key) -> Optional[_Entry]:
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    if entry.expires <= time.monotonic() and entry.done.done():
+        idempotency_stats["expired"] += 1
+        _drop(key, entry)
+        return None
+    _cache.move_to_end(key)
+    return entry
+
+def _store(key, entry: _Entry, response: web.StreamResponse) -> bool:
+    """Guarda la respuesta final de la request original (si corresponde)"""
+    global cached_bytes
+    if not isinstance(response, web.Response) or response.status >= 500 \
+            or response.status in NOT_CACHED_STATUSES:
+        return False
+    body = response.body
+    if not isinstance(body, bytes) or len(body) > MAX_ENTRY_BYTES:
+        return False
+    entry.status = response.status
+    entry.body = body
+    entry.content_type = response.content_type
+    entry.size += len(body)
+    cached_bytes += len(body)
+    _evict(time.monotonic())
+    return True
+
+def set_coordinator(claim: Optional[Callable[[list], Awaitable[dict]]],
+                    release: Optional[Callable[[list, Optional[dict]], None]] = None):
+    """Instala (o quita, con None) el coordinador de claves entre workers"""
+    global _coordinator
+    _coordinator = (claim, release) if claim is not None else None
+
+def _shared_result(entry: _Entry) -> Optional[dict]:
+    """Resultado de una entrada para el coordinador (None: nada reutilizable)"""
+    if entry.done.done() and entry.done.result():
+        return {
+            "status": entry.status,
+            "content_type": entry.content_type,
+            "body": base64.b64encode(entry.body).decode()
+        }
+    if entry.status:
+        return {"streamed": True}
+    return None
+
+def _adopt(entry: _Entry, shared: dict) -> bool:
+    """Completa una entrada local con el resultado de otro worker"""
+    global cached_bytes
+    if shared.get("streamed"):
+        entry.status = 200
+        return False
+    body = base64.b64decode(shared["body"])
+    entry.status = shared["status"]
+    entry.content_type = shared["content_type"]
+    entry.body = body
+    entry.size += len(body)
+    cached_bytes += len(body)
+    return True
+
+def _streamed_conflict() -> web.Response:
+    return web.json_response(
+        {"status": "error", "message": f"{HEADER} already used for a streamed request"},
+        status=409
+    )
+
+def _replay(entry: _Entry) -> web.Response:
+    return web.Response(
+        status=entry.status,
+        body=entry.body,
+        content_type=entry.content_type,
+        headers={REPLAYED_HEADER: "true"}
+    )
+
+# ==========================================
+# MIDDLEWARE
+# ==========================================
+@web.middleware
+async def idempotency_middleware(request: web.Request, handler):
+    """Responde las repeticiones de una Idempotency-Key con la respuesta original"""
+    global cached_bytes
+    idempotency_key = request.headers.get(HEADER)
+    if idempotency_key is None or request.method != "POST" \
+            or metrics.route_label(request) not in IDEMPOTENT_ROUTES:
+        return await handler(request)
+
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH or not idempotency_key.isprintable():
+        return web.json_response(
+            {"status": "error", "message": f"Invalid {HEADER} (max {MAX_KEY_LENGTH} printable chars)"},
+            status=400
+        )
+
+    key = (request.path, request.remote or "", idempotency_key)
+    entry = _lookup(key)
+    if entry is not None:
+        if not entry.done.done():
+            idempotency_stats["inflight_waits"] += 1
+            await asyncio.shield(entry.done)
+        if entry.done.result():
+            idempotency_stats["hits"] += 1
+            idempotency_lookups.labels("hit").inc()
+            return _replay(entry)
+        if entry.status:
+            # Request original en streaming (NDJSON): ya se procesó
+            idempotency_stats["hits"] += 1
+            idempotency_lookups.labels("hit").inc()
+            return _streamed_conflict()
+        # La original no dejó respuesta reutilizable: procesar de nuevo
+
+    entry = _Entry(time.monotonic() + TTL)
+    _cache[key] = entry
+    cached_bytes += entry.size
+    _evict(time.monotonic())
+
+    coordinator = _coordinator
+    if coordinator is not None:
+        # Otro worker pudo haber recibido la original: el broker decide
+        try:
+            shared = await coordinator[0](list(key))
+        except asyncio.CancelledError:
+            # Cliente desconectado: liberar a quienes esperan esta entrada
+            _drop(key, entry)
+            entry.done.set_result(False)
+            raise
+        except Exception:
+            # Sin broker: procesar localmente (como fuera del cluster)
+            idempotency_stats["coordinator_errors"] += 1
+            coordinator = None
+        else:
+            if not shared.get("owner"):
+                idempotency_stats["hits"] += 1
+                idempotency_stats["shared_hits"] += 1
+                idempotency_lookups.labels("hit").inc()
+                stored = _adopt(entry, shared)
+                entry.done.set_result(stored)
+                return _replay(entry) if stored else _streamed_conflict()
+
+    idempotency_stats["misses"] += 1
+    idempotency_lookups.labels("miss").inc()
+    stored = False
+    try:
+        response = await handler(request)
+        stored = _store(key, entry, response)
+        if not stored and response.prepared and response.status < 500:
+            # Streaming: no se puede repetir, pero sí impedir que se procese dos veces
+            entry.status = response.status
+        return response
+    finally:
+        if not stored and not entry.status:
+            idempotency_stats["not_cached"] += 1
+            _drop(key, entry)
+        entry.done.set_result(stored)
+        if coordinator is not None:
+            coordinator[1](list(key), _shared_result(entry))
+
+def get_stats() -> Dict:
+    return {
+        **idempotency_stats,
+        "entries": len(_cache),
+        "bytes": cached_bytes,
+        "max_entries": MAX_ENTRIES,
+        "max_bytes": MAX_BYTES,
+        "ttl": TTL
+    }
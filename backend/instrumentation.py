@@ -0,0 +1,302 @@
+# backend/instrumentation.py
+"""
+Instrumentación opcional del event loop y de las rutas
+- Fases por request (parse, validate, broadcast): histograma por ruta y
+  header Server-Timing. El código marca las fases con `with phase(...)`;
+  sin el middleware instalado cada marca es un objeto nulo compartido
+- Watchdog de callbacks lentos: un thread aparte publica un callback en
+  el loop; si no corre a tiempo, el loop está bloqueado y se captura la
+  pila del thread del loop (el culpable, no quien se entera después)
+- Profiler por muestreo (solo admin): muestrea la pila del loop N
+  segundos y retorna stacks colapsados para flame graphs
+- El lag del event loop ya lo mide metrics.monitor_event_loop_lag
+Todo desactivado por defecto: DOTLEMOR_INSTRUMENT=1 activa fases y
+watchdog; DOTLEMOR_ADMIN_TOKEN habilita las rutas /debug/*
+"""
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from backend import metrics
+from backend.utils.logger import log, log_sampled
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+INSTRUMENTATION_ENABLED = os.environ.get("DOTLEMOR_INSTRUMENT", "0") == "1"
+ADMIN_TOKEN = os.environ.get("DOTLEMOR_ADMIN_TOKEN") or None
+
+SLOW_CALLBACK_THRESHOLD = 0.1   # segundos de loop bloqueado para reportar
+WATCHDOG_INTERVAL = 0.1         # segundos entre sondeos del watchdog
+SLOW_CALLBACK_HISTORY = 20      # bloqueos recientes guardados (con su pila)
+MAX_STACK_DEPTH = 64
+
+PROFILE_DEFAULT_SECONDS = 5
+PROFILE_MAX_SECONDS = 30
+PROFILE_DEFAULT_HZ = 100
+PROFILE_MAX_HZ = 1000
+
+# ==========================================
+# ESTADO
+# ==========================================
+# Tiempos acumulados por fase de la request en curso (None: sin medir)
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("dotlemor_phase_timings", default=None)
+
+_watchdog: Optional[threading.Thread] = None
+_watchdog_stop = threading.Event()
+_profiling = False
+
+slow_callbacks: deque = deque(maxlen=SLOW_CALLBACK_HISTORY)
+
+instrumentation_stats = {
+    "timed_requests": 0,
+    "slow_callbacks": 0,
+    "max_block": 0.0,
+    "profiles": 0
+}
+
+phase_duration = metrics.Histogram(
+    "dotlemor_http_phase_duration_seconds", "Duración de cada fase de una request por ruta",
+    ("route", "phase")
+)
+slow_callback_total = metrics.Counter(
+    "dotlemor_slow_callbacks_total", "Bloqueos del event loop mayores al umbral"
+)
+
+# ==========================================
+# FASES POR REQUEST
+# ==========================================
+class _Phase:
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings: Dict[str, float], name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + elapsed
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+_NULL_PHASE = _NullPhase()
+
+def phase(name: str):
+    """
+    Mide una fase de la request actual: `with phase("validate"): ...`
+    Las repeticiones de una fase se suman (p. ej. validar cada item)
+    """
+    timings = _timings.get()
+    if timings is None:
+        return _NULL_PHASE
+    return _Phase(timings, name)
+
+@web.middleware
+async def phase_timing_middleware(request: web.Request, handler):
+    """Publica las fases medidas en el histograma y en Server-Timing"""
+    if request.headers.get("Upgrade", "").lower() == "websocket":
+        # Una conexión dura horas: sus acciones no son fases de una request
+        return await handler(request)
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        response = await handler(request)
+    finally:
+        _timings.reset(token)
+        if timings:
+            instrumentation_stats["timed_requests"] += 1
+            route = metrics.route_label(request)
+            for name, elapsed in timings.items():
+                phase_duration.labels(route, name).observe(elapsed)
+
+    if timings and not response.prepared:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in timings.items()
+        )
+    return response
+
+# ==========================================
+# PILAS
+# ==========================================
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+def _stack(frame) -> list:
+    """Pila desde la raíz hasta el frame actual (acotada)"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+# ==========================================
+# WATCHDOG DE CALLBACKS LENTOS
+# ==========================================
+def start_watchdog(loop: asyncio.AbstractEventLoop = None):
+    """Inicia el thread que detecta bloqueos del loop (llamar desde el loop)"""
+    global _watchdog
+    if _watchdog is not None:
+        return
+    loop = loop or asyncio.get_running_loop()
+    _watchdog_stop.clear()
+    _watchdog = threading.Thread(
+        target=_watch_loop, args=(loop, threading.get_ident()),
+        name="dotlemor-loop-watchdog", daemon=True
+    )
+    _watchdog.start()
+
+def stop_watchdog():
+    global _watchdog
+    if _watchdog is None:
+        return
+    _watchdog_stop.set()
+    _watchdog.join(timeout=1.0)
+    _watchdog = None
+
+def _watch_loop(loop: asyncio.AbstractEventLoop, loop_thread: int):
+    """
+    Sondea el loop con un callback. Costo para el loop: un callback
+    trivial cada WATCHDOG_INTERVAL
+    """
+    while not _watchdog_stop.wait(WATCHDOG_INTERVAL):
+        ran = threading.Event()
+        posted = time.monotonic()
+        try:
+            loop.call_soon_threadsafe(ran.set)
+        except RuntimeError:
+            return  # loop cerrado
+        if ran.wait(SLOW_CALLBACK_THRESHOLD):
+            continue
+
+        # Bloqueado: la pila actual del thread del loop es el culpable
+        frame = sys._current_frames().get(loop_thread)
+        stack = _stack(frame) if frame is not None else []
+        del frame
+        while not ran.wait(WATCHDOG_INTERVAL):
+            if _watchdog_stop.is_set() or loop.is_closed():
+                return
+        try:
+            loop.call_soon_threadsafe(_report_block, time.monotonic() - posted, stack)
+        except RuntimeError:
+            return
+
+def _report_block(duration: float, stack: list):
+    """Registra un bloqueo (corre en el loop, ya desbloqueado)"""
+    instrumentation_stats["slow_callbacks"] += 1
+    instrumentation_stats["max_block"] = max(instrumentation_stats["max_block"], round(duration, 4))
+    slow_callback_total.inc()
+    slow_callbacks.append({
+        "at": datetime.now().isoformat(),
+        "duration": round(duration, 4),
+        "stack": stack
+    })
+    log_sampled(f"🐌 Event loop bloqueado {duration * 1000:.0f} ms en {stack[-1] if stack else '?'}",
+                level="warning")
+
+# ==========================================
+# PROFILER POR MUESTREO
+# ==========================================
+def sample_stacks(thread_id: int, seconds: float, hz: int) -> Counter:
+    """
+    Muestrea la pila de un thread `hz` veces por segundo durante `seconds`
+    Retorna pila colapsada ("raíz;...;hoja") -> muestras
+    Correr en otro thread: el muestreado sigue trabajando normalmente
+    """
+    samples: Counter = Counter()
+    interval = 1.0 / hz
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        samples[";".join(_stack(frame))] += 1
+        del frame
+        time.sleep(interval)
+    return samples
+
+def is_admin(request: web.Request) -> bool:
+    """Authorization: Bearer <DOTLEMOR_ADMIN_TOKEN> (sin token configurado, nadie)"""
+    if ADMIN_TOKEN is None:
+        return False
+    supplied = request.headers.get("Authorization", "")
+    return hmac.compare_digest(supplied.encode(), f"Bearer {ADMIN_TOKEN}".encode())
+
+def forbidden() -> web.Response:
+    """403 para las vistas de administración"""
+    return web.json_response({"status": "error", "message": "Admin token required"}, status=403)
+
+routes = web.RouteTableDef()
+
+@routes.get("/debug/profile")
+async def profile(request: web.Request) -> web.Response:
+    """
+    GET /debug/profile?seconds=5&hz=100 (Authorization: Bearer <token>)
+    Perfil del event loop de este proceso en formato colapsado:
+    una línea "raíz;...;hoja muestras" por pila (flamegraph.pl, speedscope)
+    """
+    global _profiling
+    if not is_admin(request):
+        return forbidden()
+    try:
+        seconds = float(request.query.get("seconds", PROFILE_DEFAULT_SECONDS))
+        hz = int(request.query.get("hz", PROFILE_DEFAULT_HZ))
+    except ValueError:
+        return web.json_response({"status": "error", "message": "Invalid seconds or hz"}, status=400)
+    if not 0 < seconds <= PROFILE_MAX_SECONDS or not 0 < hz <= PROFILE_MAX_HZ:
+        return web.json_response({
+            "status": "error",
+            "message": f"seconds must be in (0, {PROFILE_MAX_SECONDS}] and hz in (0, {PROFILE_MAX_HZ}]"
+        }, status=400)
+    if _profiling:
+        return web.json_response({"status": "error", "message": "Profile already running"}, status=409)
+
+    _profiling = True
+    instrumentation_stats["profiles"] += 1
+    log(f"🔬 Perfilando el event loop {seconds:g}s a {hz} Hz")
+    try:
+        samples = await asyncio.get_running_loop().run_in_executor(
+            None, sample_stacks, threading.get_ident(), seconds, hz
+        )
+    finally:
+        _profiling = False
+
+    body = "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+    return web.Response(text=body, content_type="text/plain")
+
+@routes.get("/debug/instrumentation")
+async def instrumentation_info(request: web.Request) -> web.Response:
+    """Estado de la instrumentación y últimos bloqueos del loop (con su pila)"""
+    if not is_admin(request):
+        return forbidden()
+    return web.json_response({**get_stats(), "recent_slow_callbacks": list(slow_callbacks)})
+
+def get_stats() -> dict:
+    return {
+        **instrumentation_stats,
+        "enabled": INSTRUMENTATION_ENABLED,
+        "watchdog": _watchdog is not None,
+        "slow_callback_threshold": SLOW_CALLBACK_THRESHOLD
+    }
@@ -0,0 +1,232 @@
+# backend/leaderboard.py
+"""
+Leaderboard y agregados de donaciones mantenidos incrementalmente
+- Totales y cantidad de donaciones por usuario
+- Ranking acotado a las RANKED primeras posiciones (lista ordenada con
+  bisect): actualizar cuesta O(log RANKED + RANKED), sin importar cuántos
+  usuarios haya; leer el top-K es un slice, no un sort
+- Totales móviles de 1 minuto y 1 hora en cubetas de tiempo
+- Publica "leaderboard_delta" por /ws cuando cambia el total o la posición
+  de alguien en el top-K
+- Se reconstruye al arrancar desde el ledger de eventos
+"""
+import bisect
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from aiohttp import web
+
+from backend import event_dispatcher
+from backend.rate_limiter import WindowCounter
+from backend.utils.logger import log
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+TOP_K = 10              # posiciones del ranking que generan deltas
+MAX_LIMIT = 100         # posiciones máximas por GET /leaderboard
+RANKED = MAX_LIMIT      # posiciones mantenidas en orden (más allá: sin posición)
+
+# Ventanas móviles: nombre -> (duración, tamaño de cubeta) en segundos
+WINDOWS = {
+    "1m": (60, 1),
+    "1h": (3600, 60)
+}
+
+# ==========================================
+# ESTADO
+# ==========================================
+totals: Dict[str, float] = {}
+counts: Dict[str, int] = {}
+
+# (-total, usuario) ordenado de los RANKED primeros: índice 0 = primer lugar
+# Desempate estable por nombre de usuario. Los totales solo crecen: quien
+# sale del ranking no puede superar al último sin volver a donar, así que
+# la lista es siempre exactamente el top RANKED
+ranking: list = []
+
+window_amounts = {name: WindowCounter(window, resolution) for name, (window, resolution) in WINDOWS.items()}
+window_counts = {name: WindowCounter(window, resolution) for name, (window, resolution) in WINDOWS.items()}
+
+leaderboard_stats = {
+    "donations": 0,
+    "total_amount": 0.0,
+    "deltas_sent": 0
+}
+
+# ==========================================
+# ACTUALIZACIÓN
+# ==========================================
+def record(event_data: dict) -> Optional[dict]:
+    """
+    Suma una donación a los agregados: O(1) en usuarios, O(RANKED) en el ranking
+    Retorna el delta del top-K si el donante está en él, o None
+    """
+    if event_data.get("type") != "donation":
+        return None
+    user = event_data.get("user")
+    try:
+        amount = float(event_data.get("amount", 0))
+    except (TypeError, ValueError):
+        return None
+    if not user or amount <= 0:
+        return None
+
+    now = _event_time(event_data)
+    for name in WINDOWS:
+        window_amounts[name].add(amount, now)
+        window_counts[name].add(1, now)
+    leaderboard_stats["donations"] += 1
+    leaderboard_stats["total_amount"] += amount
+
+    previous = totals.get(user)
+    total = (previous or 0.0) + amount
+    totals[user] = total
+    counts[user] = counts.get(user, 0) + 1
+
+    old_rank = None
+    if previous is not None and ranking and (-previous, user) <= ranking[-1]:
+        old_rank = bisect.bisect_left(ranking, (-previous, user))
+        del ranking[old_rank]
+    entry = (-total, user)
+    if len(ranking) >= RANKED and entry > ranking[-1]:
+        # Sigue fuera del ranking
+        return None
+    new_rank = bisect.bisect_left(ranking, entry)
+    ranking.insert(new_rank, entry)
+    if len(ranking) > RANKED:
+        ranking.pop()
+
+    if new_rank >= TOP_K:
+        return None
+
+    # Los totales solo crecen: un usuario únicamente sube de posición.
+    # Cambian su entrada y las desplazadas, hasta la anterior (o el final
+    # del top); sin cambio de posición, solo la suya (nuevo total)
+    last = min(TOP_K, len(ranking)) - 1
+    if old_rank is not None:
+        last = min(old_rank, last)
+    return {
+        "type": "leaderboard_delta",
+        "ranks": [_entry(rank) for rank in range(new_rank, last + 1)]
+    }
+
+def on_event(event_data: dict):
+    """Observador del dispatcher: actualiza y publica el delta si lo hay"""
+    delta = record(event_data)
+    if delta is not None:
+        leaderboard_stats["deltas_sent"] += 1
+        event_dispatcher.notify(delta)
+
+def reset():
+    """Vacía los agregados (en el lugar: otros módulos guardan referencias)"""
+    totals.clear()
+    counts.clear()
+    ranking.clear()
+    for counters in (window_amounts, window_counts):
+        for name, (window, resolution) in WINDOWS.items():
+            counters[name] = WindowCounter(window, resolution)
+    for key in leaderboard_stats:
+        leaderboard_stats[key] = type(leaderboard_stats[key])()
+
+def rebuild(events: Iterable[dict]) -> int:
+    """
+    Reconstruye los agregados a partir de eventos persistidos (sin publicar)
+    Parte de cero: una app nueva en el mismo proceso no suma dos veces
+    """
+    reset()
+    start = time.perf_counter()
+    replayed = 0
+    for event_data in events:
+        if event_data.get("type") == "donation":
+            record(event_data)
+            replayed += 1
+    elapsed = (time.perf_counter() - start) * 1000
+    log(f"🏆 Leaderboard reconstruido: {replayed} donación(es) de {len(totals)} usuario(s) ({elapsed:.1f} ms)")
+    return replayed
+
+def _event_time(event_data: dict) -> float:
+    """Instante del evento (epoch); los replays usan su timestamp original"""
+    timestamp = event_data.get("timestamp")
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+# ==========================================
+# CONSULTAS
+# ==========================================
+def _entry(rank: int) -> dict:
+    return _format(rank + 1, ranking[rank][1])
+
+def _format(rank: Optional[int], user: str) -> dict:
+    return {
+        "rank": rank,
+        "user": user,
+        "total": round(totals[user], 2),
+        "count": counts[user]
+    }
+
+def get_user(user: str) -> Optional[dict]:
+    """
+    Total, cantidad y posición de un usuario: O(log RANKED)
+    Fuera de las RANKED primeras posiciones, "rank" es null
+    """
+    total = totals.get(user)
+    if total is None:
+        return None
+    entry = (-total, user)
+    if not ranking or entry > ranking[-1]:
+        return _format(None, user)
+    return _format(bisect.bisect_left(ranking, entry) + 1, user)
+
+def get_leaderboard(limit: int = TOP_K) -> dict:
+    """Top `limit` más agregados globales y ventanas móviles"""
+    now = time.time()
+    return {
+        "top": [_entry(rank) for rank in range(min(limit, len(ranking)))],
+        "users": len(totals),
+        "donations": leaderboard_stats["donations"],
+        "total_amount": round(leaderboard_stats["total_amount"], 2),
+        "windows": {
+            name: {
+                "amount": round(window_amounts[name].total(now), 2),
+                "count": window_counts[name].total(now)
+            }
+            for name in WINDOWS
+        }
+    }
+
+# ==========================================
+# RUTAS
+# ==========================================
+routes = web.RouteTableDef()
+
+@routes.get("/leaderboard")
+async def leaderboard_handler(request):
+    """
+    GET /leaderboard?limit=N   top N (por defecto TOP_K) y agregados
+    GET /leaderboard?user=X    total, cantidad y posición de un usuario
+                               (null fuera de las RANKED primeras)
+    """
+    user = request.query.get("user")
+    if user is not None:
+        entry = get_user(user)
+        if entry is None:
+            return web.json_response(
+                {"status": "error", "message": "Unknown user"},
+                status=404
+            )
+        return web.json_response(entry)
+
+    try:
+        limit = int(request.query.get("limit", TOP_K))
+    except ValueError:
+        return web.json_response(
+            {"status": "error", "message": "limit must be an integer"},
+            status=400
+        )
+    return web.json_response(get_leaderboard(max(1, min(limit, MAX_LIMIT))))
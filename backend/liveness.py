@@ -0,0 +1,148 @@
+# backend/liveness.py
+"""
+Verificación de conexiones WebSocket vivas
+- Rueda de tiempo: cada cliente ocupa una ranura (según su id) y en cada
+  tick se revisa una sola ranura. Los pings y las verificaciones quedan
+  repartidos a lo largo del intervalo en vez de salir todos juntos
+- Un cliente con tráfico reciente no recibe ping:
+    recibido en el último intervalo      -> está vivo
+    enviado en el último intervalo       -> el tráfico mantiene la conexión
+                                            (hasta MAX_SILENCE sin recibir nada)
+- Si tras un ping no llega nada (pong u otro mensaje) antes de su
+  próxima revisión, el cliente se da por muerto y se elimina en ese tick
+- Reemplaza el heartbeat JSON broadcast y la limpieza por recorrido completo
+"""
+import asyncio
+import time
+from typing import Callable, List, Optional, Set
+
+from backend.utils.logger import log, log_sampled
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+PING_INTERVAL = 30.0        # segundos entre revisiones de un mismo cliente
+WHEEL_SLOTS = 30            # ranuras de la rueda (un tick por ranura)
+MAX_SILENCE = 90.0          # segundos sin recibir nada antes de forzar un ping
+
+TICK_INTERVAL = PING_INTERVAL / WHEEL_SLOTS
+
+# ==========================================
+# ESTADO
+# ==========================================
+# Ranuras de la rueda: registros de cliente (ClientRecord del dispatcher)
+wheel: List[Set[object]] = [set() for _ in range(WHEEL_SLOTS)]
+cursor = 0
+
+# Acción al detectar un cliente muerto (la instala el dispatcher)
+_dead_handler: Optional[Callable[[object, str], None]] = None
+
+liveness_stats = {
+    "ticks": 0,
+    "pings_sent": 0,
+    "skipped_recent": 0,
+    "dead_detected": 0,
+    "closed_reaped": 0
+}
+
+def set_dead_handler(handler: Callable[[object, str], None]):
+    """Instala la función que elimina un cliente muerto: handler(registro, motivo)"""
+    global _dead_handler
+    _dead_handler = handler
+
+# ==========================================
+# REGISTRO
+# ==========================================
+def watch(record):
+    """Agrega un cliente a la rueda. La ranura sale del id: reparto parejo
+    aunque miles de clientes se reconecten en el mismo segundo"""
+    now = time.monotonic()
+    record.last_received = now
+    record.last_sent = now
+    record.ping_sent_at = None
+    wheel[record.id % WHEEL_SLOTS].add(record)
+
+def unwatch(record):
+    wheel[record.id % WHEEL_SLOTS].discard(record)
+
+def tracked() -> int:
+    return sum(len(slot) for slot in wheel)
+
+# ==========================================
+# RUEDA
+# ==========================================
+def _visit(record, now: float) -> bool:
+    """
+    Revisa un cliente. Retorna True si hay que enviarle un ping
+    """
+    if record.ws.closed:
+        liveness_stats["closed_reaped"] += 1
+        _dead(record, "closed")
+        return False
+
+    if record.ping_sent_at is not None:
+        if record.last_received < record.ping_sent_at:
+            # Nada recibido desde el ping de la revisión anterior
+            liveness_stats["dead_detected"] += 1
+            _dead(record, "ping_timeout")
+            return False
+        record.ping_sent_at = None
+
+    silence = now - record.last_received
+    if silence < PING_INTERVAL or (now - record.last_sent < PING_INTERVAL and silence < MAX_SILENCE):
+        liveness_stats["skipped_recent"] += 1
+        return False
+
+    record.ping_sent_at = now
+    return True
+
+def _dead(record, reason: str):
+    unwatch(record)
+    if _dead_handler is not None:
+        _dead_handler(record, reason)
+
+async def _ping(record):
+    try:
+        await record.ws.ping()
+    except Exception as e:
+        # Falló la escritura: la próxima revisión lo dará por muerto
+        log_sampled(f"⚠️ Error al enviar ping: {type(e).__name__}", level="warning")
+
+async def tick() -> int:
+    """Revisa la ranura actual y avanza la rueda. Retorna los pings enviados"""
+    global cursor
+    slot = wheel[cursor]
+    cursor = (cursor + 1) % WHEEL_SLOTS
+    liveness_stats["ticks"] += 1
+
+    now = time.monotonic()
+    to_ping = [record for record in list(slot) if _visit(record, now)]
+    if to_ping:
+        liveness_stats["pings_sent"] += len(to_ping)
+        await asyncio.gather(*(_ping(record) for record in to_ping))
+    return len(to_ping)
+
+async def run_liveness():
+    """
+    Loop de la rueda: un tick cada PING_INTERVAL / WHEEL_SLOTS segundos
+    Llamar esta función en un task separado
+    """
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time() + TICK_INTERVAL
+    while True:
+        try:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            next_tick = max(next_tick + TICK_INTERVAL, loop.time())
+            await tick()
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            log(f"❌ Error en verificación de conexiones: {e}", level="error")
+
+def get_stats() -> dict:
+    return {
+        **liveness_stats,
+        "tracked": tracked(),
+        "ping_interval": PING_INTERVAL,
+        "wheel_slots": WHEEL_SLOTS
+    }
@@ -3,16 +3,36 @@
 Servidor principal de DotLemor
 Integra API REST + WebSockets
 """
+import argparse
 import asyncio
+import os
+import signal
 from aiohttp import web
 import aiohttp_cors
 
-from backend.donation_api import routes as api_routes
+from backend import admission
+from backend import cluster
+from backend import event_ledger
+from backend import idempotency
+from backend import instrumentation
+from backend import leaderboard
+from backend import liveness
+from backend import static_assets
+from backend import world
+from backend import metrics
+from backend.donation_api import routes as api_routes, collect_stats as get_api_stats
+from backend.rate_limiter import sweep_idle_keys
 from backend.event_dispatcher import (
+    add_event_listener,
+    remove_event_listener,
+    drain as drain_clients,
     websocket_handler,
-    cleanup_dead_connections,
-    send_heartbeat,
-    get_stats as get_ws_stats
+    get_stats as get_ws_stats,
+    get_client_page as get_ws_client_page,
+    get_client_by_id as get_ws_client,
+    get_room_stats as get_ws_room_stats,
+    valid_room_name,
+    CLIENT_PAGE_SIZE
 )
 from backend.utils.logger import log
 
@@ -22,6 +42,10 @@ from backend.utils.logger import log
 CONFIG = {
     "host": "127.0.0.1",
     "port": 8080,
+    "workers": 1,   # >1 activa el modo multi-proceso (SO_REUSEPORT + broker)
+    "world": world.WORLD_ENABLED,   # mundo autoritativo en el servidor
+    "frontend": static_assets.FRONTEND_ENABLED,   # servir frontend/ en / y /static/
+    "instrument": instrumentation.INSTRUMENTATION_ENABLED,   # fases por request + watchdog del loop
     "cors_origins": [
         "http://127.0.0.1:5500",
         "http://localhost:5500",
@@ -32,8 +56,46 @@ CONFIG = {
 # RUTAS ADICIONALES
 # ==========================================
 async def websocket_stats(request):
-    """Endpoint para ver estadísticas de WebSockets"""
-    stats = get_ws_stats()
+    """
+    Endpoint para ver estadísticas de WebSockets
+    Por defecto solo agregados. Detalle de clientes (de este worker; con
+    IPs, así que solo con el token de admin: Authorization: Bearer <token>):
+      ?clients=1&offset=0&limit=50   página de clientes
+      ?client=<id>                   un cliente
+      ?room=<sala>                   estadísticas de una sala en este worker
+    """
+    wants_clients = "client" in request.query or request.query.get("clients") in ("1", "true")
+    if wants_clients and not instrumentation.is_admin(request):
+        return instrumentation.forbidden()
+    room = request.query.get("room")
+    if room is not None and not valid_room_name(room):
+        return web.json_response({"status": "error", "message": "Invalid room name"}, status=400)
+    try:
+        client_id = request.query.get("client")
+        if client_id is not None:
+            client = get_ws_client(int(client_id))
+            if client is None:
+                return web.json_response({"status": "error", "message": "Client not found"}, status=404)
+            return web.json_response(client)
+        
+        if room is not None:
+            stats = get_ws_room_stats(room)
+            if stats is None:
+                return web.json_response({"status": "error", "message": "Room not found"}, status=404)
+        else:
+            stats = cluster.aggregate("ws", get_ws_stats())
+        if wants_clients:
+            stats["client_page"] = get_ws_client_page(
+                int(request.query.get("offset", 0)),
+                int(request.query.get("limit", CLIENT_PAGE_SIZE)),
+                room
+            )
+    except ValueError:
+        return web.json_response({"status": "error", "message": "Invalid client, offset or limit"}, status=400)
+    
+    if CONFIG["world"] and room is None:
+        # Cada worker simula el mismo mundo: no se suma entre workers
+        stats["world"] = world.get_stats()
     return web.json_response(stats)
 
 # ==========================================
@@ -41,16 +103,38 @@ async def websocket_stats(request):
 # ==========================================
 def create_app():
     """Crea y configura la aplicación aiohttp"""
-    app = web.Application()
+    # metrics por fuera: también cuenta los 503 del control de admisión
+    # idempotency antes de admission: una repetición se responde aun bajo presión
+    middlewares = [
+        metrics.metrics_middleware,
+        idempotency.idempotency_middleware,
+        admission.admission_middleware
+    ]
+    if CONFIG["instrument"]:
+        # Sin instalar, las fases marcadas en el código no cuestan nada
+        middlewares.insert(1, instrumentation.phase_timing_middleware)
+    app = web.Application(middlewares=middlewares)
     
     # 1. Registrar rutas de API REST
     app.add_routes(api_routes)
+    app.add_routes(leaderboard.routes)
     
     # 2. Registrar WebSocket
     app.router.add_get('/ws', websocket_handler)
     
-    # 3. Registrar stats de WebSocket
+    # Frontend precomprimido (el build se hace al iniciar)
+    if CONFIG["frontend"]:
+        static_assets.setup(app)
+    
+    # 3. Registrar stats de WebSocket y métricas (formato Prometheus)
     app.router.add_get('/ws/stats', websocket_stats)
+    app.router.add_get('/metrics', metrics.metrics_handler)
+    
+    # Salas: después de /ws/stats, que tiene precedencia sobre /ws/{room}
+    app.router.add_get('/ws/{room}', websocket_handler)
+    if instrumentation.ADMIN_TOKEN:
+        # Profiler y bloqueos del loop (solo con token de admin)
+        app.add_routes(instrumentation.routes)
     
     # 4. Configurar CORS
     cors = aiohttp_cors.setup(app, defaults={
@@ -67,22 +151,68 @@ def create_app():
     for route in list(app.router.routes()):
         cors.add(route)
     
-    # 5. Background tasks
+    # 5. Fuentes de estadísticas agregadas entre workers
+    cluster.register_stats_source(
+        "ws", get_ws_stats,
+        keep=("send_queue_size", "slow_client_policy", "window_ms", "max_events",
+              "mean_ack_lag", "max", "max_clients", "event_rate")
+    )
+    cluster.register_stats_source(
+        "api", get_api_stats,
+        keep=("limit", "window", "max_keys", "last_commit_ms", "scan_ms", "directory",
+              "max_inflight", "pressure", "max_entries", "max_bytes", "ttl")
+    )
+    
+    # 6. Background tasks
     async def start_background_tasks(app):
         """Inicia tareas en background"""
-        app['cleanup_task'] = asyncio.create_task(cleanup_dead_connections())
-        app['heartbeat_task'] = asyncio.create_task(send_heartbeat())
+        # Ledger durable (un directorio por worker en modo cluster)
+        ledger_dir = event_ledger.LEDGER_DIR
+        if cluster.is_worker():
+            ledger_dir = os.path.join(ledger_dir, f"worker-{cluster.worker_state['worker_id']}")
+        event_ledger.start_ledger(ledger_dir)
+        
+        if CONFIG["frontend"]:
+            # Lee, hashea y comprime el frontend una sola vez, fuera del loop
+            await asyncio.get_running_loop().run_in_executor(None, static_assets.build)
+        
+        # Agregados derivados (sala por defecto): reconstruir desde el
+        # ledger y seguir en vivo
+        leaderboard.rebuild(event for event in event_ledger.replay_all() if "room" not in event)
+        add_event_listener(leaderboard.on_event)
+        
+        if CONFIG["world"]:
+            world.install()
+            app['world_task'] = asyncio.create_task(world.run_world())
+        
+        
+        app['liveness_task'] = asyncio.create_task(liveness.run_liveness())
+        app['rate_limit_sweep_task'] = asyncio.create_task(sweep_idle_keys())
+        app['loop_lag_task'] = asyncio.create_task(metrics.monitor_event_loop_lag())
+        if CONFIG["instrument"]:
+            instrumentation.start_watchdog()
         log("✅ Tareas en background iniciadas")
     
     async def cleanup_background_tasks(app):
         """Limpia tareas en background"""
-        app['cleanup_task'].cancel()
-        app['heartbeat_task'].cancel()
+        # Los observadores son globales del proceso: quitarlos para que otra
+        # app en el mismo proceso no los registre por duplicado
+        remove_event_listener(leaderboard.on_event)
+        app['liveness_task'].cancel()
+        app['rate_limit_sweep_task'].cancel()
+        app['loop_lag_task'].cancel()
+        instrumentation.stop_watchdog()
+        if 'world_task' in app:
+            world.uninstall()
+            app['world_task'].cancel()
+            await asyncio.gather(app['world_task'], return_exceptions=True)
         await asyncio.gather(
-            app['cleanup_task'],
-            app['heartbeat_task'],
+            app['liveness_task'],
+            app['rate_limit_sweep_task'],
+            app['loop_lag_task'],
             return_exceptions=True
         )
+        event_ledger.stop_ledger()
         log("🧹 Tareas en background finalizadas")
     
     # Registrar startup/cleanup hooks
@@ -94,15 +224,26 @@ def create_app():
 # ==========================================
 # MAIN
 # ==========================================
-async def main():
-    """Función principal"""
-    log("=" * 50)
-    log("🎮 DOTLEMOR SERVER")
-    log("=" * 50)
+async def main(worker_id: int = None, broker_path: str = None):
+    """
+    Función principal
+    En modo cluster cada worker la ejecuta con su id y la ruta del broker
+    """
+    is_primary = worker_id in (None, 0)
+    
+    if is_primary:
+        log("=" * 50)
+        log("🎮 DOTLEMOR SERVER")
+        log("=" * 50)
     
     # Crear aplicación
     app = create_app()
     
+    # Conectar al broker (modo cluster)
+    broker_task = None
+    if broker_path is not None:
+        broker_task = await cluster.join_cluster(worker_id, broker_path)
+    
     # Iniciar servidor
     runner = web.AppRunner(app)
     await runner.setup()
@@ -110,36 +251,67 @@ async def main():
     site = web.TCPSite(
         runner,
         CONFIG["host"],
-        CONFIG["port"]
+        CONFIG["port"],
+        reuse_port=broker_path is not None
     )
     
     await site.start()
     
+    if not is_primary:
+        log(f"🚀 Worker {worker_id} escuchando en http://{CONFIG['host']}:{CONFIG['port']}")
+        return await _serve_forever(runner, site, broker_task)
+    
     log(f"")
     log(f"🚀 Servidor iniciado en http://{CONFIG['host']}:{CONFIG['port']}")
     log(f"")
     log(f"📡 Endpoints disponibles:")
     log(f"   REST API:")
     log(f"      POST /simulate_donation  - Simular eventos")
+    log(f"      POST /rooms/<sala>/...   - Ingesta a una sala")
     log(f"      GET  /health             - Estado del servidor")
     log(f"      GET  /stats              - Estadísticas de API")
+    log(f"      GET  /leaderboard        - Top donadores y totales móviles")
+    log(f"      GET  /metrics            - Métricas (Prometheus)")
     log(f"")
+    if CONFIG["frontend"]:
+        log(f"   Frontend:")
+        log(f"      GET  /                   - Overlay (build {static_assets.build_id})")
+        log(f"      GET  /static/...         - Archivos con caché inmutable")
+        log(f"")
     log(f"   WebSocket:")
     log(f"      WS   /ws                 - Conexión WebSocket")
+    log(f"      WS   /ws/<sala>          - Conexión a una sala")
     log(f"      GET  /ws/stats           - Estadísticas de WS")
     log(f"")
     log(f"✅ Servidor listo. Presiona Ctrl+C para detener.")
     log(f"")
     
-    # Mantener servidor vivo
+    await _serve_forever(runner, site, broker_task)
+
+async def _serve_forever(runner: web.AppRunner, site: web.TCPSite, broker_task: asyncio.Task = None):
+    """
+    Mantiene el servidor vivo hasta la interrupción y libera recursos
+    SIGTERM (deploy): deja de aceptar conexiones y drena los WebSockets
+    en olas antes de cerrar; Ctrl+C cierra de inmediato
+    """
+    stop = asyncio.Event()
     try:
-        while True:
-            await asyncio.sleep(3600)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except NotImplementedError:
+        pass  # Windows: solo Ctrl+C
+    
+    try:
+        await stop.wait()
+        log("🛑 SIGTERM recibido: drenando conexiones...")
+        await site.stop()
+        await drain_clients()
     except KeyboardInterrupt:
         log("")
         log("🛑 Señal de interrupción recibida...")
     finally:
         log("🧹 Limpiando recursos...")
+        if broker_task is not None:
+            broker_task.cancel()
         await runner.cleanup()
         log("👋 Servidor finalizado correctamente")
 
@@ -147,10 +319,31 @@ async def main():
 # ENTRY POINT
 # ==========================================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor DotLemor")
+    parser.add_argument("--host", default=CONFIG["host"], help="interfaz de escucha")
+    parser.add_argument("--port", type=int, default=CONFIG["port"], help="puerto HTTP/WebSocket")
+    parser.add_argument("--workers", type=int, default=CONFIG["workers"],
+                        help="procesos worker que comparten el puerto (SO_REUSEPORT)")
+    parser.add_argument("--world", action="store_true", default=CONFIG["world"],
+                        help="simular el mundo en el servidor (snapshot + deltas por /ws)")
+    parser.add_argument("--instrument", action="store_true", default=CONFIG["instrument"],
+                        help="medir fases por request y detectar bloqueos del event loop")
+    parser.add_argument("--no-frontend", dest="frontend", action="store_false", default=CONFIG["frontend"],
+                        help="no servir frontend/ (usar un servidor aparte)")
+    args = parser.parse_args()
+    CONFIG.update(host=args.host, port=args.port, workers=args.workers, world=args.world,
+                  frontend=args.frontend, instrument=args.instrument)
+    
     try:
-        asyncio.run(main())
+        if args.workers > 1:
+            cluster.run_cluster(args.workers, {
+                "host": args.host, "port": args.port, "world": args.world, "frontend": args.frontend,
+                "instrument": args.instrument
+            })
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         pass  # Ya manejado en main()
     except Exception as e:
-        log(f"❌ Error fatal: {e}")
+        log(f"❌ Error fatal: {e}", level="error")
         raise
\ No newline at end of file
@@ -0,0 +1,287 @@
+# backend/metrics.py
+"""
+Registro de métricas en proceso con exposición en formato texto de Prometheus
+- Counter, Gauge e Histogram (cubetas fijas) con etiquetas opcionales
+- Registrar es O(1) (histogramas: O(log cubetas)); el scrape es O(métricas)
+- Los gauges pueden leerse con una función al momento del scrape
+"""
+import asyncio
+import bisect
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from backend.utils.logger import log
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+LOOP_LAG_INTERVAL = 0.25    # segundos entre mediciones de lag del event loop
+
+# ==========================================
+# TIPOS DE MÉTRICA
+# ==========================================
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, "_Metric"] = {}
+        registry.register(self)
+
+    def labels(self, *values) -> "_Metric":
+        """Retorna (y cachea) la serie para esos valores de etiqueta"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._new_child()
+            self._children[values] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _series(self):
+        """(valores de etiqueta, serie) de todas las series"""
+        if self.labelnames:
+            return list(self._children.items())
+        return [((), self)]
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+class Counter(_Metric, _CounterValue):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        _CounterValue.__init__(self)
+        _Metric.__init__(self, name, help_text, labelnames)
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def render(self, const: str) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, values, const)} {_num(child.value)}"
+                for values, child in self._series()]
+
+class _GaugeValue:
+    __slots__ = ("value", "collect")
+
+    def __init__(self, collect: Optional[Callable[[], float]] = None):
+        self.value = 0.0
+        self.collect = collect
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def get(self) -> float:
+        return self.collect() if self.collect is not None else self.value
+
+class Gauge(_Metric, _GaugeValue):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], float]] = None):
+        _GaugeValue.__init__(self, collect)
+        _Metric.__init__(self, name, help_text, labelnames)
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def render(self, const: str) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, values, const)} {_num(child.get())}"
+                for values, child in self._series()]
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Histogram(_Metric, _HistogramValue):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        _HistogramValue.__init__(self, tuple(sorted(buckets)))
+        _Metric.__init__(self, name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.bounds)
+
+    def render(self, const: str) -> List[str]:
+        lines = []
+        for values, child in self._series():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                labels = _labels(self.labelnames + ("le",), values + (le,), const)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, values, const)
+            lines.append(f"{self.name}_sum{labels} {_num(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+# ==========================================
+# REGISTRO
+# ==========================================
+class Registry:
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.constant_labels: Dict[str, str] = {}
+
+    def register(self, metric: _Metric):
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        const = ",".join(f'{key}="{_escape(value)}"' for key, value in self.constant_labels.items())
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(const))
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def set_constant_labels(**labels):
+    """Etiquetas añadidas a todas las series (p. ej. worker en modo cluster)"""
+    registry.constant_labels.update({key: str(value) for key, value in labels.items()})
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names: tuple, values: tuple, const: str) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if const:
+        parts.append(const)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+# ==========================================
+# MÉTRICAS DEL SERVIDOR
+# ==========================================
+http_requests = Counter(
+    "dotlemor_http_requests_total", "Requests HTTP por ruta y estado",
+    ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "dotlemor_http_request_duration_seconds", "Latencia de requests HTTP por ruta",
+    ("method", "route")
+)
+broadcast_duration = Histogram(
+    "dotlemor_broadcast_duration_seconds", "Tiempo de encolar un frame para todos los clientes"
+)
+broadcast_fanout = Histogram(
+    "dotlemor_broadcast_fanout_clients", "Clientes alcanzados por frame difundido",
+    buckets=SIZE_BUCKETS
+)
+ws_send_failures = Counter(
+    "dotlemor_ws_send_failures_total", "Fallos al enviar a clientes WebSocket",
+    ("reason",)
+)
+ws_inbound_rejected = Counter(
+    "dotlemor_ws_inbound_rejected_total", "Mensajes de clientes WebSocket rechazados",
+    ("reason",)
+)
+ws_connections_opened = Counter(
+    "dotlemor_ws_connections_opened_total", "Conexiones WebSocket abiertas"
+)
+ws_connections_closed = Counter(
+    "dotlemor_ws_connections_closed_total", "Conexiones WebSocket cerradas"
+)
+event_loop_lag = Gauge(
+    "dotlemor_event_loop_lag_seconds", "Último retraso medido del event loop"
+)
+event_loop_lag_histogram = Histogram(
+    "dotlemor_event_loop_lag_histogram_seconds", "Distribución del retraso del event loop"
+)
+
+# ==========================================
+# HTTP
+# ==========================================
+def route_label(request: web.Request) -> str:
+    """Plantilla de la ruta (acota la cardinalidad de la etiqueta)"""
+    route = request.match_info.route
+    resource = route.resource if route is not None else None
+    if resource is None:
+        return "unmatched"
+    return resource.canonical
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler):
+    """Cuenta requests y mide su latencia por ruta (no aplica a WebSockets)"""
+    start = time.perf_counter()
+    status = 500
+    response = None
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        route = route_label(request)
+        http_requests.labels(request.method, route, str(status)).inc()
+        if not isinstance(response, web.WebSocketResponse):
+            http_request_duration.labels(request.method, route).observe(time.perf_counter() - start)
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """GET /metrics en formato texto de Prometheus"""
+    return web.Response(
+        body=registry.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+# ==========================================
+# LAG DEL EVENT LOOP
+# ==========================================
+async def monitor_event_loop_lag():
+    """
+    Mide cuánto se retrasa un sleep respecto a lo pedido
+    Llamar esta función en un task separado
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = max(0.0, loop.time() - start - LOOP_LAG_INTERVAL)
+            event_loop_lag.set(lag)
+            event_loop_lag_histogram.observe(lag)
+
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            log(f"❌ Error midiendo lag del event loop: {e}", level="error")
@@ -0,0 +1,205 @@
+# backend/rate_limiter.py
+"""
+Rate limiting de memoria acotada
+Token bucket por clave (IP) con tiempo monotónico y trabajo O(1) por request
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict
+
+from backend.utils.logger import log
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+DEFAULT_MAX_KEYS = 100_000   # claves máximas por limitador (LRU)
+SWEEP_INTERVAL = 30          # segundos entre barridos de claves inactivas
+
+# DOTLEMOR_RATE_LIMITS=0 desactiva los límites (benchmarks de carga)
+RATE_LIMITS_ENABLED = os.environ.get("DOTLEMOR_RATE_LIMITS", "1") != "0"
+
+# Límites por ruta: {ruta: {"requests": int, "window": segundos}}
+ROUTE_LIMITS: Dict[str, dict] = {}
+
+# ==========================================
+# CONTADOR POR VENTANA
+# ==========================================
+class WindowCounter:
+    """
+    Contador de eventos en una ventana deslizante de `window` segundos
+    Anillo de cubetas de `resolution` segundos: incrementar es O(1) y leer
+    es O(window / resolution)
+    """
+    __slots__ = ("window", "resolution", "_buckets", "_stamps")
+
+    def __init__(self, window: int = 60, resolution: int = 1):
+        self.window = window
+        self.resolution = resolution
+        size = max(1, window // resolution)
+        self._buckets = [0] * size
+        self._stamps = [-1] * size
+
+    def add(self, amount: float = 1, now: float = None):
+        slot = int(time.monotonic() if now is None else now) // self.resolution
+        index = slot % len(self._buckets)
+        if self._stamps[index] != slot:
+            if self._stamps[index] > slot:
+                return  # fuera de la ventana (p. ej. replay de eventos viejos)
+            self._stamps[index] = slot
+            self._buckets[index] = 0
+        self._buckets[index] += amount
+
+    def total(self, now: float = None) -> float:
+        slot = int(time.monotonic() if now is None else now) // self.resolution
+        oldest = slot - len(self._buckets)
+        return sum(
+            count for count, stamp in zip(self._buckets, self._stamps)
+            if stamp > oldest
+        )
+
+# ==========================================
+# TOKEN BUCKET
+# ==========================================
+class TokenBucket:
+    """
+    Token bucket de una sola clave (p. ej. por conexión WebSocket)
+    `rate` tokens por segundo, ráfaga máxima `burst`
+    """
+    __slots__ = ("capacity", "refill_rate", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float):
+        self.capacity = float(burst)
+        self.refill_rate = rate
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+
+    def take(self, cost: float = 1.0, now: float = None) -> bool:
+        """Consume `cost` tokens. Retorna False si no alcanzan"""
+        now = time.monotonic() if now is None else now
+        tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.refill_rate)
+        self.stamp = now
+        if tokens < cost:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - cost
+        return True
+
+class TokenBucketLimiter:
+    """
+    Token bucket por clave
+    - `requests` tokens por `window` segundos (ráfaga máxima = requests)
+    - Las claves se guardan en orden LRU y se expulsan al superar `max_keys`
+    - `sweep()` elimina claves inactivas (su cubeta ya estaría llena)
+    """
+
+    def __init__(self, requests: int, window: float, max_keys: int = DEFAULT_MAX_KEYS):
+        self.capacity = float(requests)
+        self.window = window
+        self.refill_rate = requests / window
+        self.max_keys = max_keys
+        # clave -> [tokens, último_acceso]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.recent = WindowCounter(60)
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        """Consume `cost` tokens de la clave. Retorna False si excede el límite"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            tokens = self.capacity
+            bucket = [tokens, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._buckets.move_to_end(key)
+            tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+
+        bucket[1] = now
+        if tokens < cost:
+            bucket[0] = tokens
+            self.rejected += 1
+            return False
+
+        bucket[0] = tokens - cost
+        self.allowed += 1
+        self.recent.add(1, now)
+        return True
+
+    def sweep(self) -> int:
+        """
+        Elimina claves inactivas durante al menos una ventana completa
+        Recorre solo desde el extremo LRU: O(claves eliminadas)
+        """
+        cutoff = time.monotonic() - self.window
+        removed = 0
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if bucket[1] > cutoff:
+                break
+            del self._buckets[key]
+            removed += 1
+        self.evicted += removed
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.capacity),
+            "window": self.window,
+            "active_keys": len(self._buckets),
+            "max_keys": self.max_keys,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+            "allowed_last_minute": self.recent.total()
+        }
+
+# ==========================================
+# LIMITADORES POR RUTA
+# ==========================================
+limiters: Dict[str, TokenBucketLimiter] = {}
+
+def configure_route(route: str, requests: int, window: float, max_keys: int = DEFAULT_MAX_KEYS) -> TokenBucketLimiter:
+    """Configura (o reemplaza) el límite de una ruta"""
+    ROUTE_LIMITS[route] = {"requests": requests, "window": window}
+    limiters[route] = TokenBucketLimiter(requests, window, max_keys)
+    return limiters[route]
+
+def check_route(route: str, key: str, cost: float = 1.0) -> bool:
+    """Verifica el límite de `key` en `route`. Las rutas sin límite siempre pasan"""
+    limiter = limiters.get(route)
+    if limiter is None or not RATE_LIMITS_ENABLED:
+        return True
+    return limiter.allow(key, cost)
+
+def get_stats() -> dict:
+    """Estadísticas de todos los limitadores"""
+    return {route: limiter.stats() for route, limiter in limiters.items()}
+
+async def sweep_idle_keys():
+    """
+    Barre periódicamente las claves inactivas de todos los limitadores
+    Llamar esta función en un task separado
+    """
+    while True:
+        try:
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+            removed = sum(limiter.sweep() for limiter in limiters.values())
+            if removed:
+                log(f"🧹 Rate limiter: {removed} clave(s) inactiva(s) eliminada(s)")
+
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            log(f"❌ Error en barrido del rate limiter: {e}", level="error")
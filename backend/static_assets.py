@@ -0,0 +1,262 @@
+# backend/static_assets.py
+"""
+Frontend (overlay) servido por el propio backend
+- Al iniciar se construye el build: hash del contenido de cada archivo y
+  un hash de build que prefija las URLs (/static/<build>/js/app.js).
+  Las rutas relativas del frontend siguen funcionando
+- Los archivos de texto se comprimen con gzip una sola vez, al construir
+  (data/static/<build>/*.gz); nunca por request
+- Envío con sendfile (FileResponse), ETag fuerte por variante y 304 ante
+  If-None-Match sin tocar disco. La variante gzip se elige según los
+  q-values de Accept-Encoding
+- /static/<build>/...: caché de un año (inmutable). La página principal (/)
+  se revalida siempre y apunta al build actual con <base href>
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from backend import metrics
+from backend.utils.logger import log
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+FRONTEND_ENABLED = os.environ.get("DOTLEMOR_FRONTEND", "1") != "0"
+FRONTEND_DIR = Path(os.environ.get(
+    "DOTLEMOR_FRONTEND_DIR", Path(__file__).resolve().parent.parent / "frontend"
+))
+BUILD_DIR = Path(os.environ.get("DOTLEMOR_STATIC_DIR", os.path.join("data", "static")))
+
+INDEX_FILE = "index.html"
+STATIC_PREFIX = "/static"
+GZIP_SUFFIXES = frozenset({".html", ".js", ".css", ".svg", ".json", ".txt", ".map"})
+GZIP_MIN_BYTES = 512                # archivos más chicos no se comprimen
+GZIP_LEVEL = 9                      # se paga una vez por build
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# ==========================================
+# ESTADO
+# ==========================================
+class Asset:
+    """Archivo construido: variante original y, si conviene, la gzip"""
+    __slots__ = ("path", "gzip_path", "etag", "content_type")
+
+    def __init__(self, path: Path, digest: str, content_type: str):
+        self.path = path
+        self.gzip_path: Optional[Path] = None
+        self.etag = digest
+        self.content_type = content_type
+
+# Ruta relativa (posix) -> archivo del build actual
+assets: Dict[str, Asset] = {}
+index_asset: Optional[Asset] = None
+build_id = ""
+
+static_stats = {
+    "files": 0,
+    "bytes": 0,
+    "gzip_files": 0,
+    "gzip_bytes": 0,
+    "not_modified": 0,
+    "sent_gzip": 0,
+    "sent_identity": 0
+}
+
+static_responses = metrics.Counter(
+    "dotlemor_static_responses_total", "Respuestas de archivos del frontend",
+    ("result",)
+)
+
+# ==========================================
+# BUILD
+# ==========================================
+def _content_type(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+def _write(path: Path, data: bytes):
+    """Escritura atómica: otros workers pueden estar sirviendo el mismo build"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def _emit(out_dir: Path, name: str, data: bytes) -> Asset:
+    """Escribe un archivo del build (y su .gz) y retorna su Asset"""
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    target = out_dir / name
+    if not target.exists() or target.stat().st_size != len(data):
+        _write(target, data)
+    asset = Asset(target, digest, _content_type(name))
+    static_stats["files"] += 1
+    static_stats["bytes"] += len(data)
+
+    if target.suffix in GZIP_SUFFIXES and len(data) >= GZIP_MIN_BYTES:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+        if len(compressed) < len(data):
+            gzip_path = target.with_name(target.name + ".gz")
+            if not gzip_path.exists() or gzip_path.stat().st_size != len(compressed):
+                _write(gzip_path, compressed)
+            asset.gzip_path = gzip_path
+            static_stats["gzip_files"] += 1
+            static_stats["gzip_bytes"] += len(compressed)
+    return asset
+
+def _with_base(html: bytes, base: str) -> bytes:
+    """Agrega <base href> a la página para que sus rutas relativas usen el build"""
+    marker = html.find(b"<head>")
+    if marker < 0 or b"<base " in html:
+        return html
+    marker += len(b"<head>")
+    return html[:marker] + f'\n  <base href="{base}">'.encode() + html[marker:]
+
+def build(source: Path = None, build_dir: Path = None) -> str:
+    """
+    Construye el frontend: lee cada archivo una vez, calcula hashes,
+    comprime y escribe data/static/<build>/. Descarta builds anteriores
+    Retorna el id del build (hash de todo el contenido)
+    """
+    global build_id, index_asset
+    source = Path(source or FRONTEND_DIR)
+    build_dir = Path(build_dir or BUILD_DIR)
+
+    files = {}
+    for path in sorted(source.rglob("*")):
+        relative = path.relative_to(source)
+        if path.is_file() and not any(part.startswith(".") for part in relative.parts):
+            files[relative.as_posix()] = path.read_bytes()
+
+    tree = hashlib.sha256()
+    for name, data in files.items():
+        tree.update(name.encode())
+        tree.update(hashlib.sha256(data).digest())
+    new_build_id = tree.hexdigest()[:12]
+    out_dir = build_dir / new_build_id
+
+    for key in ("files", "bytes", "gzip_files", "gzip_bytes"):
+        static_stats[key] = 0
+    built = {name: _emit(out_dir, name, data) for name, data in files.items()}
+    new_index = None
+    if INDEX_FILE in files:
+        base = f"{STATIC_PREFIX}/{new_build_id}/"
+        new_index = _emit(build_dir / f"{new_build_id}-root", INDEX_FILE, _with_base(files[INDEX_FILE], base))
+
+    assets.clear()
+    assets.update(built)
+    index_asset = new_index
+    build_id = new_build_id
+
+    for old in build_dir.iterdir() if build_dir.is_dir() else ():
+        if old.is_dir() and not old.name.startswith(new_build_id):
+            shutil.rmtree(old, ignore_errors=True)
+
+    log(f"📦 Frontend construido (build {build_id}): {static_stats['files']} archivo(s), "
+        f"{static_stats['bytes'] / 1024:.0f} KiB; gzip {static_stats['gzip_files']} "
+        f"archivo(s) -> {static_stats['gzip_bytes'] / 1024:.0f} KiB")
+    return build_id
+
+# ==========================================
+# HANDLERS
+# ==========================================
+class _AssetResponse(web.FileResponse):
+    """
+    FileResponse (sendfile) con el ETag del contenido en vez de mtime-tamaño
+    La variante ya la eligió _serve: aiohttp no busca otro .gz por su cuenta
+    """
+
+    def __init__(self, path: Path, etag: str, headers: dict):
+        self._content_etag = etag
+        super().__init__(path, headers=headers)
+
+    @web.FileResponse.etag.setter
+    def etag(self, value):
+        web.StreamResponse.etag.fset(self, self._content_etag)
+
+    def _get_file_path_stat_encoding(self, accept_encoding: str):
+        return self._path, self._path.stat(), None
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Si Accept-Encoding admite gzip: "gzip" (o "x-gzip") explícito, o si no
+    "*", con q > 0. "gzip;q=0" lo rechaza. Un q inválido anula la entrada
+    """
+    explicit = wildcard = None
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if coding not in ("gzip", "x-gzip", "*"):
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding == "*":
+            wildcard = quality
+        else:
+            explicit = max(explicit or 0.0, quality)
+    quality = explicit if explicit is not None else wildcard
+    return quality is not None and quality > 0
+
+def _serve(request: web.Request, asset: Asset, cache_control: str) -> web.StreamResponse:
+    use_gzip = asset.gzip_path is not None and accepts_gzip(request.headers.get("Accept-Encoding", ""))
+    etag = f"{asset.etag}-gz" if use_gzip else asset.etag
+    headers = {"Cache-Control": cache_control, "Content-Type": asset.content_type}
+    if asset.gzip_path is not None:
+        headers["Vary"] = "Accept-Encoding"
+
+    if_none_match = request.if_none_match
+    if if_none_match and any(tag.value in (etag, "*") for tag in if_none_match):
+        static_stats["not_modified"] += 1
+        static_responses.labels("not_modified").inc()
+        headers.pop("Content-Type")
+        return web.Response(status=304, headers={**headers, "ETag": f'"{etag}"'})
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        static_stats["sent_gzip"] += 1
+        static_responses.labels("gzip").inc()
+        return _AssetResponse(asset.gzip_path, etag, headers)
+    static_stats["sent_identity"] += 1
+    static_responses.labels("identity").inc()
+    return _AssetResponse(asset.path, etag, headers)
+
+async def index_handler(request: web.Request) -> web.StreamResponse:
+    """GET /: página principal (se revalida en cada carga)"""
+    if index_asset is None:
+        raise web.HTTPNotFound()
+    return _serve(request, index_asset, REVALIDATE_CACHE)
+
+async def asset_handler(request: web.Request) -> web.StreamResponse:
+    """
+    GET /static/<build>/<ruta>
+    Un build anterior (página en caché durante un deploy) recibe la versión
+    actual, pero sin caché inmutable
+    """
+    asset = assets.get(request.match_info["path"])
+    if asset is None:
+        raise web.HTTPNotFound()
+    current = request.match_info["build"] == build_id
+    return _serve(request, asset, IMMUTABLE_CACHE if current else REVALIDATE_CACHE)
+
+def setup(app: web.Application):
+    """Registra las rutas del frontend; el build se hace al iniciar la app"""
+    app.router.add_get("/", index_handler)
+    app.router.add_get(STATIC_PREFIX + "/{build}/{path:.+}", asset_handler)
+
+def get_stats() -> dict:
+    return {
+        **static_stats,
+        "build": build_id
+    }
@@ -1,6 +1,166 @@
 # backend/utils/logger.py
+"""
+Logger no bloqueante
+log() solo encola el registro; un hilo en background lo formatea y lo
+escribe por lotes, así el event loop no paga strftime ni print.
+"""
+import atexit
 import datetime
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
 
-def log(message: str):
-    timestamp = datetime.datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
-    print(f"{timestamp} {message}")
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+LOG_LEVEL = os.environ.get("DOTLEMOR_LOG_LEVEL", "info")
+JSON_LINES = os.environ.get("DOTLEMOR_LOG_JSON", "") == "1"
+SAMPLE_RATE = float(os.environ.get("DOTLEMOR_LOG_SAMPLE_RATE", "0.01"))  # para log_sampled()
+MAX_QUEUE = 100_000     # registros pendientes máximos (el resto se descarta)
+MAX_BATCH = 1_000       # registros por escritura
+FLUSH_INTERVAL = 0.05   # segundos máximos que un registro espera en el hilo
+
+# ==========================================
+# ESTADO
+# ==========================================
+_min_level = LEVELS.get(LOG_LEVEL, 20)
+_stream = sys.stdout
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_writer: threading.Thread = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+_STOP = object()
+
+log_stats = {
+    "written": 0,
+    "dropped": 0
+}
+
+# ==========================================
+# API
+# ==========================================
+def log(message: str, level: str = "info", **fields):
+    """
+    Encola un registro. Los campos extra se incluyen en la salida JSON lines
+    No bloquea: si la cola está llena, el registro se descarta
+    """
+    if LEVELS.get(level, 20) < _min_level:
+        return
+    if _writer_pid != os.getpid():
+        _start_writer()
+    if _queue.qsize() >= MAX_QUEUE:
+        log_stats["dropped"] += 1
+        return
+    _queue.put((time.time(), level, message, fields))
+
+def log_sampled(message: str, rate: float = None, level: str = "info", **fields):
+    """Registra solo una fracción `rate` de las llamadas (logs por mensaje)"""
+    if random.random() < (SAMPLE_RATE if rate is None else rate):
+        log(message, level, sampled=True, **fields)
+
+def is_enabled(level: str) -> bool:
+    """Permite evitar construir mensajes costosos que serían descartados"""
+    return LEVELS.get(level, 20) >= _min_level
+
+def configure(level: str = None, json_lines: bool = None, sample_rate: float = None, stream=None):
+    """Cambia la configuración del logger en caliente"""
+    global LOG_LEVEL, JSON_LINES, SAMPLE_RATE, _min_level, _stream
+    if level is not None:
+        if level not in LEVELS:
+            raise ValueError(f"Nivel de log inválido: {level}")
+        LOG_LEVEL = level
+        _min_level = LEVELS[level]
+    if json_lines is not None:
+        JSON_LINES = json_lines
+    if sample_rate is not None:
+        SAMPLE_RATE = sample_rate
+    if stream is not None:
+        _stream = stream
+
+def flush(timeout: float = 2.0):
+    """Detiene el hilo escritor tras vaciar la cola (se llama al salir)"""
+    global _writer_pid
+    writer = _writer
+    if writer is None or not writer.is_alive() or _writer_pid != os.getpid():
+        return
+    _queue.put(_STOP)
+    writer.join(timeout)
+    _writer_pid = None
+
+# ==========================================
+# HILO ESCRITOR
+# ==========================================
+def _start_writer():
+    """Inicia el hilo escritor (una vez por proceso)"""
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer_pid == os.getpid():
+            return
+        _writer = threading.Thread(target=_writer_loop, name="dotlemor-logger", daemon=True)
+        _writer.start()
+        _writer_pid = os.getpid()
+
+def _writer_loop():
+    """Agrupa registros y los escribe en una sola llamada por lote"""
+    formatter = _TimestampCache()
+    while True:
+        item = _queue.get()
+        batch = [item]
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while len(batch) < MAX_BATCH:
+            try:
+                batch.append(_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+
+        stop = False
+        lines = []
+        for record in batch:
+            if record is _STOP:
+                stop = True
+                continue
+            lines.append(_format(record, formatter))
+
+        if lines:
+            try:
+                _stream.write("".join(lines))
+                _stream.flush()
+                log_stats["written"] += len(lines)
+            except Exception:
+                log_stats["dropped"] += len(lines)
+
+        if stop:
+            return
+
+def _format(record, formatter) -> str:
+    timestamp, level, message, fields = record
+    if JSON_LINES:
+        entry = {"ts": formatter.iso(timestamp), "level": level, "msg": message}
+        entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+    return f"{formatter.text(timestamp)} {message}\n"
+
+class _TimestampCache:
+    """Formatea la marca de tiempo una vez por segundo"""
+
+    def __init__(self):
+        self._second = None
+        self._text = ""
+
+    def text(self, timestamp: float) -> str:
+        second = int(timestamp)
+        if second != self._second:
+            self._second = second
+            self._text = datetime.datetime.fromtimestamp(second).strftime("[%Y-%m-%d %H:%M:%S]")
+        return self._text
+
+    def iso(self, timestamp: float) -> str:
+        return datetime.datetime.fromtimestamp(timestamp).isoformat(timespec="milliseconds")
+
+atexit.register(flush)
@@ -2,25 +2,49 @@ import asyncio
 import json
 import websockets
 from websockets.server import serve
-from backend.utils.logger import log
-from backend.event_dispatcher import connected_clients, broadcast
+from backend.utils.logger import log, log_sampled
+from backend.donation_api import check_rate_limit, ingest_event
+from backend.event_dispatcher import (
+    MAX_INBOUND_BYTES,
+    INBOUND_RATE,
+    INBOUND_BURST,
+    CLOSE_POLICY_VIOLATION
+)
+from backend.rate_limiter import TokenBucket
+
+# Conexiones del servidor legacy (librería websockets): no pasan por el
+# registro del dispatcher, que administra WebSockets de aiohttp
+legacy_clients = set()
 
 async def websocket_handler(websocket):
-    connected_clients.add(websocket)
+    legacy_clients.add(websocket)
+    client_ip = websocket.remote_address[0] if websocket.remote_address else ""
+    inbound = TokenBucket(INBOUND_RATE, INBOUND_BURST)
     log("Cliente WebSocket conectado")
 
     try:
         async for message in websocket:
-            data = json.loads(message)
-            log(f"📩 Mensaje recibido: {data}")
-            await broadcast(data)
+            # Mismo límite por conexión que el servidor principal
+            if not inbound.take():
+                await websocket.close(CLOSE_POLICY_VIOLATION, "Rate limit exceeded")
+                break
+            try:
+                data = json.loads(message)
+            except ValueError:
+                continue
+            log_sampled(f"📩 Mensaje recibido de {client_ip}")
+
+            # Nunca se reenvía lo recibido: se valida como en /simulate_donation
+            if not check_rate_limit(client_ip):
+                continue
+            await ingest_event(data, client_ip)
     except Exception as e:
-        log(f"⚠️ Error en conexión: {e}")
+        log(f"⚠️ Error en conexión: {e}", level="warning")
     finally:
-        connected_clients.remove(websocket)
+        legacy_clients.discard(websocket)
         log("Cliente WebSocket desconectado")
 
 async def start_websocket_server(host, port):
-    async with serve(websocket_handler, host, port):
+    async with serve(websocket_handler, host, port, max_size=MAX_INBOUND_BYTES):
         log(f"🌐 Servidor WebSocket escuchando en ws://{host}:{port}")
         await asyncio.Future()  # Mantener activo
@@ -0,0 +1,263 @@
+# backend/wire.py
+"""
+Protocolo de cable de los WebSockets
+- Subprotocolos negociados en el handshake (Sec-WebSocket-Protocol):
+    dotlemor.msgpack.v1   frames binarios MessagePack
+    dotlemor.json.v1      frames de texto JSON (igual que sin subprotocolo)
+- Codificador/decodificador MessagePack mínimo (sin dependencias)
+- Frame: un mensaje difundido se serializa una vez por variante, no por
+  cliente: el JSON se comparte y el binario se calcula al primer uso
+- Un mensaje que MessagePack no puede representar se envía como texto
+  JSON también a los clientes binarios (el cliente acepta ambos)
+"""
+import json
+import struct
+from typing import Optional, Union
+
+from backend import metrics
+from backend.utils.logger import log_sampled
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+PROTOCOL_MSGPACK = "dotlemor.msgpack.v1"
+PROTOCOL_JSON = "dotlemor.json.v1"
+
+# Orden de preferencia del servidor
+PROTOCOLS = (PROTOCOL_MSGPACK, PROTOCOL_JSON)
+
+# ==========================================
+# MÉTRICAS
+# ==========================================
+frames_encoded = metrics.Counter(
+    "dotlemor_ws_frames_encoded_total", "Frames codificados por variante de protocolo",
+    ("protocol",)
+)
+bytes_sent = metrics.Counter(
+    "dotlemor_ws_bytes_sent_total", "Bytes de payload enviados por WebSocket",
+    ("protocol",)
+)
+encode_failures = metrics.Counter(
+    "dotlemor_ws_encode_failures_total", "Mensajes no codificables en MessagePack (enviados como JSON)"
+)
+
+# ==========================================
+# MESSAGEPACK
+# ==========================================
+_pack_float = struct.Struct(">f")
+
+def packb(obj) -> bytes:
+    """Serializa None, bool, int, float, str, bytes, list/tuple y dict"""
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+def _pack(obj, out: bytearray):
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        _pack_int(obj, out)
+    elif isinstance(obj, float):
+        # float32 si representa el valor exacto (montos como 5.0 o 12.5)
+        if _pack_float.unpack(_pack_float.pack(obj))[0] == obj:
+            out.append(0xca)
+            out += _pack_float.pack(obj)
+        else:
+            out.append(0xcb)
+            out += struct.pack(">d", obj)
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        size = len(data)
+        if size < 32:
+            out.append(0xa0 | size)
+        elif size < 0x100:
+            out += bytes((0xd9, size))
+        elif size < 0x10000:
+            out += b"\xda" + struct.pack(">H", size)
+        else:
+            out += b"\xdb" + struct.pack(">I", size)
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        size = len(obj)
+        if size < 0x100:
+            out += bytes((0xc4, size))
+        elif size < 0x10000:
+            out += b"\xc5" + struct.pack(">H", size)
+        else:
+            out += b"\xc6" + struct.pack(">I", size)
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        _pack_header(len(obj), 0x90, 0xdc, 0xdd, out)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        _pack_header(len(obj), 0x80, 0xde, 0xdf, out)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+def _pack_int(value: int, out: bytearray):
+    if 0 <= value < 0x80:
+        out.append(value)
+    elif -32 <= value < 0:
+        out.append(value & 0xff)
+    elif value >= 0:
+        if value < 0x100:
+            out += bytes((0xcc, value))
+        elif value < 0x10000:
+            out += b"\xcd" + struct.pack(">H", value)
+        elif value < 0x100000000:
+            out += b"\xce" + struct.pack(">I", value)
+        elif value < 0x10000000000000000:
+            out += b"\xcf" + struct.pack(">Q", value)
+        else:
+            raise OverflowError("Entero demasiado grande para MessagePack")
+    elif value >= -0x80:
+        out += b"\xd0" + struct.pack(">b", value)
+    elif value >= -0x8000:
+        out += b"\xd1" + struct.pack(">h", value)
+    elif value >= -0x80000000:
+        out += b"\xd2" + struct.pack(">i", value)
+    elif value >= -0x8000000000000000:
+        out += b"\xd3" + struct.pack(">q", value)
+    else:
+        raise OverflowError("Entero demasiado grande para MessagePack")
+
+def _pack_header(size: int, fix: int, code16: int, code32: int, out: bytearray):
+    if size < 16:
+        out.append(fix | size)
+    elif size < 0x10000:
+        out.append(code16)
+        out += struct.pack(">H", size)
+    else:
+        out.append(code32)
+        out += struct.pack(">I", size)
+
+def unpackb(data: bytes):
+    """Deserializa un valor MessagePack (el subconjunto que emite packb)"""
+    try:
+        value, offset = _unpack(memoryview(data), 0)
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"MessagePack truncado: {e}")
+    except (TypeError, RecursionError) as e:
+        # Clave de mapa no hasheable (lista/mapa) o anidamiento excesivo
+        raise ValueError(f"MessagePack inválido: {e}")
+    if offset != len(data):
+        raise ValueError("Bytes sobrantes tras el valor MessagePack")
+    return value
+
+_FIXED = {
+    0xcc: ">B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q",
+    0xd0: ">b", 0xd1: ">h", 0xd2: ">i", 0xd3: ">q",
+    0xca: ">f", 0xcb: ">d"
+}
+
+def _unpack(data: memoryview, offset: int):
+    code = data[offset]
+    offset += 1
+    if code < 0x80:
+        return code, offset
+    if code >= 0xe0:
+        return code - 0x100, offset
+    if 0xa0 <= code <= 0xbf:
+        return _unpack_str(data, offset, code & 0x1f)
+    if 0x90 <= code <= 0x9f:
+        return _unpack_array(data, offset, code & 0x0f)
+    if 0x80 <= code <= 0x8f:
+        return _unpack_map(data, offset, code & 0x0f)
+    if code == 0xc0:
+        return None, offset
+    if code == 0xc2:
+        return False, offset
+    if code == 0xc3:
+        return True, offset
+    if code in _FIXED:
+        fmt = _FIXED[code]
+        return struct.unpack_from(fmt, data, offset)[0], offset + struct.calcsize(fmt)
+
+    size_fmt = {0xd9: ">B", 0xda: ">H", 0xdb: ">I",
+                0xc4: ">B", 0xc5: ">H", 0xc6: ">I",
+                0xdc: ">H", 0xdd: ">I", 0xde: ">H", 0xdf: ">I"}.get(code)
+    if size_fmt is None:
+        raise ValueError(f"Código MessagePack no soportado: 0x{code:02x}")
+    size = struct.unpack_from(size_fmt, data, offset)[0]
+    offset += struct.calcsize(size_fmt)
+    if code in (0xd9, 0xda, 0xdb):
+        return _unpack_str(data, offset, size)
+    if code in (0xc4, 0xc5, 0xc6):
+        if offset + size > len(data):
+            raise IndexError("bin truncado")
+        return bytes(data[offset:offset + size]), offset + size
+    if code in (0xdc, 0xdd):
+        return _unpack_array(data, offset, size)
+    return _unpack_map(data, offset, size)
+
+def _unpack_str(data: memoryview, offset: int, size: int):
+    if offset + size > len(data):
+        raise IndexError("str truncado")
+    return str(data[offset:offset + size], "utf-8"), offset + size
+
+def _unpack_array(data: memoryview, offset: int, size: int):
+    items = []
+    for _ in range(size):
+        item, offset = _unpack(data, offset)
+        items.append(item)
+    return items, offset
+
+def _unpack_map(data: memoryview, offset: int, size: int):
+    result = {}
+    for _ in range(size):
+        key, offset = _unpack(data, offset)
+        value, offset = _unpack(data, offset)
+        result[key] = value
+    return result, offset
+
+# ==========================================
+# FRAMES
+# ==========================================
+class Frame:
+    """
+    Mensaje difundido, compartido por las colas de todos sus destinatarios
+    El JSON ya viene serializado; el binario se codifica una sola vez
+    """
+    __slots__ = ("text", "_binary")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._binary: Optional[Union[bytes, str]] = None
+
+    def binary(self) -> Union[bytes, str]:
+        """MessagePack del mensaje, o su texto si no es codificable (una vez por frame)"""
+        if self._binary is None:
+            self._binary = _encode(self.text)
+        return self._binary
+
+Message = Union[str, Frame]
+
+def as_text(message: Message) -> str:
+    return message.text if isinstance(message, Frame) else message
+
+def as_binary(message: Message) -> Union[bytes, str]:
+    """
+    Payload para un cliente MessagePack (los str son mensajes a un solo cliente)
+    Retorna bytes, o el texto JSON si el mensaje no se puede codificar
+    """
+    if isinstance(message, Frame):
+        return message.binary()
+    return _encode(message)
+
+def _encode(text: str) -> Union[bytes, str]:
+    try:
+        payload = packb(json.loads(text))
+    except (TypeError, ValueError, OverflowError) as e:
+        encode_failures.inc()
+        log_sampled(f"⚠️ Mensaje no codificable en MessagePack, enviado como JSON: {e}", level="warning")
+        return text
+    frames_encoded.labels(PROTOCOL_MSGPACK).inc()
+    return payload
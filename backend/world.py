@@ -0,0 +1,322 @@
+# backend/world.py
+"""
+Modelo del mundo autoritativo en el servidor (opcional)
+- Walkers, efectos de donación y objetos se simulan aquí a tick fijo
+- Entidades con __slots__ en un diccionario por id
+- Al conectarse, cada cliente recibe un "world_snapshot" completo; luego
+  solo "world_delta" con las entidades que cambiaron en el tick
+- El movimiento continuo no cuenta como cambio: el cliente lo extrapola
+  con x, dirección y velocidad. Solo se envían altas, bajas y cambios de
+  estado (salto, giro), así el ancho de banda sigue al cambio y no a la
+  cantidad de entidades
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List, Optional, Set
+
+from backend import event_dispatcher
+from backend.utils.logger import log
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+WORLD_ENABLED = os.environ.get("DOTLEMOR_WORLD", "0") == "1"
+TICK_RATE = 20                  # ticks por segundo
+
+WORLD_WIDTH = 900               # igual que el canvas del frontend
+WALKER_WIDTH = 110              # ancho del frame del sprite
+WALKER_Y = 372
+WALKER_SPEED = 150.0            # px/s (2.5 px por frame a 60 FPS)
+WALKER_SPEED_VARIATION = 60.0
+WALKER_LIFETIME = 60.0          # segundos
+JUMP_DURATION = 20 / 60         # segundos por salto
+JUMP_COOLDOWN = 5 / 60          # pausa entre saltos
+JUMPS_AT_EDGE = 2
+MAX_WALKERS = 500
+
+DONATION_EFFECTS = (            # (monto mínimo, efecto, duración en s)
+    (100, "mega", 5.0),
+    (50, "super", 4.0),
+    (10, "special", 3.0),
+    (0, "basic", 2.0)
+)
+MAX_OBJECTS = 50
+
+# ==========================================
+# ENTIDADES
+# ==========================================
+class Walker:
+    __slots__ = ("id", "user", "x", "direction", "speed", "jump_time",
+                 "jumps_remaining", "cooldown", "expires")
+    kind = "walker"
+
+    def __init__(self, entity_id: int, user: str, x: float, direction: int, speed: float, now: float):
+        self.id = entity_id
+        self.user = user
+        self.x = x
+        self.direction = direction
+        self.speed = speed
+        self.jump_time = 0.0        # > 0 mientras salta
+        self.jumps_remaining = 0
+        self.cooldown = 0.0         # > 0 entre saltos
+        self.expires = now + WALKER_LIFETIME
+
+    def step(self, dt: float) -> bool:
+        """Avanza dt segundos. Retorna True si cambió su estado discreto"""
+        if self.jump_time > 0:
+            self.jump_time -= dt
+            if self.jump_time > 0:
+                return False
+            self.jump_time = 0.0
+            self.jumps_remaining -= 1
+            if self.jumps_remaining > 0:
+                self.cooldown = JUMP_COOLDOWN
+            else:
+                self.direction = -self.direction
+            return True
+
+        self.x += self.speed * self.direction * dt
+        if self.cooldown > 0:
+            self.cooldown -= dt
+            if self.cooldown > 0:
+                return False
+            self.cooldown = 0.0
+            self.jump_time = JUMP_DURATION
+            return True
+
+        at_left = self.x <= 0 and self.direction == -1
+        at_right = self.x >= WORLD_WIDTH - WALKER_WIDTH and self.direction == 1
+        if at_left or at_right:
+            self.jumps_remaining = JUMPS_AT_EDGE
+            self.jump_time = JUMP_DURATION
+            return True
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "user": self.user,
+            "x": round(self.x, 1),
+            "y": WALKER_Y,
+            "dir": self.direction,
+            "speed": self.speed,
+            "jumping": self.jump_time > 0
+        }
+
+class DonationEffect:
+    __slots__ = ("id", "user", "amount", "message", "effect", "expires")
+    kind = "donation"
+
+    def __init__(self, entity_id: int, user: str, amount: float, message: str, now: float):
+        self.id = entity_id
+        self.user = user
+        self.amount = amount
+        self.message = message
+        for minimum, effect, duration in DONATION_EFFECTS:
+            if amount >= minimum:
+                break
+        self.effect = effect
+        self.expires = now + duration
+
+    def step(self, dt: float) -> bool:
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "user": self.user,
+            "amount": self.amount,
+            "message": self.message,
+            "effect": self.effect,
+            "ttl": round(max(0.0, self.expires - time.monotonic()), 2)
+        }
+
+class WorldObject:
+    __slots__ = ("id", "x", "y")
+    kind = "object"
+    expires = None
+
+    def __init__(self, entity_id: int, x: float, y: float):
+        self.id = entity_id
+        self.x = x
+        self.y = y
+
+    def step(self, dt: float) -> bool:
+        return False
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "kind": self.kind, "x": self.x, "y": self.y}
+
+# ==========================================
+# ESTADO
+# ==========================================
+entities: Dict[int, object] = {}
+object_ids: List[int] = []          # objetos en orden de creación (para el tope)
+walker_count = 0
+tick = 0
+_next_id = 0
+_changed: Set[int] = set()
+_removed: Set[int] = set()
+
+world_stats = {
+    "ticks": 0,
+    "deltas_sent": 0,
+    "entities_changed": 0,
+    "snapshots_sent": 0
+}
+
+def _new_id() -> int:
+    global _next_id
+    _next_id += 1
+    return _next_id
+
+def _add(entity):
+    entities[entity.id] = entity
+    _changed.add(entity.id)
+
+def _remove(entity_id: int):
+    global walker_count
+    entity = entities.pop(entity_id, None)
+    if entity is None:
+        return
+    if entity.kind == "walker":
+        walker_count -= 1
+    _changed.discard(entity_id)
+    _removed.add(entity_id)
+
+# ==========================================
+# EVENTOS
+# ==========================================
+def on_event(event_data: dict):
+    """Observador del dispatcher: crea entidades a partir de los eventos"""
+    global walker_count
+    event_type = event_data.get("type")
+    now = time.monotonic()
+    # Aleatoriedad derivada del seq: todos los workers generan lo mismo
+    rng = random.Random(event_data.get("seq"))
+
+    if event_type == "walker":
+        if walker_count >= MAX_WALKERS:
+            return
+        if rng.random() < 0.5:
+            x, direction = -WALKER_WIDTH, 1
+        else:
+            x, direction = WORLD_WIDTH + WALKER_WIDTH, -1
+        speed = WALKER_SPEED + rng.random() * WALKER_SPEED_VARIATION
+        _add(Walker(_new_id(), event_data.get("user", "Usuario"), x, direction, speed, now))
+        walker_count += 1
+
+    elif event_type == "donation":
+        _add(DonationEffect(
+            _new_id(),
+            event_data.get("user", "Usuario"),
+            event_data.get("amount", 0),
+            event_data.get("message", ""),
+            now
+        ))
+        # Cada donación deja un objeto coleccionable, como en el cliente
+        if len(object_ids) >= MAX_OBJECTS:
+            _remove(object_ids.pop(0))
+        obj = WorldObject(_new_id(), round(rng.random() * 800 + 50), round(rng.random() * 300 + 100))
+        object_ids.append(obj.id)
+        _add(obj)
+
+# ==========================================
+# SIMULACIÓN
+# ==========================================
+def step(dt: float) -> Optional[dict]:
+    """Avanza un tick y retorna el delta de entidades cambiadas (o None)"""
+    global tick
+    tick += 1
+    world_stats["ticks"] += 1
+    now = time.monotonic()
+
+    expired = []
+    for entity in entities.values():
+        if entity.expires is not None and entity.expires <= now:
+            expired.append(entity.id)
+        elif entity.step(dt):
+            _changed.add(entity.id)
+    for entity_id in expired:
+        _remove(entity_id)
+
+    if not _changed and not _removed:
+        return None
+
+    delta = {
+        "type": "world_delta",
+        "tick": tick,
+        "upsert": [entities[entity_id].to_dict() for entity_id in _changed],
+        "remove": list(_removed)
+    }
+    world_stats["entities_changed"] += len(_changed) + len(_removed)
+    _changed.clear()
+    _removed.clear()
+    return delta
+
+def snapshot(ws=None) -> dict:
+    """Estado completo del mundo (mensaje inicial de cada cliente)"""
+    world_stats["snapshots_sent"] += 1
+    return {
+        "type": "world_snapshot",
+        "tick": tick,
+        "width": WORLD_WIDTH,
+        "entities": [entity.to_dict() for entity in entities.values()]
+    }
+
+async def run_world():
+    """
+    Loop de simulación a TICK_RATE
+    Llamar esta función en un task separado
+    """
+    loop = asyncio.get_running_loop()
+    interval = 1 / TICK_RATE
+    next_tick = loop.time() + interval
+    last = loop.time()
+    log(f"🌍 Mundo del servidor activo ({TICK_RATE} ticks/s)")
+
+    while True:
+        try:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            now = loop.time()
+            # Tick fijo: si el loop se atrasa, el siguiente no se acumula
+            next_tick = max(next_tick + interval, now)
+            delta = step(now - last)
+            last = now
+
+            if delta is not None:
+                world_stats["deltas_sent"] += 1
+                event_dispatcher.notify(delta)
+
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            log(f"❌ Error en tick del mundo: {e}", level="error")
+
+def install():
+    """
+    Engancha el mundo al dispatcher (eventos y snapshot al conectar)
+    Idempotente: instalarlo dos veces no duplica las entidades
+    """
+    uninstall()
+    event_dispatcher.add_event_listener(on_event)
+    event_dispatcher.add_join_listener(snapshot)
+
+def uninstall():
+    """Desengancha el mundo del dispatcher (cleanup de la app)"""
+    event_dispatcher.remove_event_listener(on_event)
+    event_dispatcher.remove_join_listener(snapshot)
+
+def get_stats() -> dict:
+    return {
+        **world_stats,
+        "tick_rate": TICK_RATE,
+        "tick": tick,
+        "entities": len(entities),
+        "walkers": walker_count,
+        "objects": len(object_ids)
+    }
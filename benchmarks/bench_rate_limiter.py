@@ -0,0 +1,91 @@
+# benchmarks/bench_rate_limiter.py
+"""
+Microbenchmark del rate limiter
+Compara el limitador anterior (listas de datetime por IP en un defaultdict)
+con TokenBucketLimiter: tiempo por request y memoria con IPs distintas.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_rate_limiter [--ips 1000000] [--max-keys 100000]
+"""
+import argparse
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from backend.rate_limiter import TokenBucketLimiter
+
+RATE_LIMIT_REQUESTS = 10
+RATE_LIMIT_WINDOW = 60
+
+# ==========================================
+# IMPLEMENTACIÓN ANTERIOR (referencia)
+# ==========================================
+def make_legacy_limiter():
+    request_tracker = defaultdict(list)
+
+    def check_rate_limit(ip: str) -> bool:
+        now = datetime.now()
+        cutoff = now - timedelta(seconds=RATE_LIMIT_WINDOW)
+        request_tracker[ip] = [t for t in request_tracker[ip] if t > cutoff]
+        if len(request_tracker[ip]) >= RATE_LIMIT_REQUESTS:
+            return False
+        request_tracker[ip].append(now)
+        return True
+
+    return check_rate_limit
+
+def make_token_bucket(max_keys: int):
+    limiter = TokenBucketLimiter(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, max_keys=max_keys)
+    return limiter.allow
+
+# ==========================================
+# MEDICIONES
+# ==========================================
+def ip_for(i: int) -> str:
+    return f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}:{i >> 24}"
+
+def bench_memory(name: str, check, total_ips: int, checkpoints: int = 10):
+    """Reporta memoria retenida cada total_ips/checkpoints IPs distintas"""
+    print(f"\n{name}: memoria con {total_ips:,} IPs distintas")
+    step = max(1, total_ips // checkpoints)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for i in range(total_ips):
+        check(ip_for(i))
+        if (i + 1) % step == 0:
+            current = tracemalloc.get_traced_memory()[0] - baseline
+            print(f"  {i + 1:>10,} IPs -> {current / 1024 / 1024:8.2f} MiB")
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    print(f"  tiempo total: {elapsed:.2f}s (con tracemalloc)")
+
+def bench_hot_key(name: str, check, iterations: int = 200_000):
+    """Tiempo por request sobre un conjunto pequeño de IPs activas"""
+    keys = [ip_for(i) for i in range(100)]
+    start = time.perf_counter()
+    for i in range(iterations):
+        check(keys[i % 100])
+    elapsed = time.perf_counter() - start
+    print(f"{name:<14} {elapsed / iterations * 1e9:8.0f} ns/request")
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark del rate limiter")
+    parser.add_argument("--ips", type=int, default=1_000_000, help="IPs distintas a simular")
+    parser.add_argument("--max-keys", type=int, default=100_000, help="capacidad LRU del token bucket")
+    parser.add_argument("--skip-legacy-memory", action="store_true",
+                        help="omite la prueba de memoria del limitador anterior (lenta)")
+    args = parser.parse_args()
+
+    print("Tiempo por request (100 IPs activas):")
+    bench_hot_key("legacy", make_legacy_limiter())
+    bench_hot_key("token_bucket", make_token_bucket(args.max_keys))
+
+    bench_memory(f"token_bucket (max_keys={args.max_keys:,})",
+                 make_token_bucket(args.max_keys), args.ips)
+    if not args.skip_legacy_memory:
+        bench_memory("legacy", make_legacy_limiter(), args.ips)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/bench_validation.py
+"""
+Microbenchmark de validación de eventos de ingesta
+Compara el validador anterior (cadena if/elif, copiado aquí) con el
+registro de esquemas compilados (backend.event_schemas) sobre una mezcla
+de walkers, donaciones, donaciones inválidas y eventos personalizados.
+Los personalizados no son comparables uno a uno: el validador anterior
+reenviaba el dict crudo y el nuevo copia solo campos escalares acotados.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_validation [--events 200000]
+"""
+import argparse
+import time
+from datetime import datetime
+
+from backend import event_schemas
+
+MAX_AMOUNT = 10000
+MAX_USER_LENGTH = 50
+MAX_MESSAGE_LENGTH = 200
+
+SAMPLE_EVENTS = [
+    {"type": "walker", "user": "Usuario123"},
+    {"type": "donation", "user": "Supporter4", "amount": 25, "message": "¡Gracias por el stream!"},
+    {"type": "donation", "user": "Supporter9", "amount": "12.5"},
+    {"type": "donation", "user": "Troll", "amount": -5},
+    {"type": "confetti", "color": "red", "count": 30},
+]
+
+def legacy_validate(data: dict):
+    """Validador anterior (sin límites para eventos personalizados)"""
+    try:
+        event_type = data.get("type", "donation")
+        user = str(data.get("user", "Anónimo"))[:MAX_USER_LENGTH]
+        if event_type == "walker":
+            return True, "", {"type": "walker", "user": user, "timestamp": datetime.now().isoformat()}
+        elif event_type == "donation":
+            amount = data.get("amount")
+            try:
+                amount = float(amount)
+            except (TypeError, ValueError):
+                return False, "Amount must be a number", {}
+            if amount <= 0:
+                return False, "Amount must be positive", {}
+            if amount > MAX_AMOUNT:
+                return False, f"Amount exceeds maximum (${MAX_AMOUNT})", {}
+            message = str(data.get("message", ""))[:MAX_MESSAGE_LENGTH]
+            return True, "", {
+                "type": "donation", "user": user, "amount": round(amount, 2),
+                "message": message, "timestamp": datetime.now().isoformat()
+            }
+        else:
+            return True, "", {"type": event_type, "data": data, "timestamp": datetime.now().isoformat()}
+    except Exception:
+        return False, "Invalid data format", {}
+
+def measure_quiet(validate, events: list, repeat: int = 5) -> float:
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for event in events:
+            validate(event)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    return elapsed
+
+def measure_pair(first, second, events: list, repeat: int = 9) -> tuple:
+    """
+    Mejor tiempo de cada validador, alternando las corridas: una variación
+    de frecuencia de la CPU afecta a los dos por igual
+    """
+    best = [float("inf"), float("inf")]
+    for _ in range(repeat):
+        for index, validate in enumerate((first, second)):
+            best[index] = min(best[index], measure_quiet(validate, events, 1))
+    return tuple(best)
+
+def report(name: str, events: list, elapsed: float):
+    print(f"  {name:<22}{len(events) / elapsed:>12,.0f} eventos/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de validación de eventos")
+    parser.add_argument("--events", type=int, default=200000)
+    args = parser.parse_args()
+
+    events = [SAMPLE_EVENTS[i % len(SAMPLE_EVENTS)] for i in range(args.events)]
+
+    # Los dos validadores deben coincidir en los tipos conocidos
+    for event in SAMPLE_EVENTS[:4]:
+        old, new = legacy_validate(event), event_schemas.validate_event(event)
+        assert old[:2] == new[:2], (event, old, new)
+
+    print(f"{'Por tipo (µs/evento)':<24}{'anterior':>8}{'compilado':>10}")
+    for event in SAMPLE_EVENTS:
+        sample = [event] * 20000
+        old, new = measure_pair(legacy_validate, event_schemas.validate_event, sample)
+        label = f"{event['type']} {event.get('amount', '')}".strip()
+        print(f"  {label:<22}{old * 1e6 / len(sample):>8.2f}{new * 1e6 / len(sample):>8.2f}")
+
+    # Los tipos conocidos son comparables uno a uno; la mezcla completa
+    # incluye los personalizados, que el anterior no sanitizaba
+    known = [SAMPLE_EVENTS[i % 4] for i in range(args.events)]
+    for title, sample in (("tipos conocidos", known), ("mezcla completa", events)):
+        print(f"\nValidación de {len(sample)} eventos ({title}):")
+        legacy, compiled = measure_pair(legacy_validate, event_schemas.validate_event, sample)
+        report("if/elif (anterior)", sample, legacy)
+        report("esquemas compilados", sample, compiled)
+        print(f"  relación: {legacy / compiled:.2f}x")
+
+        # Costo fijo compartido por ambos: el timestamp ISO de cada evento válido
+        valid = [event for event in sample if legacy_validate(event)[0]]
+        timestamps = measure_quiet(lambda event: datetime.now().isoformat(), valid)
+        print(f"  sin timestamp: anterior {legacy - timestamps:.3f} s, "
+              f"compilado {compiled - timestamps:.3f} s")
@@ -0,0 +1,64 @@
+# benchmarks/bench_wire.py
+"""
+Microbenchmark del protocolo de cable
+Compara tamaño y costo de codificación de eventos típicos en JSON y en
+MessagePack (backend.wire), y el costo de difundir a N clientes
+codificando por cliente vs. una vez por Frame.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_wire [--clients 1000] [--events 200]
+"""
+import argparse
+import json
+import time
+import zlib
+
+from backend import wire
+
+SAMPLE_EVENTS = [
+    {"type": "donation", "user": "Supporter4", "amount": 25.0,
+     "message": "¡Gracias por el stream!", "timestamp": "2026-01-01T12:00:00.123456", "seq": 1042},
+    {"type": "walker", "user": "Usuario123", "timestamp": "2026-01-01T12:00:00.654321", "seq": 1043},
+    {"type": "leaderboard_delta", "ranks": [
+        {"rank": 1, "user": "cid", "total": 110.0, "count": 3},
+        {"rank": 2, "user": "ana", "total": 60.0, "count": 2}
+    ]},
+]
+
+def measure_sizes():
+    print(f"{'evento':<20}{'json':>8}{'msgpack':>10}{'ahorro':>9}{'json+deflate':>15}{'msgpack+deflate':>18}")
+    for event in SAMPLE_EVENTS:
+        text = json.dumps(event).encode()
+        binary = wire.packb(event)
+        print(f"{event['type']:<20}{len(text):>8}{len(binary):>10}"
+              f"{1 - len(binary) / len(text):>8.0%}"
+              f"{len(zlib.compress(text)):>15}{len(zlib.compress(binary)):>18}")
+
+def measure_fanout(clients: int, events: int):
+    messages = [json.dumps(SAMPLE_EVENTS[i % len(SAMPLE_EVENTS)]) for i in range(events)]
+
+    start = time.perf_counter()
+    for message in messages:
+        for _ in range(clients):
+            wire.packb(json.loads(message))
+    per_client = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message in messages:
+        frame = wire.Frame(message)
+        for _ in range(clients):
+            frame.binary()
+    per_frame = time.perf_counter() - start
+
+    print(f"\nDifusión de {events} eventos a {clients} clientes binarios:")
+    print(f"  codificar por cliente: {per_client:.3f} s")
+    print(f"  una vez por Frame:     {per_frame:.3f} s  ({per_client / per_frame:.0f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del protocolo de cable")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=200)
+    args = parser.parse_args()
+
+    measure_sizes()
+    measure_fanout(args.clients, args.events)
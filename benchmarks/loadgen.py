@@ -0,0 +1,405 @@
+# benchmarks/loadgen.py
+"""
+Generador de carga y benchmark de latencia end-to-end de DotLemor
+
+Levanta `python -m backend.main` en un puerto local (rate limits
+desactivados), abre N clientes WebSocket contra /ws y genera tráfico en
+/simulate_donation a una tasa fija o reproduciendo una traza NDJSON a Nx.
+
+Reporta:
+- throughput de ingesta y latencia de los POST
+- latencia de fan-out POST -> recepción en cliente (p50/p95/p99)
+- RSS del servidor por conexión
+- lag del servidor (latencia de sondas a /health) y del propio generador
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.loadgen --clients 2000 --rate 200 --duration 20
+    python -m benchmarks.loadgen --trace raid.ndjson --speed 4 --output run.json
+
+Formato de traza: una línea JSON por evento. El instante se toma de "t"
+(segundos desde el inicio) o, si no existe, de "timestamp" (ISO 8601).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import aiohttp
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+CONNECT_CONCURRENCY = 200    # handshakes WebSocket simultáneos
+PROBE_INTERVAL = 0.1         # segundos entre sondas a /health
+LAG_INTERVAL = 0.05          # segundos entre mediciones de lag local
+STARTUP_TIMEOUT = 15         # segundos máximos para que el servidor arranque
+
+# ==========================================
+# UTILIDADES
+# ==========================================
+def percentiles(values: list, scale: float = 1000.0) -> dict:
+    """p50/p95/p99/max de una lista de segundos (en ms por defecto)"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    last = len(ordered) - 1
+
+    def pick(q):
+        return round(ordered[min(last, int(q * len(ordered)))] * scale, 3)
+
+    return {
+        "count": len(ordered),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1] * scale, 3),
+        "mean": round(sum(ordered) / len(ordered) * scale, 3)
+    }
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def process_tree(pid: int) -> list:
+    """PIDs del proceso y sus descendientes (Linux /proc)"""
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+def rss_bytes(pid: int) -> int:
+    """RSS total del árbol de procesos del servidor"""
+    total = 0
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+# ==========================================
+# ETIQUETADO DE EVENTOS
+# ==========================================
+# Cada evento lleva un id que sobrevive a la sanitización del servidor,
+# para asociar la recepción en el cliente con el POST original.
+
+def tag_event(event: dict, event_id: int) -> dict:
+    event = dict(event)
+    tag = f"bench:{event_id}"
+    event_type = event.get("type", "donation")
+    if event_type == "walker":
+        event["user"] = tag
+    elif event_type == "donation":
+        event["message"] = tag
+    else:
+        event["bench_id"] = tag
+    return event
+
+def extract_tag(event: dict):
+    for value in (event.get("message"), event.get("user"), (event.get("data") or {}).get("bench_id")):
+        if isinstance(value, str) and value.startswith("bench:"):
+            return int(value[6:])
+    return None
+
+# ==========================================
+# FUENTES DE TRÁFICO
+# ==========================================
+def synthetic_events(rate: float, duration: float, walker_ratio: float):
+    """(offset, evento) a tasa constante"""
+    total = int(rate * duration)
+    for i in range(total):
+        if random.random() < walker_ratio:
+            event = {"type": "walker", "user": "Viewer"}
+        else:
+            event = {"type": "donation", "amount": random.choice([1, 5, 10, 25, 100]), "user": "Viewer"}
+        yield i / rate, event
+
+def trace_events(path: str, speed: float):
+    """(offset, evento) desde una traza NDJSON, comprimida `speed` veces"""
+    start = None
+    with open(path) as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            event = event.get("event", event)
+            if "t" in event:
+                offset = float(event.pop("t"))
+            elif "timestamp" in event:
+                stamp = datetime.fromisoformat(event.pop("timestamp")).timestamp()
+                start = stamp if start is None else start
+                offset = stamp - start
+            else:
+                offset = float(index)
+            event.pop("seq", None)
+            yield offset / speed, event
+
+# ==========================================
+# BENCHMARK
+# ==========================================
+class LoadGenerator:
+
+    def __init__(self, args):
+        self.args = args
+        self.base_url = f"http://127.0.0.1:{args.port}"
+        self.sent_at = {}
+        self.fanout_latencies = []
+        self.post_latencies = []
+        self.probe_latencies = []
+        self.loop_lags = []
+        self.status_counts = {}
+        self.frames_received = 0
+        self.events_received = 0
+        self.connect_failures = 0
+        self.sockets = []
+
+    # ---------- clientes ----------
+    async def connect_clients(self, session: aiohttp.ClientSession):
+        semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+        async def connect(index: int):
+            async with semaphore:
+                try:
+                    ws = await session.ws_connect(f"{self.base_url}/ws", heartbeat=None, autoping=True)
+                except Exception:
+                    self.connect_failures += 1
+                    return
+                self.sockets.append(ws)
+                measure = index < self.args.sample_clients
+                asyncio.create_task(self.read_client(ws, measure))
+
+        await asyncio.gather(*(connect(i) for i in range(self.args.clients)))
+
+    async def read_client(self, ws, measure: bool):
+        async for msg in ws:
+            if msg.type not in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                break
+            self.frames_received += 1
+            if not measure or msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            now = time.perf_counter()
+            data = json.loads(msg.data)
+            events = data["events"] if data.get("type") == "batch" else [data]
+            for event in events:
+                event_id = extract_tag(event)
+                if event_id is not None and event_id in self.sent_at:
+                    self.events_received += 1
+                    self.fanout_latencies.append(now - self.sent_at[event_id])
+
+    # ---------- tráfico ----------
+    async def drive(self, session: aiohttp.ClientSession, events):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        tasks = []
+        start = time.perf_counter()
+        for event_id, (offset, event) in enumerate(events):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(self.post(session, event_id, event, semaphore)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    async def post(self, session, event_id: int, event: dict, semaphore: asyncio.Semaphore):
+        payload = tag_event(event, event_id)
+        try:
+            self.sent_at[event_id] = sent = time.perf_counter()
+            async with session.post(f"{self.base_url}/simulate_donation", json=payload) as response:
+                await response.read()
+                status = response.status
+            self.post_latencies.append(time.perf_counter() - sent)
+        except Exception as e:
+            status = type(e).__name__
+        finally:
+            semaphore.release()
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    # ---------- sondas ----------
+    async def probe_server(self, session: aiohttp.ClientSession):
+        while True:
+            start = time.perf_counter()
+            try:
+                async with session.get(f"{self.base_url}/health") as response:
+                    await response.read()
+                self.probe_latencies.append(time.perf_counter() - start)
+            except Exception:
+                pass
+            await asyncio.sleep(PROBE_INTERVAL)
+
+    async def measure_loop_lag(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.loop_lags.append(max(0.0, time.perf_counter() - start - LAG_INTERVAL))
+
+    # ---------- ejecución ----------
+    async def run(self, server_pid: int) -> dict:
+        args = self.args
+        connector = aiohttp.TCPConnector(limit=0)
+        timeout = aiohttp.ClientTimeout(total=None, connect=30)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session, \
+                aiohttp.ClientSession(timeout=timeout) as probe_session:
+            rss_baseline = rss_bytes(server_pid)
+
+            connect_start = time.perf_counter()
+            await self.connect_clients(session)
+            connect_time = time.perf_counter() - connect_start
+            await asyncio.sleep(1.0)
+            rss_connected = rss_bytes(server_pid)
+
+            probes = asyncio.create_task(self.probe_server(probe_session))
+            lag = asyncio.create_task(self.measure_loop_lag())
+
+            if args.trace:
+                events = trace_events(args.trace, args.speed)
+            else:
+                events = synthetic_events(args.rate, args.duration, args.walker_ratio)
+            if args.max_events:
+                events = itertools.islice(events, args.max_events)
+            drive_time = await self.drive(session, events)
+
+            await asyncio.sleep(args.drain)
+            rss_loaded = rss_bytes(server_pid)
+            probes.cancel()
+            lag.cancel()
+
+            for ws in self.sockets:
+                await ws.close()
+
+        connected = len(self.sockets)
+        accepted = self.status_counts.get(200, 0)
+        expected = accepted * min(args.sample_clients, connected)
+        return {
+            "config": {
+                "clients": args.clients,
+                "sample_clients": args.sample_clients,
+                "workers": args.workers,
+                "rate": None if args.trace else args.rate,
+                "duration": None if args.trace else args.duration,
+                "trace": args.trace,
+                "speed": args.speed if args.trace else None,
+                "concurrency": args.concurrency
+            },
+            "connections": {
+                "connected": connected,
+                "failed": self.connect_failures,
+                "connect_time_s": round(connect_time, 3)
+            },
+            "ingest": {
+                "sent": len(self.sent_at),
+                "status": {str(k): v for k, v in self.status_counts.items()},
+                "duration_s": round(drive_time, 3),
+                "throughput_eps": round(accepted / drive_time, 1) if drive_time else 0,
+                "post_latency_ms": percentiles(self.post_latencies)
+            },
+            "fanout": {
+                "events_received": self.events_received,
+                "delivery_ratio": round(self.events_received / expected, 4) if expected else None,
+                "frames_received": self.frames_received,
+                "latency_ms": percentiles(self.fanout_latencies)
+            },
+            "server": {
+                "rss_baseline_mb": round(rss_baseline / 2**20, 2),
+                "rss_connected_mb": round(rss_connected / 2**20, 2),
+                "rss_loaded_mb": round(rss_loaded / 2**20, 2),
+                "rss_per_connection_kb": round((rss_connected - rss_baseline) / connected / 1024, 2) if connected else None,
+                "probe_latency_ms": percentiles(self.probe_latencies)
+            },
+            "loadgen": {
+                "loop_lag_ms": percentiles(self.loop_lags)
+            }
+        }
+
+# ==========================================
+# SERVIDOR
+# ==========================================
+def start_server(args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["DOTLEMOR_RATE_LIMITS"] = "0"
+    env.setdefault("DOTLEMOR_LOG_LEVEL", "warning")
+    command = [sys.executable, "-m", "backend.main", "--port", str(args.port), "--workers", str(args.workers)]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL if not args.server_logs else None)
+
+async def wait_for_server(port: int):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"http://127.0.0.1:{port}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("El servidor no arrancó a tiempo")
+
+def print_summary(report: dict):
+    fanout = report["fanout"]["latency_ms"]
+    ingest = report["ingest"]
+    server = report["server"]
+    print(
+        f"clientes={report['connections']['connected']} "
+        f"ingesta={ingest['throughput_eps']} ev/s "
+        f"fanout p50={fanout.get('p50')}ms p95={fanout.get('p95')}ms p99={fanout.get('p99')}ms "
+        f"entrega={report['fanout']['delivery_ratio']} "
+        f"rss/conn={server['rss_per_connection_kb']}KiB "
+        f"sonda p99={server['probe_latency_ms'].get('p99')}ms",
+        file=sys.stderr
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end de DotLemor")
+    parser.add_argument("--clients", type=int, default=1000, help="clientes WebSocket")
+    parser.add_argument("--sample-clients", type=int, default=50,
+                        help="clientes que parsean mensajes para medir latencia")
+    parser.add_argument("--rate", type=float, default=100, help="eventos por segundo (sintético)")
+    parser.add_argument("--duration", type=float, default=10, help="segundos de tráfico (sintético)")
+    parser.add_argument("--walker-ratio", type=float, default=0.5, help="fracción de walkers (sintético)")
+    parser.add_argument("--trace", help="traza NDJSON a reproducir")
+    parser.add_argument("--speed", type=float, default=1.0, help="multiplicador de velocidad de la traza")
+    parser.add_argument("--max-events", type=int, default=0, help="límite de eventos (0 = sin límite)")
+    parser.add_argument("--concurrency", type=int, default=64, help="POST simultáneos máximos")
+    parser.add_argument("--drain", type=float, default=2.0, help="segundos de espera tras el último POST")
+    parser.add_argument("--workers", type=int, default=1, help="workers del servidor")
+    parser.add_argument("--port", type=int, default=0, help="puerto (0 = libre)")
+    parser.add_argument("--server-logs", action="store_true", help="mostrar la salida del servidor")
+    parser.add_argument("--output", help="archivo JSON de resultados (por defecto stdout)")
+    args = parser.parse_args()
+    args.port = args.port or free_port()
+
+    server = start_server(args)
+    try:
+        asyncio.run(wait_for_server(args.port))
+        report = asyncio.run(LoadGenerator(args).run(server.pid))
+    finally:
+        server.terminate()
+        server.wait(10)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    print_summary(report)
+
+if __name__ == "__main__":
+    main()
@@ -32,7 +32,12 @@ export class APIClient {
       // Verificar si la respuesta es OK
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({}));
-        throw new Error(errorData.message || errorData.error || `HTTP ${response.status}`);
+        const error = new Error(errorData.message || errorData.error || `HTTP ${response.status}`);
+        // 503 por sobrecarga: el servidor indica cuándo reintentar
+        if (response.status === 503) {
+          error.retryAfter = parseInt(response.headers.get('Retry-After'), 10) || null;
+        }
+        throw error;
       }
       
       return await response.json();
@@ -50,7 +55,7 @@ export class APIClient {
       // Reintentar si no se alcanzó el límite
       if (attempt < this.maxRetries) {
         console.log(`🔄 Reintentando... (${attempt + 1}/${this.maxRetries})`);
-        await this.sleep(this.retryDelay * attempt);
+        await this.sleep(error.retryAfter ? error.retryAfter * 1000 : this.retryDelay * attempt);
         return this.request(endpoint, options, attempt + 1);
       }
       
@@ -66,10 +71,16 @@ export class APIClient {
   }
 
   async post(endpoint, data = {}, options = {}) {
+    // Misma clave en todos los reintentos: si el servidor ya procesó el
+    // POST (p. ej. timeout tras el broadcast) responde lo mismo sin duplicar
     return this.request(endpoint, {
       ...options,
       method: 'POST',
-      body: JSON.stringify(data)
+      body: JSON.stringify(data),
+      headers: {
+        'Idempotency-Key': newIdempotencyKey(),
+        ...options.headers
+      }
     });
   }
 
@@ -91,4 +102,11 @@ export class APIClient {
   sleep(ms) {
     return new Promise(resolve => setTimeout(resolve, ms));
   }
-}
\ No newline at end of file
+}
+
+function newIdempotencyKey() {
+  if (globalThis.crypto && typeof crypto.randomUUID === 'function') {
+    return crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
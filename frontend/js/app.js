@@ -7,20 +7,32 @@
 import { WebSocketManager } from './websocket-manager.js';
 import { APIClient } from './api-client.js';
 import { setupControls } from './controls.js';
-import { createWalker, updateWalkers, getWalkers } from './walker.js';
+import { createWalker, updateWalkers, getWalkers, clearWalkers, applyServerWalker, removeWalker } from './walker.js';
 import { createDonation, updateDonations, getDonations } from './donations.js';
-import { createObject, updateObjects, getObjects } from './object.js';
+import { createObject, updateObjects, getObjects, clearObjects } from './object.js';
 
 // ==========================================
 // CONFIGURACIÓN GLOBAL
 // ==========================================
+// Servido por el backend: mismo origen. Servidor de desarrollo (5500) o
+// archivo local: backend en el puerto por defecto
+const SERVER_ORIGIN = location.protocol === 'file:' || location.port === '5500'
+  ? 'http://127.0.0.1:8080'
+  : location.origin;
+
+// Sala del overlay (?room=<sala>); sin parámetro, la sala por defecto
+const ROOM = new URLSearchParams(location.search).get('room');
+const ROOM_PATH = ROOM ? '/' + encodeURIComponent(ROOM) : '';
+
 const CONFIG = {
   api: {
-    baseUrl: 'http://127.0.0.1:8080',
+    baseUrl: SERVER_ORIGIN,
+    ingestPrefix: ROOM ? '/rooms' + ROOM_PATH : '',
     timeout: 5000
   },
   websocket: {
-    url: 'ws://127.0.0.1:8080/ws'
+    url: SERVER_ORIGIN.replace(/^http/, 'ws') + '/ws' + ROOM_PATH,
+    topics: null  // null = todos; p. ej. ['donation'] para un overlay dedicado
   },
   canvas: {
     backgroundColor: '#2d3436',
@@ -53,6 +65,13 @@ const state = {
   connectionStartTime: null,
   wsEventCount: 0,
   
+  // Leaderboard (top donadores, mantenido por el servidor)
+  leaderboard: [],
+  
+  // Mundo del servidor (si está activo): id de entidad -> objeto local
+  worldMode: false,
+  world: new Map(),
+  
   // UI Elements
   elements: {}
 };
@@ -122,6 +141,9 @@ function initDOMElements() {
     wsEventCount: document.getElementById('wsEventCount'),
     connectionTime: document.getElementById('connectionTime'),
     
+    // Leaderboard
+    leaderboardList: document.getElementById('leaderboardList'),
+    
     // Buttons
     btnWalker: document.getElementById('btnWalker'),
     btnDonation: document.getElementById('btnDonation'),
@@ -182,7 +204,7 @@ function updateAPIStatus(isConnected) {
 // WEBSOCKET
 // ==========================================
 function initWebSocket() {
-  state.wsManager = new WebSocketManager(CONFIG.websocket.url);
+  state.wsManager = new WebSocketManager(CONFIG.websocket.url, CONFIG.websocket.topics);
   
   // Eventos de conexión
   state.wsManager.on('open', () => {
@@ -191,6 +213,7 @@ function initWebSocket() {
     state.connectionStartTime = Date.now();
     updateWSStatus('connected', 'Conectado');
     showNotification('Conectado al servidor', 'success');
+    loadLeaderboard();
   });
   
   state.wsManager.on('close', () => {
@@ -220,20 +243,94 @@ function initWebSocket() {
     handleWalkerEvent(data);
   });
   
+  state.wsManager.on('walkers', (data) => {
+    // Walkers fusionados por el servidor (la conexión se atrasó)
+    state.wsEventCount += data.count;
+    handleWalkersEvent(data);
+  });
+  
   state.wsManager.on('donation', (data) => {
     console.log('💰 Evento donation recibido:', data);
     state.wsEventCount++;
     handleDonationEvent(data);
   });
   
-  state.wsManager.on('heartbeat', () => {
-    // Heartbeat recibido, conexión viva
+  state.wsManager.on('world_snapshot', (data) => {
+    applyWorldSnapshot(data);
+  });
+  
+  state.wsManager.on('world_delta', (data) => {
+    applyWorldDelta(data);
+  });
+  
+  state.wsManager.on('leaderboard_delta', (data) => {
+    applyLeaderboardDelta(data.ranks);
+  });
+  
+  state.wsManager.on('resync', () => {
+    // Se perdieron eventos que ya no están en el buffer del servidor
+    showNotification('Algunos eventos se perdieron durante la desconexión', 'warning');
   });
   
   // Conectar
   state.wsManager.connect();
 }
 
+// ==========================================
+// LEADERBOARD
+// ==========================================
+async function loadLeaderboard() {
+  try {
+    const response = await state.apiClient.get('/leaderboard');
+    if (response && response.top) {
+      state.leaderboard = response.top;
+      renderLeaderboard();
+    }
+  } catch (error) {
+    console.error('❌ Error cargando leaderboard:', error);
+  }
+}
+
+/**
+ * Aplica un delta del servidor: solo llegan las posiciones que cambiaron
+ */
+function applyLeaderboardDelta(ranks) {
+  for (const entry of ranks) {
+    state.leaderboard[entry.rank - 1] = entry;
+  }
+  renderLeaderboard();
+}
+
+function renderLeaderboard() {
+  const list = state.elements.leaderboardList;
+  if (!list) return;
+  
+  const items = state.leaderboard.filter(Boolean).map((entry) => {
+    // textContent: los nombres de usuario vienen de los clientes
+    const item = document.createElement('li');
+    item.className = 'leaderboard-item';
+    const rank = document.createElement('span');
+    rank.className = 'leaderboard-rank';
+    rank.textContent = `#${entry.rank}`;
+    const user = document.createElement('span');
+    user.className = 'leaderboard-user';
+    user.textContent = entry.user;
+    const total = document.createElement('span');
+    total.className = 'leaderboard-total';
+    total.textContent = `$${entry.total.toFixed(2)}`;
+    item.append(rank, user, total);
+    return item;
+  });
+  
+  if (items.length === 0) {
+    const empty = document.createElement('li');
+    empty.className = 'leaderboard-empty';
+    empty.textContent = 'Sin donaciones todavía';
+    items.push(empty);
+  }
+  list.replaceChildren(...items);
+}
+
 function updateWSStatus(status, text) {
   if (state.elements.wsIndicator && state.elements.wsStatus) {
     state.elements.wsIndicator.className = `status-indicator ${status}`;
@@ -248,7 +345,7 @@ async function handleCreateWalker() {
   try {
     setButtonLoading('btnWalker', true);
     
-    const response = await state.apiClient.post('/simulate_donation', {
+    const response = await state.apiClient.post(CONFIG.api.ingestPrefix + '/simulate_donation', {
       type: 'walker',
       user: 'Usuario' + Math.floor(Math.random() * 1000)
     });
@@ -280,7 +377,7 @@ async function handleCreateDonation() {
     const amounts = [5, 10, 25, 50, 100, 250];
     const users = ['Viewer1', 'Donador2', 'Fan3', 'Supporter4'];
     
-    const response = await state.apiClient.post('/simulate_donation', {
+    const response = await state.apiClient.post(CONFIG.api.ingestPrefix + '/simulate_donation', {
       type: 'donation',
       amount: amounts[Math.floor(Math.random() * amounts.length)],
       user: users[Math.floor(Math.random() * users.length)],
@@ -309,7 +406,7 @@ async function handleCustomDonation(amount, user, message) {
   try {
     setButtonLoading('btnSendDonation', true);
     
-    const response = await state.apiClient.post('/simulate_donation', {
+    const response = await state.apiClient.post(CONFIG.api.ingestPrefix + '/simulate_donation', {
       type: 'donation',
       amount: parseFloat(amount),
       user: user || 'Anónimo',
@@ -341,13 +438,25 @@ async function handleCustomDonation(amount, user, message) {
 // WEBSOCKET EVENT HANDLERS
 // ==========================================
 function handleWalkerEvent(data) {
-  createWalkerLocal(data.user);
+  // Con el mundo del servidor, la entidad llega en el world_delta
+  if (!state.worldMode) {
+    createWalkerLocal(data.user);
+  }
   showNotification(`👤 ${data.user} ha llegado`, 'success');
 }
 
+function handleWalkersEvent(data) {
+  if (!state.worldMode) {
+    data.users.forEach(user => createWalkerLocal(user));
+  }
+  showNotification(`👥 ${data.count} personas han llegado`, 'success');
+}
+
 function handleDonationEvent(data) {
-  createDonationLocal(data.amount, data.user, data.message);
-  createObject(); // Crear objeto coleccionable
+  if (!state.worldMode) {
+    createDonationLocal(data.amount, data.user, data.message);
+    createObject(); // Crear objeto coleccionable
+  }
   
   const effectType = data.effect || 'basic';
   showNotification(
@@ -356,6 +465,66 @@ function handleDonationEvent(data) {
   );
 }
 
+// ==========================================
+// MUNDO DEL SERVIDOR
+// ==========================================
+/**
+ * Snapshot completo al conectar: reemplaza el estado local
+ */
+function applyWorldSnapshot(data) {
+  state.worldMode = true;
+  state.world.clear();
+  clearWalkers();
+  clearObjects();
+  
+  for (const entity of data.entities) {
+    upsertWorldEntity(entity);
+  }
+  console.log(`🌍 Snapshot del mundo: ${data.entities.length} entidades (tick ${data.tick})`);
+}
+
+/**
+ * Delta por tick: solo entidades nuevas, cambiadas o eliminadas
+ */
+function applyWorldDelta(data) {
+  for (const entity of data.upsert) {
+    upsertWorldEntity(entity);
+  }
+  
+  for (const id of data.remove) {
+    const local = state.world.get(id);
+    state.world.delete(id);
+    if (!local) continue;
+    
+    if (local.kind === 'walker') {
+      removeWalker(local.ref);
+    } else if (local.kind === 'object') {
+      local.ref.collected = true;
+    }
+    // Los efectos de donación terminan solos con su duración
+  }
+}
+
+function upsertWorldEntity(entity) {
+  const local = state.world.get(entity.id);
+  
+  if (entity.kind === 'walker') {
+    const walker = applyServerWalker(entity, local ? local.ref : null);
+    if (!local) state.world.set(entity.id, { kind: 'walker', ref: walker });
+    
+  } else if (!local && entity.kind === 'donation') {
+    const donation = createDonation(
+      state.canvas.width / 2, state.canvas.height / 2,
+      entity.amount, entity.user, entity.message
+    );
+    donation.duration = entity.ttl * 1000;
+    state.world.set(entity.id, { kind: 'donation', ref: donation });
+    
+  } else if (!local && entity.kind === 'object') {
+    state.world.set(entity.id, { kind: 'object', ref: createObject(entity.x, entity.y) });
+  }
+}
+
 // ==========================================
 // FUNCIONES LOCALES DE CREACIÓN
 // ==========================================
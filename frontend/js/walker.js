@@ -100,6 +100,13 @@ export function updateWalkers(ctx, delta, groundY = 420) {
   for (let i = walkers.length - 1; i >= 0; i--) {
     const walker = walkers[i];
     
+    // Walkers del mundo del servidor: bordes, giros y bajas los decide el servidor
+    if (walker.serverDriven) {
+      updateServerWalker(walker, delta);
+      drawWalker(ctx, walker, groundY);
+      continue;
+    }
+    
     // === MOVIMIENTO HORIZONTAL ===
     if (!walker.jumping || walker.jumpCooldown > 0) {
       walker.x += walker.speed * walker.direction * (delta * 60);
@@ -169,6 +176,53 @@ export function updateWalkers(ctx, delta, groundY = 420) {
   }
 }
 
+/**
+ * Extrapola un walker del servidor entre deltas (x, dirección, velocidad)
+ */
+function updateServerWalker(walker, delta) {
+  if (walker.jumping) {
+    walker.jumpFrame++;
+    if (walker.jumpFrame > BEHAVIOR_CONFIG.jumpDuration) {
+      walker.jumping = false;
+      walker.jumpFrame = 0;
+    }
+    return;
+  }
+  
+  walker.x += walker.speed * walker.direction * (delta * 60);
+  walker.frame += walker.animationSpeed;
+  if (walker.frame >= SPRITE_CONFIG.animations.walk.frames) {
+    walker.frame = 0;
+  }
+}
+
+/**
+ * Crea o actualiza un walker a partir de una entidad del mundo del servidor
+ * (speed llega en px/s; localmente se usa px por frame a 60 FPS)
+ */
+export function applyServerWalker(entity, walker = null) {
+  if (!walker) {
+    walker = createWalker(entity.x, entity.y, entity.user);
+    walker.serverDriven = true;
+  }
+  walker.x = entity.x;
+  walker.y = entity.y;
+  walker.direction = entity.dir;
+  walker.speed = entity.speed / 60;
+  if (entity.jumping && !walker.jumping) {
+    walker.jumping = true;
+    walker.jumpFrame = 0;
+  }
+  return walker;
+}
+
+export function removeWalker(walker) {
+  const index = walkers.indexOf(walker);
+  if (index !== -1) {
+    walkers.splice(index, 1);
+  }
+}
+
 function drawWalker(ctx, walker, groundY) {
   if (!sprite.complete || sprite.naturalHeight === 0) {
     // Sprite no cargado, dibujar placeholder VISIBLE
@@ -3,15 +3,34 @@
  * Gestor de WebSocket con reconexión automática
  */
 
+// Subprotocolos en orden de preferencia (el servidor elige uno)
+const PROTOCOL_MSGPACK = 'dotlemor.msgpack.v1';
+const PROTOCOL_JSON = 'dotlemor.json.v1';
+
+// Cada cuánto se confirma al servidor la última secuencia recibida
+const ACK_INTERVAL = 5000;
+
+// Cierre por reinicio del servidor (drenado): trae la espera sugerida
+const CLOSE_SERVICE_RESTART = 1012;
+
+// Carril de baja prioridad: el servidor puede entregarlos después de
+// eventos posteriores (o fusionados), así que no se descartan por seq
+const LOW_PRIORITY_TYPES = new Set(['walker', 'walkers']);
+
 export class WebSocketManager {
-  constructor(url) {
+  constructor(url, topics = null, binary = true) {
     this.url = url;
+    this.topics = topics;  // tipos de evento a recibir (null = todos)
+    this.binary = binary;  // ofrecer frames binarios MessagePack
     this.ws = null;
     this.listeners = new Map();
     this.reconnectDelay = 1000;
     this.maxReconnectDelay = 30000;
     this.reconnectAttempts = 0;
     this.isManualClose = false;
+    this.lastSeq = null;  // último evento recibido, para reanudar con ?since=
+    this.ackedSeq = null; // última secuencia confirmada al servidor
+    this.ackTimer = null;
   }
 
   connect() {
@@ -23,7 +42,9 @@ export class WebSocketManager {
     this.emit('connecting');
     
     try {
-      this.ws = new WebSocket(this.url);
+      const protocols = this.binary ? [PROTOCOL_MSGPACK, PROTOCOL_JSON] : [PROTOCOL_JSON];
+      this.ws = new WebSocket(this.buildUrl(), protocols);
+      this.ws.binaryType = 'arraybuffer';
       this.setupEventHandlers();
     } catch (error) {
       console.error('Error al crear WebSocket:', error);
@@ -36,21 +57,26 @@ export class WebSocketManager {
       console.log('✅ WebSocket conectado');
       this.reconnectDelay = 1000;
       this.reconnectAttempts = 0;
+      this.ackedSeq = null;
+      this.startAcks();
       this.emit('open');
     };
 
     this.ws.onmessage = (event) => {
       try {
-        const data = JSON.parse(event.data);
+        // Texto JSON o binario MessagePack, según el subprotocolo negociado
+        const data = typeof event.data === 'string'
+          ? JSON.parse(event.data)
+          : decodeMsgPack(new Uint8Array(event.data));
         console.log('📨 Mensaje recibido:', data);
         
-        // Emitir evento específico por tipo
-        if (data.type) {
-          this.emit(data.type, data);
+        // Desempaquetar lotes del servidor
+        if (data.type === 'batch' && Array.isArray(data.events)) {
+          data.events.forEach(item => this.dispatchMessage(item));
+          return;
         }
         
-        // Emitir evento genérico
-        this.emit('message', data);
+        this.dispatchMessage(data);
         
       } catch (error) {
         console.error('Error al parsear mensaje:', error);
@@ -64,20 +90,104 @@ export class WebSocketManager {
 
     this.ws.onclose = (event) => {
       console.log('👋 WebSocket cerrado:', event.code, event.reason);
+      this.stopAcks();
       this.emit('close', event);
       
       // Reconectar solo si no fue cierre manual
       if (!this.isManualClose) {
-        this.scheduleReconnect();
+        this.scheduleReconnect(this.reconnectHint(event));
       }
     };
   }
 
-  scheduleReconnect() {
+  buildUrl() {
+    if (this.lastSeq === null && !this.topics) return this.url;
+    
+    const url = new URL(this.url);
+    
+    // Suscripción: el servidor solo envía estos tipos de evento
+    if (this.topics) {
+      url.searchParams.set('topics', this.topics.join(','));
+    }
+    
+    // Reanudar: el servidor reenvía solo los eventos perdidos
+    if (this.lastSeq !== null) {
+      url.searchParams.set('since', this.lastSeq);
+    }
+    return url.toString();
+  }
+
+  subscribe(topics) {
+    // null o ['*'] = todos los tipos
+    this.topics = topics && !topics.includes('*') ? topics : null;
+    return this.send({ type: 'subscribe', topics: this.topics || ['*'] });
+  }
+
+  dispatchMessage(data) {
+    // Secuencia: descartar duplicados y recordar la posición
+    if (typeof data.seq === 'number') {
+      if (this.lastSeq !== null && data.seq <= this.lastSeq) {
+        if (!LOW_PRIORITY_TYPES.has(data.type)) return;
+      } else {
+        this.lastSeq = data.seq;
+      }
+    } else if (data.type === 'connection' && this.lastSeq === null &&
+               typeof data.last_seq === 'number') {
+      this.lastSeq = data.last_seq;
+    } else if (data.type === 'resync') {
+      // El hueco es demasiado antiguo: continuar desde la posición actual
+      console.warn('🔁 Resincronización requerida:', data.reason);
+      this.lastSeq = typeof data.last_seq === 'number' ? data.last_seq : null;
+    }
+    
+    // Emitir evento específico por tipo
+    if (data.type) {
+      this.emit(data.type, data);
+    }
+    
+    // Emitir evento genérico
+    this.emit('message', data);
+  }
+
+  startAcks() {
+    // El servidor calcula el lag de cada cliente con estas confirmaciones
+    this.stopAcks();
+    this.ackTimer = setInterval(() => {
+      if (this.lastSeq !== null && this.lastSeq !== this.ackedSeq &&
+          this.send({ type: 'ack', seq: this.lastSeq })) {
+        this.ackedSeq = this.lastSeq;
+      }
+    }, ACK_INTERVAL);
+  }
+
+  stopAcks() {
+    if (this.ackTimer !== null) {
+      clearInterval(this.ackTimer);
+      this.ackTimer = null;
+    }
+  }
+
+  reconnectHint(event) {
+    // El servidor reparte las reconexiones: {"reconnect_ms": N} en el motivo
+    if (event.code !== CLOSE_SERVICE_RESTART || !event.reason) return null;
+    try {
+      const hint = JSON.parse(event.reason).reconnect_ms;
+      return typeof hint === 'number' && hint >= 0 ? hint : null;
+    } catch {
+      return null;
+    }
+  }
+
+  scheduleReconnect(hint = null) {
     this.reconnectAttempts++;
     
+    // Jitter: clientes desconectados a la vez no reconectan a la vez
+    const delay = hint !== null
+      ? hint + Math.random() * 1000
+      : this.reconnectDelay * (0.5 + Math.random());
+    
     console.log(
-      `🔄 Reconectando en ${this.reconnectDelay}ms (intento ${this.reconnectAttempts})...`
+      `🔄 Reconectando en ${Math.round(delay)}ms (intento ${this.reconnectAttempts})...`
     );
     
     setTimeout(() => {
@@ -88,7 +198,7 @@ export class WebSocketManager {
         this.reconnectDelay * 1.5,
         this.maxReconnectDelay
       );
-    }, this.reconnectDelay);
+    }, delay);
   }
 
   send(data) {
@@ -109,6 +219,7 @@ export class WebSocketManager {
 
   close() {
     this.isManualClose = true;
+    this.stopAcks();
     
     if (this.ws) {
       this.ws.close();
@@ -161,4 +272,80 @@ export class WebSocketManager {
       default: return 'UNKNOWN';
     }
   }
-}
\ No newline at end of file
+}
+// ==========================================
+// MESSAGEPACK (decodificador mínimo)
+// ==========================================
+const textDecoder = new TextDecoder();
+
+export function decodeMsgPack(bytes) {
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  let offset = 0;
+
+  function str(size) {
+    const value = textDecoder.decode(bytes.subarray(offset, offset + size));
+    offset += size;
+    return value;
+  }
+
+  function array(size) {
+    const items = new Array(size);
+    for (let i = 0; i < size; i++) items[i] = read();
+    return items;
+  }
+
+  function map(size) {
+    const result = {};
+    for (let i = 0; i < size; i++) {
+      const key = read();
+      result[key] = read();
+    }
+    return result;
+  }
+
+  function read() {
+    const code = view.getUint8(offset++);
+    let value;
+
+    if (code < 0x80) return code;
+    if (code >= 0xe0) return code - 0x100;
+    if (code >= 0xa0 && code <= 0xbf) return str(code & 0x1f);
+    if (code >= 0x90 && code <= 0x9f) return array(code & 0x0f);
+    if (code >= 0x80 && code <= 0x8f) return map(code & 0x0f);
+
+    switch (code) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xcc: value = view.getUint8(offset); offset += 1; return value;
+      case 0xcd: value = view.getUint16(offset); offset += 2; return value;
+      case 0xce: value = view.getUint32(offset); offset += 4; return value;
+      case 0xcf: value = Number(view.getBigUint64(offset)); offset += 8; return value;
+      case 0xd0: value = view.getInt8(offset); offset += 1; return value;
+      case 0xd1: value = view.getInt16(offset); offset += 2; return value;
+      case 0xd2: value = view.getInt32(offset); offset += 4; return value;
+      case 0xd3: value = Number(view.getBigInt64(offset)); offset += 8; return value;
+      case 0xca: value = view.getFloat32(offset); offset += 4; return value;
+      case 0xcb: value = view.getFloat64(offset); offset += 8; return value;
+      case 0xd9: value = view.getUint8(offset); offset += 1; return str(value);
+      case 0xda: value = view.getUint16(offset); offset += 2; return str(value);
+      case 0xdb: value = view.getUint32(offset); offset += 4; return str(value);
+      case 0xc4: value = view.getUint8(offset); offset += 1; break;
+      case 0xc5: value = view.getUint16(offset); offset += 2; break;
+      case 0xc6: value = view.getUint32(offset); offset += 4; break;
+      case 0xdc: value = view.getUint16(offset); offset += 2; return array(value);
+      case 0xdd: value = view.getUint32(offset); offset += 4; return array(value);
+      case 0xde: value = view.getUint16(offset); offset += 2; return map(value);
+      case 0xdf: value = view.getUint32(offset); offset += 4; return map(value);
+      default:
+        throw new Error(`Código MessagePack no soportado: 0x${code.toString(16)}`);
+    }
+
+    // bin 8/16/32
+    const data = bytes.slice(offset, offset + value);
+    offset += value;
+    return data;
+  }
+
+  return read();
+}
@@ -0,0 +1,116 @@
+# tests/conftest.py
+"""
+Fixtures compartidas
+- app_factory: aplicación completa (sin frontend) con el ledger en un
+  directorio temporal, servida por el TestClient de aiohttp
+- fake_clients: WebSockets falsos registrados directamente en el dispatcher
+- Cada test empieza con los limitadores por ruta vacíos
+Los tests async corren con asyncio.run (sin plugins de pytest)
+"""
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from backend import event_dispatcher
+from backend import event_ledger
+from backend import main
+from backend import rate_limiter
+from backend import wire
+
+
+class FakeSocket:
+    """
+    WebSocket falso para el dispatcher: guarda los mensajes enviados
+    Con la compuerta cerrada cada envío espera (cliente lento)
+    """
+
+    def __init__(self, open_gate=True):
+        self.closed = False
+        self.close_code = None
+        self.sent = []
+        self.gate = asyncio.Event()
+        if open_gate:
+            self.gate.set()
+
+    async def send_str(self, data):
+        await self.gate.wait()
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        await self.gate.wait()
+        self.sent.append(wire.unpackb(data))
+
+    async def close(self, code=1000, message=b""):
+        self.closed = True
+        self.close_code = code
+
+    def messages(self) -> list:
+        """Mensajes enviados, sin el saludo de conexión"""
+        return [message for message in self.sent if message.get("type") != "connection"]
+
+    async def settle(self) -> list:
+        """Abre la compuerta, espera a que la escritora vacíe las colas y retorna messages()"""
+        self.gate.set()
+        for _ in range(100):
+            record = event_dispatcher.get_client(self)
+            if record is None or not record.pending():
+                break
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return self.messages()
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limits():
+    """Limitadores nuevos por test: los cupos no se arrastran entre tests"""
+    saved = dict(rate_limiter.limiters)
+    for route, limiter in saved.items():
+        rate_limiter.limiters[route] = rate_limiter.TokenBucketLimiter(
+            int(limiter.capacity), limiter.window, limiter.max_keys
+        )
+    yield
+    rate_limiter.limiters.clear()
+    rate_limiter.limiters.update(saved)
+
+
+@pytest.fixture
+def run():
+    """Ejecuta una corrutina en un event loop nuevo"""
+    return asyncio.run
+
+
+@pytest.fixture
+def app_factory(tmp_path, monkeypatch):
+    """Crea la app completa con el ledger en tmp_path y sin frontend"""
+    monkeypatch.setattr(event_ledger, "LEDGER_DIR", str(tmp_path / "ledger"))
+    monkeypatch.setitem(main.CONFIG, "frontend", False)
+
+    async def start() -> TestClient:
+        client = TestClient(TestServer(main.create_app()))
+        await client.start_server()
+        return client
+
+    return start
+
+
+@pytest.fixture
+def fake_clients():
+    """Registra FakeSockets en el dispatcher y los quita al terminar el test"""
+    created = []
+
+    async def connect(room=None, open_gate=True, binary=False) -> FakeSocket:
+        ws = FakeSocket(open_gate)
+        created.append(ws)
+        await event_dispatcher.register_client(ws, binary=binary, room=room)
+        # La escritora toma el saludo (y queda bloqueada si la compuerta está cerrada)
+        await asyncio.sleep(0)
+        return ws
+
+    async def remove_all():
+        for ws in created:
+            await event_dispatcher.unregister_client(ws)
+
+    yield connect
+    asyncio.run(remove_all())
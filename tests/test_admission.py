@@ -0,0 +1,114 @@
+# tests/test_admission.py
+"""Control de admisión: presión, descarte por prioridad y Retry-After"""
+import pytest
+
+from backend import admission
+from backend import event_dispatcher
+from backend import metrics
+
+WALKER = {"type": "walker", "user": "a"}
+DONATION = {"type": "donation", "user": "a", "amount": 5}
+PROMO = {"type": "promo", "text": "hola"}
+
+
+@pytest.fixture
+def load(monkeypatch):
+    """Fija la presión que ve el middleware"""
+    def set_pressure(value):
+        monkeypatch.setattr(admission, "pressure", lambda: value)
+    return set_pressure
+
+
+async def _post_all(app_factory, requests):
+    client = await app_factory()
+    try:
+        results = []
+        for path, body in requests:
+            response = await client.post(path, json=body)
+            results.append((response.status, response.headers.get("Retry-After")))
+        return results
+    finally:
+        await client.close()
+
+
+# ==========================================
+# PRESIÓN
+# ==========================================
+def test_pressure_is_the_worst_signal(monkeypatch):
+    metrics.event_loop_lag.set(admission.LOOP_LAG_LIMIT / 2)
+    try:
+        assert admission.pressure() == pytest.approx(0.5)
+        monkeypatch.setattr(admission, "inflight", admission.MAX_INFLIGHT)
+        assert admission.pressure() == pytest.approx(1.0)
+    finally:
+        metrics.event_loop_lag.set(0)
+
+
+def test_queue_fill_counts_as_pressure(run, fake_clients, monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "SEND_QUEUE_SIZE", 10)
+
+    async def scenario():
+        ws = await fake_clients(open_gate=False)
+        for n in range(4):
+            event_dispatcher._enqueue(ws, '{"type": "promo"}')
+        return admission.pressure()
+
+    # 4 de 10 mensajes: 0.4 / QUEUE_FILL_LIMIT
+    assert run(scenario()) == pytest.approx(0.4 / admission.QUEUE_FILL_LIMIT)
+
+
+def test_retry_after_grows_with_pressure_and_lower_priority(monkeypatch):
+    monkeypatch.setattr(admission.random, "random", lambda: 0.0)
+    assert admission.retry_after(0.6, 2) == 1
+    assert admission.retry_after(0.6, 0) == 3
+    assert admission.retry_after(4.0, 0) == 12
+    assert admission.retry_after(100.0, None) == admission.RETRY_AFTER_MAX
+
+
+# ==========================================
+# MIDDLEWARE
+# ==========================================
+def test_low_priority_events_are_shed_first(run, app_factory, load):
+    load(0.6)
+    (walker, retry), (donation, _), (promo, _) = run(_post_all(app_factory, [
+        ("/simulate_donation", WALKER), ("/simulate_donation", DONATION), ("/simulate_donation", PROMO)
+    ]))
+    assert walker == 503 and int(retry) >= 1
+    assert (donation, promo) == (200, 200)
+
+    load(0.8)
+    statuses = [status for status, _ in run(_post_all(app_factory, [
+        ("/simulate_donation", PROMO), ("/events/bulk", [DONATION]), ("/simulate_donation", DONATION)
+    ]))]
+    assert statuses == [503, 503, 200]
+
+
+def test_full_pressure_rejects_everything_but_reads(run, app_factory, load):
+    load(1.0)
+    rejected = admission.admission_stats["rejected_by_priority"]["all"]
+
+    async def scenario():
+        client = await app_factory()
+        try:
+            post = await client.post("/simulate_donation", json=DONATION)
+            health = await client.get("/health")
+            return post.status, health.status
+        finally:
+            await client.close()
+
+    assert run(scenario()) == (503, 200)
+    assert admission.admission_stats["rejected_by_priority"]["all"] == rejected + 1
+
+
+def test_inflight_cap(run, app_factory, load, monkeypatch):
+    load(0.0)
+    monkeypatch.setattr(admission, "MAX_INFLIGHT", 0)
+    (status, retry), = run(_post_all(app_factory, [("/simulate_donation", DONATION)]))
+    assert status == 503 and retry is not None
+
+
+def test_ws_actions_are_shed_by_type(load):
+    load(0.6)
+    assert admission.overloaded_for("walker")
+    assert not admission.overloaded_for("donation")
+    assert not admission.overloaded_for(None)
@@ -0,0 +1,80 @@
+# tests/test_batching.py
+"""Micro-lotes: eventos agrupados en un frame "batch" por ventana o tamaño"""
+import asyncio
+
+import pytest
+
+from backend import event_dispatcher
+
+
+@pytest.fixture
+def batching(monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "BATCH_ENABLED", True)
+    monkeypatch.setattr(event_dispatcher, "BATCH_WINDOW_MS", 5)
+    monkeypatch.setattr(event_dispatcher, "BATCH_MAX_EVENTS", 3)
+
+
+def donation(n):
+    return {"type": "donation", "user": f"u{n}", "amount": n}
+
+
+def test_events_within_the_window_share_one_frame(run, fake_clients, batching):
+    async def scenario():
+        ws = await fake_clients()
+        for n in (1, 2):
+            event_dispatcher.deliver_local(donation(n))
+        before = await ws.settle()
+        await asyncio.sleep(0.02)
+        return before, await ws.settle()
+
+    before, after = run(scenario())
+    assert before == []
+    frame, = after
+    assert frame["type"] == "batch"
+    assert [event["user"] for event in frame["events"]] == ["u1", "u2"]
+    first, second = (event["seq"] for event in frame["events"])
+    assert second == first + 1
+
+
+def test_full_batch_is_sent_without_waiting(run, fake_clients, batching):
+    async def scenario():
+        ws = await fake_clients()
+        for n in range(4):
+            event_dispatcher.deliver_local(donation(n))
+        sent = await ws.settle()
+        pending = list(event_dispatcher.default_room.pending_batch)
+        await asyncio.sleep(0.02)
+        return sent, pending, await ws.settle()
+
+    sent, pending, after = run(scenario())
+    assert [len(frame["events"]) for frame in sent] == [3]
+    assert [event["user"] for event in pending] == ["u3"]
+    # Un lote de un solo evento viaja sin envolver
+    assert [frame["type"] for frame in after] == ["batch", "donation"]
+    assert after[1]["user"] == "u3"
+
+
+def test_flush_batch_sends_pending_events_immediately(run, fake_clients, batching):
+    async def scenario():
+        ws = await fake_clients()
+        event_dispatcher.deliver_local(donation(1))
+        event_dispatcher.deliver_local(donation(2))
+        stats = event_dispatcher.flush_batch()
+        timer = event_dispatcher.default_room.batch_timer
+        return stats, timer, await ws.settle()
+
+    stats, timer, sent = run(scenario())
+    assert stats["success"] == 1 and timer is None
+    assert [frame["type"] for frame in sent] == ["batch"]
+
+
+def test_deliver_many_sends_one_frame_without_batching(run, fake_clients):
+    async def scenario():
+        ws = await fake_clients()
+        stats = event_dispatcher.deliver_local_many([donation(n) for n in range(3)])
+        return stats, await ws.settle()
+
+    stats, sent = run(scenario())
+    assert stats["success"] == 1
+    frame, = sent
+    assert [event["user"] for event in frame["events"]] == ["u0", "u1", "u2"]
@@ -0,0 +1,128 @@
+# tests/test_bulk.py
+"""Ingesta masiva: array JSON y NDJSON en streaming"""
+import json
+
+import pytest
+
+from backend import donation_api
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+def walkers(count):
+    return [{"type": "walker", "user": f"u{i}"} for i in range(count)]
+
+
+def ndjson(items):
+    return "".join(json.dumps(item) + "\n" for item in items).encode()
+
+
+async def post(app_factory, body, headers=None):
+    client = await app_factory()
+    try:
+        response = await client.post("/events/bulk", data=body, headers=headers)
+        return response.status, await response.read()
+    finally:
+        await client.close()
+
+
+def lines(body):
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+
+# ==========================================
+# TOPE DE EVENTOS
+# ==========================================
+def test_array_over_the_event_cap_is_rejected(run, app_factory, monkeypatch):
+    monkeypatch.setattr(donation_api, "BULK_MAX_EVENTS", 3)
+    status, body = run(post(app_factory, json.dumps(walkers(4))))
+    assert status == 413 and json.loads(body)["message"] == "Too many events (max 3)"
+    status, body = run(post(app_factory, json.dumps(walkers(3))))
+    assert status == 200 and json.loads(body)["accepted"] == 3
+
+
+def test_ndjson_stops_at_the_event_cap(run, app_factory, monkeypatch):
+    monkeypatch.setattr(donation_api, "BULK_MAX_EVENTS", 3)
+    status, body = run(post(app_factory, ndjson(walkers(5)), NDJSON))
+    *results, summary = lines(body)
+    assert status == 200 and len(results) == 3
+    assert summary == {"status": "error", "accepted": 3, "rejected": 0, "message": "Too many events (max 3)"}
+
+
+# ==========================================
+# ERRORES CON LA RESPUESTA YA INICIADA
+# ==========================================
+def test_ndjson_internal_error_is_reported_in_the_stream(run, app_factory, monkeypatch):
+    real_validate = donation_api._validate_bulk_item
+
+    def flaky_validate(index, item, room=None):
+        if index == 2:
+            raise RuntimeError("fallo interno")
+        return real_validate(index, item, room)
+
+    monkeypatch.setattr(donation_api, "_validate_bulk_item", flaky_validate)
+    status, body = run(post(app_factory, ndjson(walkers(4)), NDJSON))
+    *results, summary = lines(body)
+    assert status == 200 and [result["index"] for result in results] == [0, 1]
+    assert summary == {"status": "error", "accepted": 2, "rejected": 0, "message": "Internal server error"}
+
+
+# ==========================================
+# ARRAY JSON
+# ==========================================
+def test_array_reports_one_result_per_item(run, app_factory):
+    items = [{"type": "walker", "user": "a"}, "x", {"type": "donation", "amount": -1},
+             {"type": "donation", "user": "b", "amount": 5}]
+    status, body = run(post(app_factory, json.dumps(items)))
+    response = json.loads(body)
+    assert status == 200 and (response["accepted"], response["rejected"]) == (2, 2)
+    assert [result["status"] for result in response["results"]] == ["ok", "error", "error", "ok"]
+    assert response["results"][1]["message"] == "Item must be an object"
+
+
+@pytest.mark.parametrize("body, message", [
+    (b"{oops", "Invalid JSON"), (b'{"type": "walker"}', "Body must be a JSON array"),
+])
+def test_array_body_errors(run, app_factory, body, message):
+    status, response = run(post(app_factory, body))
+    assert status == 400 and json.loads(response)["message"] == message
+
+
+def test_accepted_events_are_broadcast_in_chunks(run, app_factory, monkeypatch):
+    monkeypatch.setattr(donation_api, "BULK_CHUNK_SIZE", 2)
+
+    async def scenario():
+        client = await app_factory()
+        try:
+            # Solo donaciones: sin los deltas del leaderboard
+            ws = await client.ws_connect("/ws?topics=donation")
+            await ws.receive_json(timeout=2)
+            donations = [{"type": "donation", "user": f"u{i}", "amount": 1} for i in range(3)]
+            response = await client.post("/events/bulk", data=json.dumps(donations))
+            await response.read()
+            frames = [await ws.receive_json(timeout=2) for _ in range(2)]
+            await ws.close()
+            return frames
+        finally:
+            await client.close()
+
+    batch, single = run(scenario())
+    assert batch["type"] == "batch" and [event["user"] for event in batch["events"]] == ["u0", "u1"]
+    assert single["type"] == "donation" and single["user"] == "u2"
+
+
+# ==========================================
+# NDJSON
+# ==========================================
+def test_ndjson_streams_results_and_a_summary(run, app_factory, monkeypatch):
+    monkeypatch.setattr(donation_api, "BULK_CHUNK_SIZE", 2)
+    body = ndjson(walkers(2)) + b"\n{oops\n" + b'{"type": "walker", "user": "' + b"x" * 5000 + b'"}\n'
+    status, response = run(post(app_factory, body, NDJSON))
+    *results, summary = lines(response)
+    assert status == 200
+    assert [(result["index"], result["status"]) for result in results] == [
+        (0, "ok"), (1, "ok"), (2, "error"), (3, "error")
+    ]
+    assert results[2]["message"] == "Invalid JSON"
+    assert results[3]["message"] == f"Event exceeds {donation_api.MAX_EVENT_BODY} bytes"
+    assert summary == {"status": "done", "accepted": 2, "rejected": 2}
@@ -0,0 +1,99 @@
+# tests/test_client_writer.py
+"""Tarea escritora por cliente: colas de salida, fallos de envío y cierre"""
+import asyncio
+import json
+
+import pytest
+from aiohttp import WSMsgType
+
+from backend import event_dispatcher
+from backend import wire
+
+
+def _message(n):
+    return json.dumps({"type": "promo", "n": n})
+
+
+async def _connect(app_factory, path="/ws", **kwargs):
+    client = await app_factory()
+    ws = await client.ws_connect(path, **kwargs)
+    await ws.receive_json(timeout=2)
+    return client, ws
+
+
+# ==========================================
+# FALLOS DE ENVÍO
+# ==========================================
+def test_send_failure_closes_the_socket(run, app_factory, monkeypatch):
+    real_as_text = wire.as_text
+
+    def failing_as_text(message):
+        text = real_as_text(message)
+        if "boom" in text:
+            raise RuntimeError("fallo de envío")
+        return text
+
+    monkeypatch.setattr(wire, "as_text", failing_as_text)
+
+    async def scenario():
+        client, ws = await _connect(app_factory)
+        try:
+            await event_dispatcher.broadcast({"type": "promo", "x": "boom"})
+            message = await ws.receive(timeout=2)
+            return message.type, ws.close_code, len(event_dispatcher.connected_clients)
+        finally:
+            await client.close()
+
+    assert run(scenario()) == (WSMsgType.CLOSE, event_dispatcher.CLOSE_INTERNAL_ERROR, 0)
+
+
+# ==========================================
+# CLIENTES LENTOS
+# ==========================================
+@pytest.mark.parametrize("policy, kept, accepted", [
+    ("drop_oldest", [2, 3, 4], [True] * 5),
+    ("drop_newest", [0, 1, 2], [True, True, True, False, False]),
+])
+def test_full_queue_drops_by_policy(run, fake_clients, monkeypatch, policy, kept, accepted):
+    monkeypatch.setattr(event_dispatcher, "SEND_QUEUE_SIZE", 3)
+    monkeypatch.setattr(event_dispatcher, "SLOW_CLIENT_POLICY", policy)
+
+    async def scenario():
+        ws = await fake_clients(open_gate=False)
+        results = [event_dispatcher._enqueue(ws, _message(n)) for n in range(5)]
+        dropped = event_dispatcher.get_client(ws).dropped
+        sent = [message["n"] for message in await ws.settle()]
+        return results, dropped, sent, event_dispatcher.backpressure_stats["queued_messages"]
+
+    results, dropped, sent, queued = run(scenario())
+    assert results == accepted and dropped == 2
+    assert sent == kept
+    assert queued == 0
+
+
+def test_disconnect_policy_closes_the_slow_client(run, fake_clients, monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "SEND_QUEUE_SIZE", 3)
+    monkeypatch.setattr(event_dispatcher, "SLOW_CLIENT_POLICY", "disconnect")
+
+    async def scenario():
+        ws = await fake_clients(open_gate=False)
+        results = [event_dispatcher._enqueue(ws, _message(n)) for n in range(4)]
+        await asyncio.sleep(0)
+        return results, ws.close_code, event_dispatcher.get_client(ws)
+
+    results, close_code, record = run(scenario())
+    assert results == [True, True, True, False]
+    assert close_code == 1008 and record is None
+
+
+def test_slow_client_does_not_delay_the_others(run, fake_clients):
+    async def scenario():
+        slow = await fake_clients(open_gate=False)
+        fast = await fake_clients()
+        stats = event_dispatcher.deliver_local({"type": "promo", "n": 1})
+        await asyncio.sleep(0)
+        return stats, slow.messages(), [message["n"] for message in fast.messages()]
+
+    stats, slow_sent, fast_sent = run(scenario())
+    assert stats["success"] == 2
+    assert slow_sent == [] and fast_sent == [1]
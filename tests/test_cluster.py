@@ -0,0 +1,239 @@
+# tests/test_cluster.py
+"""Protocolo de líneas entre workers y broker (sobre un socket unix real)"""
+import asyncio
+import json
+
+import pytest
+
+from backend import cluster
+from backend import event_dispatcher
+from backend import idempotency
+from backend import metrics
+
+
+class Worker:
+    """Worker falso: habla el protocolo del broker a mano"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def send(self, line: bytes):
+        self.writer.write(line + b"\n")
+        await self.writer.drain()
+
+    async def receive(self) -> bytes:
+        return (await asyncio.wait_for(self.reader.readline(), 2))[:-1]
+
+    async def nothing(self):
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(self.reader.readline(), 0.1)
+
+
+@pytest.fixture
+def cluster_run(tmp_path, run):
+    """Corre `scenario(broker, connect)` con un broker escuchando en tmp_path"""
+    path = str(tmp_path / "broker.sock")
+
+    def start(scenario):
+        async def main():
+            broker = cluster.Broker()
+            server = await asyncio.start_unix_server(broker.handle_worker, path)
+            workers = []
+
+            async def connect(worker_id: int) -> Worker:
+                reader, writer = await asyncio.open_unix_connection(path)
+                worker = Worker(reader, writer)
+                await worker.send(b"H%d" % worker_id)
+                # Un reclamo de ida y vuelta: el broker ya registró al worker
+                await worker.send(b'I0 ["hello-%d"]' % worker_id)
+                await worker.receive()
+                workers.append(worker)
+                return worker
+
+            try:
+                return await scenario(broker, connect)
+            finally:
+                for worker in workers:
+                    worker.writer.close()
+                server.close()
+                await server.wait_closed()
+
+        return run(main())
+
+    return start
+
+
+# ==========================================
+# EVENTOS
+# ==========================================
+def test_events_are_numbered_per_room(cluster_run):
+    async def scenario(broker, connect):
+        first, second = await connect(0), await connect(1)
+        await first.send(b'E{"a": 1}')
+        await first.send(b'E@sala2 {"b": 2}')
+        await first.send(b'B3 [{"c": 3}, {"d": 4}, {"e": 5}]')
+        await first.send(b'E{"f": 6}')
+        return [await first.receive() for _ in range(4)], [await second.receive() for _ in range(4)]
+
+    seen_first, seen_second = cluster_run(scenario)
+    assert seen_first == seen_second == [
+        b'E1 {"a": 1}',
+        b'E@sala2 1 {"b": 2}',
+        b'B2 [{"c": 3}, {"d": 4}, {"e": 5}]',
+        b'E5 {"f": 6}',
+    ]
+
+
+def test_room_sequences_are_bounded_and_never_go_back(monkeypatch):
+    monkeypatch.setattr(cluster, "MAX_ROOM_SEQS", 2)
+    broker = cluster.Broker()
+    sent = []
+    broker._send_all = sent.append
+
+    broker._forward(b'E@a {"n": 1}\n')
+    broker._forward_batch(b'B@a 5 []\n')
+    broker._forward(b'E@b {"n": 2}\n')
+    broker._forward(b'E@a {"n": 3}\n')
+    # "b" es la menos reciente: se olvida al entrar "c"
+    broker._forward(b'E@c {"n": 4}\n')
+    assert list(broker.seqs) == [b"@a ", b"@c "]
+    # "b" vuelve por encima de todo lo emitido para las salas olvidadas
+    broker._forward(b'E@b {"n": 5}\n')
+    assert list(broker.seqs) == [b"@c ", b"@b "]
+
+    assert [line.split(b" {")[0] for line in sent] == [
+        b"E@a 1", b"B@a 2 []\n", b"E@b 1", b"E@a 7", b"E@c 1", b"E@b 2",
+    ]
+    # Al olvidar "a" (7), la próxima sala nueva empieza en 8
+    broker._forward(b'E@d {"n": 6}\n')
+    assert sent[-1].startswith(b"E@d 8 ")
+
+
+@pytest.mark.parametrize("body, expected", [
+    (b'3 {"a": 1}', (None, b'3 {"a": 1}')),
+    (b'@sala2 3 {"a": 1}', ("sala2", b'3 {"a": 1}')),
+])
+def test_split_room(body, expected):
+    assert cluster._split_room(body) == expected
+
+
+# ==========================================
+# IDEMPOTENCY-KEYS
+# ==========================================
+RESULT = {"status": 200, "content_type": "application/json", "body": "e30="}
+
+
+def test_second_worker_gets_the_owner_result(cluster_run):
+    async def scenario(broker, connect):
+        owner, other = await connect(0), await connect(1)
+        await owner.send(b'I1 ["/r", "ip", "k"]')
+        claimed = await owner.receive()
+        await other.send(b'I5 ["/r", "ip", "k"]')
+        await other.nothing()
+        await owner.send(b"R" + json.dumps({"key": ["/r", "ip", "k"], "result": RESULT}).encode())
+        return claimed, await other.receive()
+
+    claimed, replayed = cluster_run(scenario)
+    assert claimed == b'I1 {"owner": true}'
+    assert replayed == b"I5 " + json.dumps(RESULT).encode()
+
+
+def test_disconnected_owner_hands_the_key_over(cluster_run):
+    async def scenario(broker, connect):
+        owner, other = await connect(0), await connect(1)
+        await owner.send(b'I1 ["k"]')
+        await owner.receive()
+        await other.send(b'I2 ["k"]')
+        owner.writer.close()
+        return await other.receive()
+
+    assert cluster_run(scenario) == b'I2 {"owner": true}'
+
+
+def test_resolve_claim_releases_abandoned_ownership():
+    released = []
+
+    async def scenario():
+        future = asyncio.get_running_loop().create_future()
+        future.cancel()
+        claims = {3: (future, ["k"])}
+        cluster._resolve_claim(claims, b'I3 {"owner": true}\n', lambda *args: released.append(args))
+        cluster._resolve_claim(claims, b'I3 {"owner": true}\n', lambda *args: released.append(args))
+        return claims
+
+    assert asyncio.run(scenario()) == {}
+    assert released == [(["k"], None)]
+
+
+# ==========================================
+# ENLACE DEL WORKER
+# ==========================================
+async def _until(condition, timeout: float = 2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condición no alcanzada")
+
+
+@pytest.fixture
+def worker_link(monkeypatch):
+    """Estado global del worker restaurado al terminar"""
+    monkeypatch.setitem(cluster.worker_state, "worker_id", None)
+    monkeypatch.setitem(cluster.worker_state, "workers", {})
+    monkeypatch.setitem(cluster.worker_state, "message_errors", 0)
+    monkeypatch.setitem(cluster.worker_state, "reconnects", 0)
+    monkeypatch.setattr(metrics.registry, "constant_labels", {})
+    monkeypatch.setattr(cluster, "RECONNECT_DELAY", 0.01)
+    yield
+    event_dispatcher.set_publisher(None)
+    idempotency.set_coordinator(None)
+    event_dispatcher.rooms.pop("tcl", None)
+
+
+def test_bad_broker_message_does_not_drop_the_link(tmp_path, worker_link):
+    path = str(tmp_path / "broker.sock")
+
+    async def scenario():
+        broker = cluster.Broker()
+        server = await asyncio.start_unix_server(broker.handle_worker, path)
+        task = await cluster.join_cluster(3, path)
+        try:
+            await _until(lambda: "3" in broker.writers)
+            broker.writers["3"].write(b"E@tcl x {}\n")
+            broker.writers["3"].write(b'E@tcl 5 {"type": "walker"}\n')
+            await _until(lambda: "tcl" in event_dispatcher.rooms)
+            return event_dispatcher.rooms["tcl"].last_seq, task.done()
+        finally:
+            task.cancel()
+            server.close()
+
+    assert asyncio.run(scenario()) == (5, False)
+    assert cluster.worker_state["message_errors"] == 1
+
+
+def test_worker_reconnects_after_broker_restart(tmp_path, worker_link):
+    path = str(tmp_path / "broker.sock")
+
+    async def scenario():
+        first = cluster.Broker()
+        server = await asyncio.start_unix_server(first.handle_worker, path)
+        task = await cluster.join_cluster(3, path)
+        try:
+            await _until(lambda: "3" in first.writers)
+            server.close()
+            first.writers["3"].close()
+            await _until(lambda: event_dispatcher._publisher is None)
+
+            second = cluster.Broker()
+            server = await asyncio.start_unix_server(second.handle_worker, path)
+            await _until(lambda: "3" in second.writers)
+            await _until(lambda: event_dispatcher._publisher is not None)
+            return idempotency._coordinator is not None
+        finally:
+            task.cancel()
+            server.close()
+
+    assert asyncio.run(scenario())
+    assert cluster.worker_state["reconnects"] == 1
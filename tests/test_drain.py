@@ -0,0 +1,84 @@
+# tests/test_drain.py
+"""Drenado al apagar: olas de cierres 1012, colas vaciadas y reconexión repartida"""
+import asyncio
+import json
+
+import pytest
+from aiohttp import WSMsgType
+
+from backend import event_dispatcher
+
+
+@pytest.fixture(autouse=True)
+def fresh_drain(monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "draining", False)
+    monkeypatch.setattr(event_dispatcher, "drain_stats", {"closed": 0, "waves": 0, "unflushed": 0})
+    monkeypatch.setattr(event_dispatcher, "DRAIN_WAVE_INTERVAL", 0.001)
+
+
+def test_clients_get_their_queue_then_a_1012_with_a_hint(run, app_factory):
+    async def scenario():
+        client = await app_factory()
+        try:
+            ws = await client.ws_connect("/ws?topics=promo")
+            await ws.receive_json(timeout=2)
+            event_dispatcher.deliver_local({"type": "promo", "n": 1})
+            drain = asyncio.create_task(event_dispatcher.drain())
+            event = await ws.receive_json(timeout=2)
+            close = await ws.receive(timeout=2)
+            stats = await drain
+            rejected = await client.get("/ws")
+            return event, close, dict(stats), rejected.status, rejected.headers.get("Retry-After")
+        finally:
+            await client.close()
+
+    event, close, stats, status, retry_after = run(scenario())
+    assert event["n"] == 1
+    assert close.type == WSMsgType.CLOSE and close.data == event_dispatcher.CLOSE_SERVICE_RESTART
+    hint = json.loads(close.extra)["reconnect_ms"]
+    assert event_dispatcher.RECONNECT_MIN * 1000 <= hint <= event_dispatcher.RECONNECT_MIN * 5 * 1000
+    assert stats == {"closed": 1, "waves": 1, "unflushed": 0}
+    # Apagándose: las conexiones nuevas se rechazan
+    assert (status, retry_after) == (503, "5")
+
+
+def test_closes_go_out_in_waves(run, fake_clients, monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "DRAIN_WAVE_SIZE", 2)
+
+    async def scenario():
+        sockets = [await fake_clients() for _ in range(5)]
+        stats = await event_dispatcher.drain()
+        return dict(stats), [ws.close_code for ws in sockets]
+
+    stats, codes = run(scenario())
+    assert stats == {"closed": 5, "waves": 3, "unflushed": 0}
+    assert codes == [event_dispatcher.CLOSE_SERVICE_RESTART] * 5
+
+
+def test_stuck_client_is_closed_after_the_flush_timeout(run, fake_clients, monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "DRAIN_FLUSH_TIMEOUT", 0.05)
+
+    async def scenario():
+        ws = await fake_clients(open_gate=False)
+        event_dispatcher._enqueue(ws, '{"type": "promo"}')
+        stats = await event_dispatcher.drain()
+        return dict(stats), ws.close_code
+
+    stats, code = run(scenario())
+    assert stats["unflushed"] == 1 and stats["closed"] == 1
+    assert code == event_dispatcher.CLOSE_SERVICE_RESTART
+
+
+def test_pending_batch_is_sent_before_closing(run, fake_clients, monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "BATCH_ENABLED", True)
+    monkeypatch.setattr(event_dispatcher, "BATCH_WINDOW_MS", 60_000)
+
+    async def scenario():
+        ws = await fake_clients()
+        event_dispatcher.deliver_local({"type": "promo", "n": 1})
+        await event_dispatcher.drain()
+        return ws.messages(), ws.close_code
+
+    messages, code = run(scenario())
+    assert [message["n"] for message in messages] == [1]
+    assert code == event_dispatcher.CLOSE_SERVICE_RESTART
@@ -0,0 +1,129 @@
+# tests/test_event_ledger.py
+"""Ledger: group commit, segmentos y recuperación tras un crash"""
+import os
+
+from backend import event_ledger
+from backend.event_ledger import INDEX_ENTRY, EventLedger
+
+
+def write(directory, events) -> EventLedger:
+    """Abre el ledger, encola `events` y lo cierra (todo confirmado)"""
+    ledger = EventLedger(str(directory))
+    ledger.open()
+    for event in events:
+        ledger.append(event)
+    ledger.close()
+    return ledger
+
+
+def reopen(directory) -> EventLedger:
+    ledger = EventLedger(str(directory))
+    ledger.open()
+    ledger.close()
+    return ledger
+
+
+def events(count, start=0):
+    return [{"type": "walker", "user": f"u{i}"} for i in range(start, start + count)]
+
+
+def only_segment(directory):
+    log_path, = sorted(str(path) for path in directory.glob("segment-*.log"))
+    return log_path, log_path[:-4] + ".idx"
+
+
+# ==========================================
+# ESCRITURA Y LECTURA
+# ==========================================
+def test_events_survive_a_restart_in_order(tmp_path):
+    write(tmp_path, events(5))
+    ledger = reopen(tmp_path)
+    assert ledger.total_events == 5 and ledger.next_id == 6
+    assert list(ledger.replay()) == events(5)
+    assert list(ledger.replay(since_id=3)) == events(2, start=3)
+
+
+def test_rotation_and_replay_across_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_ledger, "SEGMENT_MAX_BYTES", 1)
+    monkeypatch.setattr(event_ledger, "MAX_BATCH", 1)
+    write(tmp_path, events(4))
+    ledger = reopen(tmp_path)
+    assert len(ledger.segments) == 4
+    assert list(ledger.replay()) == events(4)
+    assert list(ledger.replay(since_id=2)) == events(2, start=2)
+
+
+# ==========================================
+# RECUPERACIÓN
+# ==========================================
+def test_torn_tail_is_truncated_and_ids_continue(tmp_path):
+    write(tmp_path, events(3))
+    log_path, _ = only_segment(tmp_path)
+    size = os.path.getsize(log_path)
+    with open(log_path, "ab") as f:
+        f.write(b'{"id": 4, "event": {"type": "wal')
+
+    ledger = write(tmp_path, events(1, start=3))
+    assert os.path.getsize(log_path) > size
+    assert list(reopen(tmp_path).replay()) == events(4)
+    assert ledger.next_id == 5
+
+
+def test_lost_index_is_rebuilt_from_the_log(tmp_path):
+    write(tmp_path, events(4))
+    _, idx_path = only_segment(tmp_path)
+    # El índice no se sincroniza: tras un crash puede faltar su cola
+    with open(idx_path, "r+b") as f:
+        f.truncate(INDEX_ENTRY.size + 3)
+    ledger = reopen(tmp_path)
+    assert ledger.total_events == 4
+    assert os.path.getsize(idx_path) == 4 * INDEX_ENTRY.size
+    assert list(ledger.replay(since_id=2)) == events(2, start=2)
+
+
+def test_index_entries_past_the_log_are_dropped(tmp_path):
+    write(tmp_path, events(3))
+    log_path, idx_path = only_segment(tmp_path)
+    with open(idx_path, "rb") as f:
+        _, first_end = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+    with open(log_path, "r+b") as f:
+        f.truncate(first_end)
+    ledger = reopen(tmp_path)
+    assert ledger.total_events == 1
+    assert list(ledger.replay()) == events(1)
+
+
+def test_failed_commit_leaves_no_partial_records(tmp_path, monkeypatch):
+    failures = iter([True])
+    real_fsync = os.fsync
+
+    def flaky_fsync(fd):
+        if next(failures, False):
+            raise OSError("disco lleno")
+        real_fsync(fd)
+
+    monkeypatch.setattr(event_ledger.os, "fsync", flaky_fsync)
+    ledger = EventLedger(str(tmp_path))
+    ledger.open()
+    ledger.append({"type": "walker", "user": "lost"})
+    ledger.close()
+    assert ledger.stats["dropped"] == 1
+
+    ledger = write(tmp_path, events(2))
+    assert ledger.stats["committed"] == 2
+    reopened = reopen(tmp_path)
+    assert list(reopened.replay()) == events(2)
+    assert list(reopened.replay(since_id=1)) == events(1, start=1)
+
+
+def test_other_workers_ledgers_are_read_without_repair(tmp_path, monkeypatch):
+    worker = tmp_path / "worker-1"
+    write(worker, events(2))
+    log_path, _ = only_segment(worker)
+    with open(log_path, "ab") as f:
+        f.write(b'{"id": 3, "ev')
+    size = os.path.getsize(log_path)
+
+    monkeypatch.setattr(event_ledger, "ledger", None)
+    assert list(event_ledger.replay_all(str(tmp_path))) == events(2)
+    assert os.path.getsize(log_path) == size
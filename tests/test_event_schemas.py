@@ -0,0 +1,262 @@
+# tests/test_event_schemas.py
+"""Registro de esquemas compilados y validación de eventos de ingesta"""
+import math
+
+import pytest
+
+from backend import event_schemas
+from backend.event_schemas import Field, validate_event
+
+
+# ==========================================
+# CAMPOS AUSENTES Y NULL
+# ==========================================
+@pytest.mark.parametrize("data", [
+    {"type": "walker"},
+    {"type": "walker", "user": None},
+])
+def test_walker_user_missing_or_null_uses_default(data):
+    ok, error, event = validate_event(data)
+    assert ok, error
+    assert event["user"] == "Anónimo"
+
+
+@pytest.mark.parametrize("data", [
+    {"type": "donation", "amount": 5},
+    {"type": "donation", "amount": 5, "user": None, "message": None},
+])
+def test_donation_optional_fields_missing_or_null_use_defaults(data):
+    ok, error, event = validate_event(data)
+    assert ok, error
+    assert event["user"] == "Anónimo"
+    assert event["message"] == ""
+    assert list(event) == ["type", "user", "amount", "message", "timestamp"]
+
+
+@pytest.mark.parametrize("amount", [None, "abc", True, [], float("nan"), "inf", "-inf", 10 ** 400, -10 ** 400])
+def test_donation_amount_not_a_number(amount):
+    data = {"type": "donation", "user": "u"}
+    if amount is not None:
+        data["amount"] = amount
+    assert validate_event(data) == (False, "Amount must be a number", {})
+    assert validate_event({**data, "amount": amount}) == (False, "Amount must be a number", {})
+
+
+# ==========================================
+# RANGOS Y SANITIZACIÓN
+# ==========================================
+@pytest.mark.parametrize("amount, message", [
+    (0, "Amount must be positive"),
+    (-5, "Amount must be positive"),
+    (10000.01, "Amount exceeds maximum ($10000)"),
+])
+def test_donation_amount_out_of_range(amount, message):
+    assert validate_event({"type": "donation", "amount": amount}) == (False, message, {})
+
+
+@pytest.mark.parametrize("amount, expected", [
+    (25, 25.0), ("25", 25.0), (12.345, 12.35), ("0.5", 0.5), (10000, 10000.0),
+])
+def test_donation_amount_converted_and_rounded(amount, expected):
+    ok, _, event = validate_event({"type": "donation", "amount": amount})
+    assert ok
+    assert event["amount"] == expected and isinstance(event["amount"], float)
+
+
+def test_strings_converted_and_truncated():
+    ok, _, event = validate_event({
+        "type": "donation", "amount": 1,
+        "user": 12345, "message": "x" * 1000
+    })
+    assert ok
+    assert event["user"] == "12345"
+    assert len(event["message"]) == event_schemas.MAX_MESSAGE_LENGTH
+
+
+def test_only_whitelisted_fields():
+    ok, _, event = validate_event({"type": "walker", "user": "u", "html": "<script>", "seq": 99})
+    assert ok
+    assert set(event) == {"type", "user", "timestamp"}
+
+
+def test_missing_type_defaults_to_donation():
+    ok, _, event = validate_event({"amount": 3})
+    assert ok and event["type"] == "donation"
+
+
+@pytest.mark.parametrize("data, message", [
+    ([], "Invalid data format"),
+    ("walker", "Invalid data format"),
+    ({"type": 5}, "Event type must be a string"),
+    ({"type": ""}, "Event type must be a string"),
+    ({"type": "no spaces"}, "Invalid event type"),
+    ({"type": "world_delta"}, "Event type 'world_delta' is reserved"),
+])
+def test_invalid_envelopes(data, message):
+    assert validate_event(data) == (False, message, {})
+
+
+# ==========================================
+# EVENTOS PERSONALIZADOS
+# ==========================================
+def test_custom_event_copies_bounded_scalars():
+    ok, _, event = validate_event({"type": "confetti", "color": "r" * 500, "count": 3, "on": True, "x": None})
+    assert ok
+    assert event["type"] == "confetti"
+    assert event["data"] == {
+        "color": "r" * event_schemas.MAX_CUSTOM_STRING_LENGTH, "count": 3, "on": True, "x": None
+    }
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"type": "c", "nested": {"a": 1}}, "Field nested must be a scalar"),
+    ({"type": "c", "n": math.inf}, "Field n must be a finite number"),
+    ({"type": "c", "k" * 51: 1}, "Invalid field name"),
+    ({"type": "c", "n": 10 ** 20}, "Field n must be a 64-bit integer"),
+    ({"type": "c", "n": -2 ** 63 - 1}, "Field n must be a 64-bit integer"),
+])
+def test_custom_event_rejections(data, message):
+    assert validate_event(data) == (False, message, {})
+
+
+def test_custom_event_int_limits():
+    ok, _, event = validate_event({"type": "c", "big": 2 ** 64 - 1, "small": -2 ** 63})
+    assert ok
+    assert event["data"] == {"big": 2 ** 64 - 1, "small": -2 ** 63}
+
+
+def test_custom_event_field_cap():
+    limit = event_schemas.MAX_CUSTOM_FIELDS
+    fields = {f"f{i}": i for i in range(limit)}
+    assert validate_event({"type": "c", **fields})[0]
+    assert validate_event({"type": "c", **fields, "extra": 1}) == (False, f"Too many fields (max {limit})", {})
+
+
+# ==========================================
+# ESQUEMAS REGISTRADOS
+# ==========================================
+@pytest.fixture
+def registered():
+    """Registra tipos de prueba y los quita al terminar"""
+    names = []
+
+    def register(name, fields, hook=None):
+        event_schemas.register_event_type(name, fields, hook)
+        names.append(name)
+
+    yield register
+    for name in names:
+        event_schemas._validators.pop(name, None)
+
+
+def test_optional_field_without_default_is_omitted(registered):
+    registered("poll", {
+        "question": Field("str", required=True, max_length=10),
+        "note": Field("str", max_length=5),
+        "level": Field("number", minimum=1),
+    })
+    ok, _, event = validate_event({"type": "poll", "question": "¿Sí?", "note": None})
+    assert ok
+    assert "note" not in event and "level" not in event
+
+    ok, _, event = validate_event({"type": "poll", "question": "q", "note": 123456, "level": "2"})
+    assert ok
+    assert event["note"] == "12345" and event["level"] == 2.0
+
+    assert validate_event({"type": "poll"}) == (False, "Question is required", {})
+    assert validate_event({"type": "poll", "question": None}) == (False, "Question is required", {})
+    assert validate_event({"type": "poll", "question": "q", "level": 0}) == \
+        (False, "Level below minimum (1)", {})
+    assert validate_event({"type": "poll", "question": "q", "level": math.inf}) == \
+        (False, "Level must be a number", {})
+
+
+def test_hook_can_reject_or_complete(registered):
+    def hook(data, out):
+        if out["user"] == "banned":
+            return "User is banned"
+        out["vip"] = True
+        return None
+
+    registered("cheer", {"user": Field("str", default="x", max_length=10)}, hook)
+    assert validate_event({"type": "cheer", "user": "banned"}) == (False, "User is banned", {})
+    ok, _, event = validate_event({"type": "cheer"})
+    assert ok and event["vip"] is True and "timestamp" in event
+
+
+def test_reserved_types_cannot_be_registered():
+    with pytest.raises(ValueError):
+        event_schemas.register_event_type("batch", {})
+
+
+# ==========================================
+# HTTP
+# ==========================================
+@pytest.mark.parametrize("body", [
+    {"type": "walker", "user": None},
+    {"type": "donation", "user": None, "amount": 5},
+    {"type": "donation", "amount": 5},
+])
+def test_simulate_donation_accepts_null_and_missing_user(run, app_factory, body):
+    async def scenario():
+        client = await app_factory()
+        try:
+            response = await client.post("/simulate_donation", json=body)
+            return response.status, await response.json()
+        finally:
+            await client.close()
+
+    status, payload = run(scenario())
+    assert status == 200, payload
+    assert payload["event"]["user"] == "Anónimo"
+
+
+def test_simulate_donation_rejects_oversized_body(run, app_factory):
+    async def scenario():
+        client = await app_factory()
+        try:
+            body = b'{"type": "walker", "user": "' + b"x" * event_schemas.MAX_EVENT_BODY + b'"}'
+            response = await client.post("/simulate_donation", data=body,
+                                         headers={"Content-Type": "application/json"})
+            return response.status
+        finally:
+            await client.close()
+
+    assert run(scenario()) == 413
+
+
+def test_simulate_donation_rejects_ints_msgpack_cannot_encode(run, app_factory):
+    async def scenario():
+        client = await app_factory()
+        try:
+            response = await client.post(
+                "/simulate_donation", data=b'{"type": "promo", "x": 100000000000000000000}',
+                headers={"Content-Type": "application/json"}
+            )
+            return response.status, await response.json()
+        finally:
+            await client.close()
+
+    assert run(scenario()) == (400, {"status": "error", "message": "Field x must be a 64-bit integer"})
+
+
+@pytest.mark.parametrize("path, body, expected", [
+    ("/simulate_donation", b'{"type": "donation", "amount": 1' + b"0" * 400 + b"}", 400),
+    ("/events/bulk", b'[{"type": "donation", "amount": 1' + b"0" * 400 + b'}, {"type": "walker"}]', 200),
+])
+def test_huge_json_amount_is_a_validation_error(run, app_factory, path, body, expected):
+    async def scenario():
+        client = await app_factory()
+        try:
+            response = await client.post(path, data=body, headers={"Content-Type": "application/json"})
+            return response.status, await response.json()
+        finally:
+            await client.close()
+
+    status, payload = run(scenario())
+    assert status == expected
+    if path == "/events/bulk":
+        assert payload["results"][0] == {"index": 0, "status": "error", "message": "Amount must be a number"}
+        assert payload["results"][1]["status"] == "ok"
+    else:
+        assert payload["message"] == "Amount must be a number"
@@ -0,0 +1,276 @@
+# tests/test_idempotency.py
+"""Idempotency-Key: repetición, espera de la original en curso y coordinación entre workers"""
+import asyncio
+import base64
+import time
+import uuid
+from collections import OrderedDict
+
+import pytest
+
+from backend import donation_api
+from backend import event_dispatcher
+from backend import idempotency
+from backend.cluster import SharedKeys
+
+DONATION = {"type": "donation", "user": "u", "amount": 5}
+
+
+@pytest.fixture
+def key():
+    return uuid.uuid4().hex
+
+
+@pytest.fixture(autouse=True)
+def no_coordinator():
+    idempotency.set_coordinator(None)
+    yield
+    idempotency.set_coordinator(None)
+
+
+async def _with_client(app_factory, scenario):
+    client = await app_factory()
+    try:
+        return await scenario(client)
+    finally:
+        await client.close()
+
+
+# ==========================================
+# UN PROCESO
+# ==========================================
+def test_repeat_is_replayed_without_reprocessing(run, app_factory, key):
+    async def scenario(client):
+        before = event_dispatcher.default_room.last_seq
+        first = await client.post("/simulate_donation", json=DONATION, headers={"Idempotency-Key": key})
+        second = await client.post("/simulate_donation", json=DONATION, headers={"Idempotency-Key": key})
+        other = await client.post("/simulate_donation", json=DONATION,
+                                  headers={"Idempotency-Key": key + "-other"})
+        return (first.status, await first.read(), first.headers.get(idempotency.REPLAYED_HEADER),
+                second.status, await second.read(), second.headers.get(idempotency.REPLAYED_HEADER),
+                other.status, event_dispatcher.default_room.last_seq - before)
+
+    status1, body1, replayed1, status2, body2, replayed2, status3, broadcasts = run(_with_client(app_factory, scenario))
+    assert status1 == status2 == status3 == 200
+    assert body1 == body2
+    assert replayed1 is None and replayed2 == "true"
+    assert broadcasts == 2
+
+
+def test_validation_errors_are_replayed_too(run, app_factory, key):
+    async def scenario(client):
+        responses = [
+            await client.post("/simulate_donation", json={"amount": -1}, headers={"Idempotency-Key": key})
+            for _ in range(2)
+        ]
+        return [(r.status, r.headers.get(idempotency.REPLAYED_HEADER)) for r in responses]
+
+    assert run(_with_client(app_factory, scenario)) == [(400, None), (400, "true")]
+
+
+def test_concurrent_duplicates_wait_for_the_original(run, app_factory, key, monkeypatch):
+    calls = []
+    original = donation_api.ingest_event
+
+    async def slow_ingest(*args):
+        calls.append(args)
+        await asyncio.sleep(0.05)
+        return await original(*args)
+
+    monkeypatch.setattr(donation_api, "ingest_event", slow_ingest)
+
+    async def scenario(client):
+        waits = idempotency.idempotency_stats["inflight_waits"]
+        responses = await asyncio.gather(*(
+            client.post("/simulate_donation", json={"type": "walker", "user": "z"},
+                        headers={"Idempotency-Key": key})
+            for _ in range(3)
+        ))
+        bodies = {await r.read() for r in responses}
+        return [r.status for r in responses], len(bodies), idempotency.idempotency_stats["inflight_waits"] - waits
+
+    statuses, distinct_bodies, waits = run(_with_client(app_factory, scenario))
+    assert statuses == [200, 200, 200]
+    assert distinct_bodies == 1
+    assert waits == 2
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("bad_key", ["", "x" * (idempotency.MAX_KEY_LENGTH + 1)])
+def test_invalid_keys_are_rejected(run, app_factory, bad_key):
+    async def scenario(client):
+        response = await client.post("/simulate_donation", json=DONATION,
+                                     headers={"Idempotency-Key": bad_key})
+        return response.status
+
+    assert run(_with_client(app_factory, scenario)) == 400
+
+
+def test_streamed_request_cannot_be_repeated(run, app_factory, key):
+    async def scenario(client):
+        headers = {"Idempotency-Key": key, "Content-Type": "application/x-ndjson"}
+        body = b'{"type": "walker", "user": "a"}\n'
+        first = await client.post("/events/bulk", data=body, headers=headers)
+        await first.read()
+        second = await client.post("/events/bulk", data=body, headers=headers)
+        return first.status, second.status
+
+    assert run(_with_client(app_factory, scenario)) == (200, 409)
+
+
+def test_inflight_entries_do_not_stop_eviction(run, monkeypatch):
+    monkeypatch.setattr(idempotency, "MAX_ENTRIES", 3)
+    monkeypatch.setattr(idempotency, "_cache", OrderedDict())
+    monkeypatch.setattr(idempotency, "cached_bytes", 0)
+
+    def add(name, done):
+        entry = idempotency._Entry(time.monotonic() + idempotency.TTL)
+        if done:
+            entry.done.set_result(True)
+        idempotency._cache[name] = entry
+        idempotency.cached_bytes += entry.size
+        idempotency._evict(time.monotonic())
+
+    async def scenario():
+        # Dos requests en curso en el extremo LRU no frenan la expulsión
+        add("a", done=False)
+        add("b", done=False)
+        for index in range(10):
+            add(f"k{index}", done=True)
+        return list(idempotency._cache), idempotency.cached_bytes
+
+    names, cached = run(scenario())
+    assert names == ["a", "b", "k9"]
+    assert cached == 3 * idempotency.ENTRY_OVERHEAD
+
+
+# ==========================================
+# COORDINADOR (MODO CLUSTER)
+# ==========================================
+def test_result_from_another_worker_is_replayed(run, app_factory, key, monkeypatch):
+    processed = []
+    monkeypatch.setattr(donation_api, "ingest_event",
+                        lambda *args: processed.append(args))
+    shared_body = b'{"status": "ok", "event": {"from": "worker-1"}}'
+
+    async def claim(shared_key):
+        return {"status": 200, "content_type": "application/json",
+                "body": base64.b64encode(shared_body).decode()}
+
+    idempotency.set_coordinator(claim, lambda *args: None)
+
+    async def scenario(client):
+        response = await client.post("/simulate_donation", json=DONATION, headers={"Idempotency-Key": key})
+        return response.status, await response.read(), response.headers.get(idempotency.REPLAYED_HEADER)
+
+    assert run(_with_client(app_factory, scenario)) == (200, shared_body, "true")
+    assert processed == []
+
+
+def test_owner_publishes_its_result(run, app_factory, key):
+    released = []
+
+    async def claim(shared_key):
+        return {"owner": True}
+
+    idempotency.set_coordinator(claim, lambda shared_key, result: released.append((shared_key, result)))
+
+    async def scenario(client):
+        response = await client.post("/simulate_donation", json=DONATION, headers={"Idempotency-Key": key})
+        return await response.read()
+
+    body = run(_with_client(app_factory, scenario))
+    (shared_key, result), = released
+    assert shared_key == ["/simulate_donation", "127.0.0.1", key]
+    assert result["status"] == 200
+    assert base64.b64decode(result["body"]) == body
+
+
+def test_broker_failure_falls_back_to_local_processing(run, app_factory, key):
+    async def claim(shared_key):
+        raise ConnectionError("broker desconectado")
+
+    idempotency.set_coordinator(claim, lambda *args: None)
+
+    async def scenario(client):
+        response = await client.post("/simulate_donation", json=DONATION, headers={"Idempotency-Key": key})
+        return response.status
+
+    assert run(_with_client(app_factory, scenario)) == 200
+
+
+# ==========================================
+# CLAVES COMPARTIDAS (BROKER)
+# ==========================================
+@pytest.fixture
+def shared():
+    replies = []
+    return SharedKeys(lambda worker_id, request_id, reply: replies.append((worker_id, request_id, reply))), replies
+
+
+RESULT = {"status": 200, "content_type": "application/json", "body": "e30="}
+
+
+def test_first_claim_owns_and_waiters_get_the_result(shared):
+    keys, replies = shared
+    keys.claim("0", 1, b'["k"]')
+    keys.claim("1", 7, b'["k"]')
+    keys.claim("2", 9, b'["k"]')
+    assert replies == [("0", 1, {"owner": True})]
+
+    keys.release("0", b'["k"]', RESULT)
+    assert replies[1:] == [("1", 7, RESULT), ("2", 9, RESULT)]
+
+    keys.claim("3", 1, b'["k"]')
+    assert replies[-1] == ("3", 1, RESULT)
+
+
+def test_release_without_result_hands_the_key_to_the_next_waiter(shared):
+    keys, replies = shared
+    keys.claim("0", 1, b'["k"]')
+    keys.claim("1", 2, b'["k"]')
+    keys.release("0", b'["k"]', None)
+    assert replies[-1] == ("1", 2, {"owner": True})
+
+    # Solo el dueño actual puede liberar
+    keys.release("0", b'["k"]', RESULT)
+    assert len(replies) == 2
+    keys.release("1", b'["k"]', None)
+    assert b'["k"]' not in keys.entries
+
+
+def test_disconnected_owner_releases_its_keys(shared):
+    keys, replies = shared
+    keys.claim("0", 1, b'["a"]')
+    keys.claim("1", 2, b'["a"]')
+    keys.claim("1", 3, b'["b"]')
+    keys.claim("0", 4, b'["b"]')
+    keys.forget_worker("0")
+    assert ("1", 2, {"owner": True}) in replies
+    # El worker 0 esperaba "b": ya no recibe nada
+    keys.release("1", b'["b"]', RESULT)
+    assert all(reply[0] != "0" or reply[1] == 1 for reply in replies)
+
+
+def test_shared_keys_are_bounded(shared, monkeypatch):
+    keys, _ = shared
+    monkeypatch.setattr(idempotency, "MAX_ENTRIES", 3)
+    for index in range(10):
+        key = f'["k{index}"]'.encode()
+        keys.claim("0", index, key)
+        keys.release("0", key, RESULT)
+    assert len(keys.entries) == 3
+    assert keys.bytes == 3 * len(RESULT["body"])
+
+
+def test_inflight_shared_keys_do_not_stop_eviction(shared, monkeypatch):
+    keys, _ = shared
+    monkeypatch.setattr(idempotency, "MAX_ENTRIES", 3)
+    keys.claim("0", 0, b'["a"]')
+    keys.claim("1", 1, b'["b"]')
+    for index in range(10):
+        key = f'["k{index}"]'.encode()
+        keys.claim("0", index, key)
+        keys.release("0", key, RESULT)
+    assert list(keys.entries) == [b'["a"]', b'["b"]', b'["k9"]']
+    assert keys.bytes == len(RESULT["body"])
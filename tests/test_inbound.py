@@ -0,0 +1,81 @@
+# tests/test_inbound.py
+"""Mensajes entrantes por WebSocket: registro de handlers, límites y cierre por abuso"""
+from aiohttp import WSMsgType
+
+from backend import event_dispatcher
+
+
+async def _session(app_factory, messages, replies):
+    """Envía `messages` y lee hasta `replies` respuestas (o el cierre)"""
+    client = await app_factory()
+    try:
+        ws = await client.ws_connect("/ws?topics=none")
+        await ws.receive_json(timeout=2)
+        for message in messages:
+            if isinstance(message, str):
+                await ws.send_str(message)
+            else:
+                await ws.send_json(message)
+        received = []
+        for _ in range(replies):
+            msg = await ws.receive(timeout=2)
+            if msg.type != WSMsgType.TEXT:
+                break
+            received.append(msg.json())
+        await ws.close()
+        return received, ws.close_code
+    finally:
+        await client.close()
+
+
+def test_registered_handler_receives_the_message(run, app_factory, monkeypatch):
+    async def echo(record, data):
+        await event_dispatcher.broadcast_to_client(record.ws, {"type": "echo", "n": data["n"], "id": record.id})
+
+    monkeypatch.setitem(event_dispatcher.message_handlers, "echo", echo)
+    received, _ = run(_session(app_factory, [{"type": "echo", "n": 7}], 1))
+    reply, = received
+    assert reply["type"] == "echo" and reply["n"] == 7 and isinstance(reply["id"], int)
+
+
+def test_bad_messages_get_an_error_reply(run, app_factory):
+    received, _ = run(_session(app_factory, ["{oops", {"type": "nope"}, [1, 2], {"no": "type"}], 4))
+    assert [reply["message"] for reply in received] == [
+        "Invalid JSON", "Unknown message type", "Unknown message type", "Unknown message type"
+    ]
+
+
+def test_actions_go_through_ingest(run, app_factory):
+    action = {"type": "action", "id": "a1", "event": {"type": "donation", "user": "ana", "amount": 5}}
+    invalid = {"type": "action", "id": 2, "event": {"type": "donation", "amount": -1}}
+    received, _ = run(_session(app_factory, [action, invalid], 2))
+    ok, error = received
+    assert (ok["type"], ok["id"], ok["status"]) == ("action_result", "a1", "ok")
+    assert ok["event"]["user"] == "ana"
+    assert (error["id"], error["status"]) == (2, "error")
+
+
+def test_repeated_violations_close_with_1008(run, app_factory, monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "MAX_VIOLATIONS", 2)
+    tolerated, _ = run(_session(app_factory, ["{oops"] * 2, 2))
+    assert [reply["message"] for reply in tolerated] == ["Invalid JSON"] * 2
+    _, close_code = run(_session(app_factory, ["{oops"] * 3, 3))
+    assert close_code == event_dispatcher.CLOSE_POLICY_VIOLATION
+
+
+def test_flooding_is_throttled_then_closed(run, app_factory, monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "INBOUND_RATE", 0.001)
+    monkeypatch.setattr(event_dispatcher, "INBOUND_BURST", 2)
+    monkeypatch.setattr(event_dispatcher, "MAX_VIOLATIONS", 3)
+    rejected = event_dispatcher.inbound_stats["rejected"]
+    received, close_code = run(_session(app_factory, [{"type": "ack", "seq": 0}] * 10, 1))
+    # Los que exceden el límite no se responden: solo cuentan como falta
+    assert received == []
+    assert close_code == event_dispatcher.CLOSE_POLICY_VIOLATION
+    assert event_dispatcher.inbound_stats["rejected"] - rejected == 4
+
+
+def test_oversized_frame_is_closed_by_aiohttp(run, app_factory):
+    big = '{"type": "ack", "pad": "' + "x" * event_dispatcher.MAX_INBOUND_BYTES + '"}'
+    received, close_code = run(_session(app_factory, [big], 1))
+    assert received == [] and close_code == 1009
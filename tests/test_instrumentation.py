@@ -0,0 +1,194 @@
+# tests/test_instrumentation.py
+"""Fases por request, watchdog de bloqueos del loop y profiler por muestreo"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend import instrumentation
+from backend import main
+
+DONATION = {"type": "donation", "user": "ana", "amount": 5}
+ADMIN = {"Authorization": "Bearer s3cret"}
+
+
+@pytest.fixture
+def instrumented(monkeypatch):
+    """Middleware de fases, rutas /debug/* con token y estado limpio"""
+    monkeypatch.setitem(main.CONFIG, "instrument", True)
+    monkeypatch.setattr(instrumentation, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(instrumentation, "slow_callbacks", type(instrumentation.slow_callbacks)(maxlen=5))
+    monkeypatch.setattr(instrumentation, "instrumentation_stats", {
+        "timed_requests": 0, "slow_callbacks": 0, "max_block": 0.0, "profiles": 0
+    })
+
+
+def blocking_call(seconds):
+    """Bloquea el thread del loop (el culpable que debe aparecer en la pila)"""
+    time.sleep(seconds)
+
+
+# ==========================================
+# FASES
+# ==========================================
+def test_phase_is_free_outside_a_timed_request():
+    assert instrumentation.phase("validate") is instrumentation._NULL_PHASE
+
+
+def test_repeated_phases_add_up():
+    timings = {}
+    token = instrumentation._timings.set(timings)
+    try:
+        for _ in range(2):
+            with instrumentation.phase("validate"):
+                time.sleep(0.01)
+    finally:
+        instrumentation._timings.reset(token)
+    assert list(timings) == ["validate"] and timings["validate"] >= 0.02
+
+
+def test_request_phases_reach_server_timing_and_histogram(run, app_factory, instrumented):
+    observed = instrumentation.phase_duration.labels("/simulate_donation", "validate").count
+
+    async def scenario():
+        client = await app_factory()
+        try:
+            response = await client.post("/simulate_donation", json=DONATION)
+            return response.status, response.headers.get("Server-Timing", "")
+        finally:
+            await client.close()
+
+    status, server_timing = run(scenario())
+    assert status == 200
+    assert {entry.split(";")[0] for entry in server_timing.split(", ")} >= {"validate", "broadcast"}
+    assert instrumentation.phase_duration.labels("/simulate_donation", "validate").count == observed + 1
+    assert instrumentation.instrumentation_stats["timed_requests"] == 1
+
+
+def test_phases_are_not_measured_without_the_flag(run, app_factory, monkeypatch):
+    monkeypatch.setitem(main.CONFIG, "instrument", False)
+
+    async def scenario():
+        client = await app_factory()
+        try:
+            response = await client.post("/simulate_donation", json=DONATION)
+            return response.headers.get("Server-Timing")
+        finally:
+            await client.close()
+
+    assert run(scenario()) is None
+
+
+# ==========================================
+# WATCHDOG
+# ==========================================
+def test_watchdog_reports_the_blocking_frame(run, instrumented, monkeypatch):
+    monkeypatch.setattr(instrumentation, "WATCHDOG_INTERVAL", 0.02)
+    monkeypatch.setattr(instrumentation, "SLOW_CALLBACK_THRESHOLD", 0.05)
+
+    async def scenario():
+        instrumentation.start_watchdog()
+        try:
+            await asyncio.sleep(0.05)
+            blocking_call(0.3)
+            # El reporte llega como callback cuando el loop se libera
+            for _ in range(50):
+                await asyncio.sleep(0.02)
+                if instrumentation.slow_callbacks:
+                    break
+        finally:
+            instrumentation.stop_watchdog()
+
+    run(scenario())
+    report = instrumentation.slow_callbacks[0]
+    assert report["duration"] >= 0.2
+    # time.sleep no tiene frame de Python: la hoja es quien bloqueó
+    assert report["stack"][-1].startswith("blocking_call")
+    assert instrumentation.instrumentation_stats["slow_callbacks"] >= 1
+    assert instrumentation.get_stats()["watchdog"] is False
+
+
+def test_watchdog_is_quiet_on_a_healthy_loop(run, instrumented, monkeypatch):
+    monkeypatch.setattr(instrumentation, "WATCHDOG_INTERVAL", 0.02)
+
+    async def scenario():
+        instrumentation.start_watchdog()
+        try:
+            running = instrumentation.get_stats()["watchdog"]
+            await asyncio.sleep(0.2)
+            return running
+        finally:
+            instrumentation.stop_watchdog()
+
+    assert run(scenario()) is True
+    assert list(instrumentation.slow_callbacks) == []
+
+
+# ==========================================
+# PROFILER Y RUTAS DE ADMINISTRACIÓN
+# ==========================================
+def test_sample_stacks_collapses_the_thread_stack():
+    done = threading.Event()
+    worker = threading.Thread(target=done.wait, args=(2,))
+    worker.start()
+    try:
+        samples = instrumentation.sample_stacks(worker.ident, 0.1, 100)
+    finally:
+        done.set()
+        worker.join()
+    assert sum(samples.values()) >= 2
+    assert all(stack.split(";")[-1].startswith("wait") for stack in samples)
+
+
+async def _get_all(app_factory, paths, headers=None):
+    client = await app_factory()
+    try:
+        results = []
+        for path in paths:
+            response = await client.get(path, headers=headers)
+            results.append((response.status, await response.text()))
+        return results
+    finally:
+        await client.close()
+
+
+def test_debug_routes_require_the_admin_token(run, app_factory, instrumented):
+    paths = ["/debug/instrumentation", "/debug/profile?seconds=0.1"]
+    assert [status for status, _ in run(_get_all(app_factory, paths))] == [403, 403]
+    wrong = {"Authorization": "Bearer nope"}
+    assert [status for status, _ in run(_get_all(app_factory, paths, wrong))] == [403, 403]
+
+
+def test_debug_routes_are_not_mounted_without_a_token(run, app_factory, monkeypatch):
+    monkeypatch.setattr(instrumentation, "ADMIN_TOKEN", None)
+    (status, _), = run(_get_all(app_factory, ["/debug/instrumentation"], ADMIN))
+    assert status == 404
+
+
+def test_profile_returns_collapsed_stacks(run, app_factory, instrumented):
+    (status, body), (info_status, info) = run(_get_all(
+        app_factory, ["/debug/profile?seconds=0.2&hz=50", "/debug/instrumentation"], ADMIN
+    ))
+    assert status == 200
+    lines = body.strip().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    # El loop estaba esperando en el selector mientras se muestreaba
+    assert any("run_forever" in line for line in lines)
+    assert info_status == 200 and '"profiles": 1' in info
+
+
+def test_profile_rejects_bad_parameters(run, app_factory, instrumented):
+    paths = [
+        "/debug/profile?seconds=abc",
+        "/debug/profile?seconds=0",
+        f"/debug/profile?seconds={instrumentation.PROFILE_MAX_SECONDS + 1}",
+        f"/debug/profile?seconds=0.1&hz={instrumentation.PROFILE_MAX_HZ + 1}"
+    ]
+    assert [status for status, _ in run(_get_all(app_factory, paths, ADMIN))] == [400] * 4
+
+
+def test_only_one_profile_at_a_time(run, app_factory, instrumented, monkeypatch):
+    monkeypatch.setattr(instrumentation, "_profiling", True)
+    (status, _), = run(_get_all(app_factory, ["/debug/profile?seconds=0.1"], ADMIN))
+    assert status == 409
@@ -0,0 +1,74 @@
+# tests/test_lanes.py
+"""Carriles de prioridad por cliente y fusión de eventos de poco valor"""
+from backend import event_dispatcher
+
+
+def walker(n):
+    return {"type": "walker", "user": f"u{n}"}
+
+
+def test_single_low_event_is_sent_as_is(run, fake_clients):
+    async def scenario():
+        ws = await fake_clients()
+        event_dispatcher.deliver_local(walker(1))
+        return await ws.settle()
+
+    message, = run(scenario())
+    assert message["type"] == "walker" and message["user"] == "u1"
+
+
+def test_high_lane_goes_first(run, fake_clients):
+    async def scenario():
+        ws = await fake_clients(open_gate=False)
+        event_dispatcher.deliver_local(walker(1))
+        event_dispatcher.deliver_local({"type": "donation", "user": "ana", "amount": 5})
+        return await ws.settle()
+
+    assert [message["type"] for message in run(scenario())] == ["donation", "walker"]
+
+
+def test_pending_low_events_are_conflated(run, fake_clients, monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "CONFLATE_MAX_USERS", 3)
+
+    async def scenario():
+        ws = await fake_clients(open_gate=False)
+        for n in range(5):
+            event_dispatcher.deliver_local(walker(n))
+        last_seq = event_dispatcher.default_room.last_seq
+        return await ws.settle(), last_seq, event_dispatcher.get_client(ws).conflated
+
+    (frame,), last_seq, conflated = run(scenario())
+    assert frame == {"type": "walkers", "count": 5, "users": ["u0", "u1", "u2"], "seq": last_seq}
+    assert conflated == 5
+    assert event_dispatcher.backpressure_stats["queued_messages"] == 0
+
+
+def test_full_low_lane_folds_instead_of_growing(run, fake_clients, monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "LOW_LANE_SIZE", 2)
+    folds = event_dispatcher.lane_stats["folds"]
+
+    async def scenario():
+        ws = await fake_clients(open_gate=False)
+        for n in range(6):
+            event_dispatcher.deliver_local(walker(n))
+        depth = len(event_dispatcher.get_client(ws).low)
+        return depth, await ws.settle()
+
+    depth, (frame,) = run(scenario())
+    assert depth == 2
+    assert event_dispatcher.lane_stats["folds"] - folds == 4
+    # Se pierden los frames, no el conteo
+    assert frame["type"] == "walkers" and frame["count"] == 6
+
+
+def test_mixed_batches_split_by_lane(run, fake_clients):
+    async def scenario():
+        ws = await fake_clients(open_gate=False)
+        event_dispatcher.deliver_local_many([
+            walker(1), {"type": "donation", "user": "ana", "amount": 5}, walker(2)
+        ])
+        return await ws.settle()
+
+    high, low = run(scenario())
+    assert high["type"] == "donation"
+    assert low["type"] == "batch" and [event["user"] for event in low["events"]] == ["u1", "u2"]
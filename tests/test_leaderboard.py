@@ -0,0 +1,101 @@
+# tests/test_leaderboard.py
+"""Ranking acotado y deltas del leaderboard"""
+import random
+
+import pytest
+
+from backend import leaderboard
+from backend.rate_limiter import WindowCounter
+
+
+@pytest.fixture(autouse=True)
+def empty_board(monkeypatch):
+    monkeypatch.setattr(leaderboard, "totals", {})
+    monkeypatch.setattr(leaderboard, "counts", {})
+    monkeypatch.setattr(leaderboard, "ranking", [])
+    for counters in (leaderboard.window_amounts, leaderboard.window_counts):
+        for name, (window, resolution) in leaderboard.WINDOWS.items():
+            monkeypatch.setitem(counters, name, WindowCounter(window, resolution))
+    for key in leaderboard.leaderboard_stats:
+        monkeypatch.setitem(leaderboard.leaderboard_stats, key, type(leaderboard.leaderboard_stats[key])())
+
+
+def donate(user, amount):
+    return leaderboard.record({"type": "donation", "user": user, "amount": amount})
+
+
+def ranks(delta):
+    return [(entry["rank"], entry["user"], entry["total"]) for entry in delta["ranks"]]
+
+
+def test_total_change_without_rank_change_sends_a_delta():
+    donate("a", 50)
+    donate("b", 10)
+    assert ranks(donate("b", 5)) == [(2, "b", 15.0)]
+    assert ranks(donate("a", 1)) == [(1, "a", 51.0)]
+
+
+def test_overtaking_sends_the_shifted_positions():
+    for user, amount in (("a", 30), ("b", 20), ("c", 10), ("d", 5)):
+        donate(user, amount)
+    assert ranks(donate("c", 25)) == [(1, "c", 35.0), (2, "a", 30.0), (3, "b", 20.0)]
+    assert ranks(donate("d", 100)) == [
+        (1, "d", 105.0), (2, "c", 35.0), (3, "a", 30.0), (4, "b", 20.0)
+    ]
+
+
+def test_new_user_entering_the_top_shifts_down_to_its_end(monkeypatch):
+    monkeypatch.setattr(leaderboard, "TOP_K", 3)
+    for user, amount in (("a", 30), ("b", 20), ("c", 10)):
+        donate(user, amount)
+    assert ranks(donate("n", 15)) == [(3, "n", 15.0)]
+    assert donate("z", 1) is None
+
+
+def test_ranking_is_bounded_and_exact(monkeypatch):
+    monkeypatch.setattr(leaderboard, "RANKED", 20)
+    monkeypatch.setattr(leaderboard, "TOP_K", 5)
+    rng = random.Random(7)
+    for _ in range(3000):
+        donate(f"u{rng.randrange(200)}", rng.choice([1, 2.5, 10, 40]))
+
+    assert len(leaderboard.ranking) == 20
+    expected = sorted((-total, user) for user, total in leaderboard.totals.items())[:20]
+    assert leaderboard.ranking == expected
+    assert [entry["user"] for entry in leaderboard.get_leaderboard(20)["top"]] == [user for _, user in expected]
+
+
+def test_get_user_rank_is_null_outside_the_ranking(monkeypatch):
+    monkeypatch.setattr(leaderboard, "RANKED", 2)
+    for user, amount in (("a", 30), ("b", 20), ("c", 10)):
+        donate(user, amount)
+    assert leaderboard.get_user("b") == {"rank": 2, "user": "b", "total": 20.0, "count": 1}
+    assert leaderboard.get_user("c") == {"rank": None, "user": "c", "total": 10.0, "count": 1}
+    assert leaderboard.get_user("nobody") is None
+    # Vuelve a entrar al superar al último
+    donate("c", 15)
+    assert leaderboard.get_user("c")["rank"] == 2
+    assert leaderboard.get_user("b")["rank"] is None
+
+
+def test_non_donations_are_ignored():
+    assert donate("", 5) is None
+    assert donate("a", -1) is None
+    assert leaderboard.record({"type": "walker", "user": "a"}) is None
+    assert leaderboard.totals == {}
+
+
+def test_each_app_lifetime_counts_a_donation_once(run, app_factory):
+    async def lifetime():
+        client = await app_factory()
+        try:
+            response = await client.post("/simulate_donation", json={"type": "donation", "user": "ana", "amount": 5})
+            assert response.status == 200
+            response = await client.get("/leaderboard", params={"user": "ana"})
+            return await response.json()
+        finally:
+            await client.close()
+
+    # La segunda app del proceso reconstruye desde el ledger de la primera
+    assert run(lifetime())["total"] == 5.0
+    assert run(lifetime()) == {"rank": 1, "user": "ana", "total": 10.0, "count": 2}
@@ -0,0 +1,109 @@
+# tests/test_liveness.py
+"""Rueda de tiempo de liveness: pings repartidos y detección de clientes muertos"""
+import asyncio
+import types
+
+import pytest
+
+from backend import event_dispatcher
+from backend import liveness
+
+
+class FakeRecord:
+    def __init__(self, client_id, closed=False, ping_error=False):
+        self.id = client_id
+        self.ws = types.SimpleNamespace(closed=closed, pings=0)
+        self.ping_error = ping_error
+
+        async def ping():
+            if self.ping_error:
+                raise ConnectionResetError("reset")
+            self.ws.pings += 1
+
+        self.ws.ping = ping
+
+
+@pytest.fixture
+def wheel(monkeypatch):
+    """Rueda vacía, reloj controlado y registro de los clientes dados por muertos"""
+    now = types.SimpleNamespace(value=1000.0)
+    dead = []
+    monkeypatch.setattr(liveness, "time", types.SimpleNamespace(monotonic=lambda: now.value))
+    monkeypatch.setattr(liveness, "wheel", [set() for _ in range(liveness.WHEEL_SLOTS)])
+    monkeypatch.setattr(liveness, "cursor", 0)
+    monkeypatch.setattr(liveness, "_dead_handler", lambda record, reason: dead.append((record.id, reason)))
+    return types.SimpleNamespace(clock=now, dead=dead)
+
+
+def full_turn(run):
+    """Una vuelta completa de la rueda; retorna los pings enviados"""
+    return sum(run(liveness.tick()) for _ in range(liveness.WHEEL_SLOTS))
+
+
+def test_clients_are_spread_by_id(wheel, run):
+    records = [FakeRecord(client_id) for client_id in range(1, 4)]
+    for record in records:
+        liveness.watch(record)
+    assert [len(slot) for slot in liveness.wheel[:4]] == [0, 1, 1, 1]
+    wheel.clock.value += liveness.PING_INTERVAL
+    # Cada tick revisa una sola ranura
+    assert [run(liveness.tick()) for _ in range(4)] == [0, 1, 1, 1]
+    liveness.unwatch(records[0])
+    assert liveness.tracked() == 2
+
+
+def test_recent_traffic_skips_the_ping(wheel, run):
+    liveness.watch(FakeRecord(1))
+    wheel.clock.value += liveness.PING_INTERVAL / 2
+    assert full_turn(run) == 0
+
+
+def test_silent_client_is_pinged_then_reaped(wheel, run):
+    record = FakeRecord(1)
+    liveness.watch(record)
+    wheel.clock.value += liveness.PING_INTERVAL
+    assert full_turn(run) == 1 and record.ws.pings == 1
+    wheel.clock.value += liveness.PING_INTERVAL
+    assert full_turn(run) == 0
+    assert wheel.dead == [(1, "ping_timeout")] and liveness.tracked() == 0
+
+
+def test_answer_to_the_ping_keeps_it_alive(wheel, run):
+    record = FakeRecord(1)
+    liveness.watch(record)
+    wheel.clock.value += liveness.PING_INTERVAL
+    full_turn(run)
+    record.last_received = wheel.clock.value + 1      # llegó el pong
+    wheel.clock.value += liveness.PING_INTERVAL / 2
+    full_turn(run)
+    assert wheel.dead == [] and record.ping_sent_at is None
+
+
+def test_outgoing_traffic_delays_the_ping_up_to_max_silence(wheel, run):
+    record = FakeRecord(1)
+    liveness.watch(record)
+    wheel.clock.value += liveness.MAX_SILENCE - 1
+    record.last_sent = wheel.clock.value
+    assert full_turn(run) == 0
+    wheel.clock.value += 1
+    record.last_sent = wheel.clock.value
+    assert full_turn(run) == 1
+
+
+def test_closed_sockets_and_ping_errors(wheel, run):
+    liveness.watch(FakeRecord(1, closed=True))
+    liveness.watch(FakeRecord(2, ping_error=True))
+    wheel.clock.value += liveness.PING_INTERVAL
+    assert full_turn(run) == 1
+    assert wheel.dead == [(1, "closed")]
+
+
+def test_dispatcher_removes_dead_clients(run, fake_clients):
+    async def scenario():
+        ws = await fake_clients()
+        record = event_dispatcher.get_client(ws)
+        liveness._dead(record, "ping_timeout")
+        await asyncio.sleep(0)
+        return event_dispatcher.get_client(ws), ws.close_code
+
+    assert run(scenario()) == (None, 1001)
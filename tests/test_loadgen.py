@@ -0,0 +1,59 @@
+# tests/test_loadgen.py
+"""Generador de carga: percentiles, etiquetado de eventos y fuentes de tráfico"""
+import json
+
+import pytest
+
+from backend import event_schemas
+from benchmarks import loadgen
+
+
+def test_percentiles():
+    assert loadgen.percentiles([]) == {"count": 0}
+    values = [i / 1000 for i in range(1, 101)]      # 1..100 ms
+    assert loadgen.percentiles(values) == {
+        "count": 100, "p50": 51.0, "p95": 96.0, "p99": 100.0, "max": 100.0, "mean": 50.5
+    }
+
+
+@pytest.mark.parametrize("event", [
+    {"type": "walker", "user": "Viewer"},
+    {"type": "donation", "amount": 5, "user": "Viewer"},
+    {"type": "promo", "text": "hola"},
+])
+def test_tags_survive_server_validation(event):
+    tagged = loadgen.tag_event(event, 42)
+    assert "bench" not in json.dumps(event)
+    is_valid, error, sanitized = event_schemas.validate_event(tagged)
+    assert is_valid, error
+    assert loadgen.extract_tag(sanitized) == 42
+
+
+def test_untagged_events_have_no_id():
+    assert loadgen.extract_tag({"type": "donation", "message": "hola"}) is None
+
+
+def test_synthetic_events_keep_a_constant_rate():
+    events = list(loadgen.synthetic_events(rate=10, duration=2, walker_ratio=1.0))
+    assert len(events) == 20
+    assert [offset for offset, _ in events[:3]] == [0.0, 0.1, 0.2]
+    assert all(event["type"] == "walker" for _, event in events)
+
+
+def test_trace_offsets_and_speed(tmp_path):
+    trace = tmp_path / "trace.ndjson"
+    trace.write_text("\n".join([
+        json.dumps({"t": 2, "type": "walker", "seq": 9}),
+        "",
+        json.dumps({"event": {"t": 4, "type": "donation", "amount": 1}}),
+    ]))
+    events = list(loadgen.trace_events(str(trace), speed=2))
+    assert events == [(1.0, {"type": "walker"}), (2.0, {"type": "donation", "amount": 1})]
+
+
+def test_trace_timestamps_are_relative_to_the_first(tmp_path):
+    trace = tmp_path / "trace.ndjson"
+    trace.write_text("\n".join(json.dumps({"timestamp": stamp, "type": "walker"}) for stamp in (
+        "2024-01-01T10:00:00", "2024-01-01T10:00:03"
+    )))
+    assert [offset for offset, _ in loadgen.trace_events(str(trace), speed=1)] == [0.0, 3.0]
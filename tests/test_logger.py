@@ -0,0 +1,79 @@
+# tests/test_logger.py
+"""Logger no bloqueante: niveles, formato, muestreo y descarte bajo presión"""
+import io
+import json
+import re
+
+import pytest
+
+from backend.utils import logger
+
+
+@pytest.fixture
+def output(monkeypatch):
+    """Salida del hilo escritor capturada en memoria"""
+    logger.flush()
+    stream = io.StringIO()
+    monkeypatch.setattr(logger, "_stream", stream)
+    monkeypatch.setattr(logger, "_min_level", logger.LEVELS["info"])
+    monkeypatch.setattr(logger, "JSON_LINES", False)
+    yield stream
+    logger.flush()
+
+
+def written(stream):
+    logger.flush()
+    return stream.getvalue().splitlines()
+
+
+def test_text_lines_and_level_filter(output):
+    logger.log("visible")
+    logger.log("oculto", level="debug")
+    logger.log("alerta", level="warning")
+    lines = written(output)
+    assert [line.split("] ", 1)[1] for line in lines] == ["visible", "alerta"]
+    assert re.fullmatch(r"\[\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\] visible", lines[0])
+    assert not logger.is_enabled("debug") and logger.is_enabled("error")
+
+
+def test_json_lines_include_extra_fields(output, monkeypatch):
+    monkeypatch.setattr(logger, "JSON_LINES", True)
+    logger.log("donación", level="warning", user="ana", amount=5)
+    entry, = (json.loads(line) for line in written(output))
+    assert entry["msg"] == "donación" and entry["level"] == "warning"
+    assert (entry["user"], entry["amount"]) == ("ana", 5)
+    assert re.fullmatch(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}", entry["ts"])
+
+
+def test_sampling(output, monkeypatch):
+    monkeypatch.setattr(logger, "JSON_LINES", True)
+    logger.log_sampled("nunca", rate=0)
+    logger.log_sampled("siempre", rate=1)
+    entry, = (json.loads(line) for line in written(output))
+    assert entry["msg"] == "siempre" and entry["sampled"] is True
+
+
+def test_full_queue_drops_instead_of_blocking(output, monkeypatch):
+    monkeypatch.setattr(logger, "MAX_QUEUE", 0)
+    dropped = logger.log_stats["dropped"]
+    logger.log("perdido")
+    assert logger.log_stats["dropped"] == dropped + 1
+    assert written(output) == []
+
+
+def test_write_errors_count_as_dropped(output, monkeypatch):
+    class BrokenStream:
+        def write(self, text):
+            raise OSError("disco lleno")
+
+    monkeypatch.setattr(logger, "_stream", BrokenStream())
+    dropped = logger.log_stats["dropped"]
+    logger.log("uno")
+    logger.log("dos")
+    logger.flush()
+    assert logger.log_stats["dropped"] == dropped + 2
+
+
+def test_configure_rejects_unknown_levels():
+    with pytest.raises(ValueError):
+        logger.configure(level="verbose")
@@ -0,0 +1,112 @@
+# tests/test_rate_limiter.py
+"""Token buckets, LRU acotado, barrido de claves inactivas y límites por ruta/sala"""
+import types
+
+import pytest
+
+from backend import donation_api
+from backend import rate_limiter
+from backend.rate_limiter import TokenBucket, TokenBucketLimiter, WindowCounter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj monotónico controlado por el test"""
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(rate_limiter, "time", types.SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+# ==========================================
+# TOKEN BUCKET
+# ==========================================
+def test_token_bucket_burst_and_refill():
+    bucket = TokenBucket(rate=2, burst=3)
+    start = bucket.stamp
+    assert [bucket.take(now=start) for _ in range(4)] == [True, True, True, False]
+    assert not bucket.take(now=start + 0.4)
+    assert bucket.take(now=start + 0.5)
+    # Nunca acumula más que la ráfaga
+    assert [bucket.take(now=start + 100) for _ in range(4)] == [True, True, True, False]
+
+
+def test_limiter_rejects_over_capacity_and_refills(clock):
+    limiter = TokenBucketLimiter(requests=5, window=10)
+    assert [limiter.allow("ip") for _ in range(6)] == [True] * 5 + [False]
+    assert limiter.allow("other")
+    clock.value += 2          # 5 tokens / 10 s -> 1 token
+    assert limiter.allow("ip")
+    assert not limiter.allow("ip")
+    assert (limiter.allowed, limiter.rejected) == (7, 2)
+
+
+def test_limiter_cost():
+    limiter = TokenBucketLimiter(requests=10, window=60)
+    assert limiter.allow("ip", cost=8)
+    assert not limiter.allow("ip", cost=3)
+    assert limiter.allow("ip", cost=2)
+
+
+# ==========================================
+# MEMORIA ACOTADA
+# ==========================================
+def test_lru_eviction_keeps_recently_used_keys(clock):
+    limiter = TokenBucketLimiter(requests=1, window=60, max_keys=3)
+    for key in ("a", "b", "c"):
+        assert limiter.allow(key)
+    limiter.allow("a")        # "a" pasa a ser la más reciente
+    limiter.allow("d")        # expulsa "b"
+    assert len(limiter) == 3 and limiter.evicted == 1
+    assert not limiter.allow("a")
+    # "b" fue olvidada: vuelve con la cubeta llena
+    assert limiter.allow("b")
+
+
+def test_sweep_removes_only_idle_keys(clock):
+    limiter = TokenBucketLimiter(requests=1, window=10)
+    limiter.allow("old")
+    clock.value += 6
+    limiter.allow("recent")
+    clock.value += 5
+    assert limiter.sweep() == 1
+    assert len(limiter) == 1
+    assert not limiter.allow("recent")
+
+
+# ==========================================
+# RUTAS Y SALAS
+# ==========================================
+def test_unknown_routes_and_disabled_limits_always_pass(monkeypatch):
+    assert rate_limiter.check_route("/no-such-route", "ip")
+    rate_limiter.limiters["/t"] = TokenBucketLimiter(requests=1, window=60)
+    try:
+        assert rate_limiter.check_route("/t", "ip")
+        assert not rate_limiter.check_route("/t", "ip")
+        monkeypatch.setattr(rate_limiter, "RATE_LIMITS_ENABLED", False)
+        assert rate_limiter.check_route("/t", "ip")
+    finally:
+        del rate_limiter.limiters["/t"]
+
+
+def test_each_room_has_its_own_per_ip_budget():
+    limit = donation_api.RATE_LIMIT_REQUESTS
+    assert all(donation_api.check_rate_limit("1.2.3.4") for _ in range(limit))
+    assert not donation_api.check_rate_limit("1.2.3.4")
+    assert donation_api.check_rate_limit("1.2.3.4", room="sala")
+    assert donation_api.check_rate_limit("5.6.7.8")
+
+
+# ==========================================
+# VENTANA DESLIZANTE
+# ==========================================
+def test_window_counter_slides():
+    counter = WindowCounter(window=60, resolution=10)
+    counter.add(1, now=0)
+    counter.add(2, now=35)
+    assert counter.total(now=59) == 3
+    assert counter.total(now=65) == 2
+    assert counter.total(now=100) == 0
+    # Un evento más viejo que la cubeta ya reutilizada se descarta
+    counter.add(5, now=100)
+    counter.add(7, now=40)
+    assert counter.total(now=100) == 5
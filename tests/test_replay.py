@@ -0,0 +1,116 @@
+# tests/test_replay.py
+"""Números de secuencia, buffer de replay y reanudación con ?since="""
+import pytest
+
+from backend import event_dispatcher
+from backend.event_dispatcher import Room, get_missed_events
+
+
+@pytest.fixture
+def room(monkeypatch):
+    """Sala con los eventos 1..5 en un buffer de 4 (el 1 ya salió)"""
+    monkeypatch.setattr(event_dispatcher, "REPLAY_BUFFER_SIZE", 4)
+    room = Room("replay")
+    for seq in range(1, 6):
+        room.last_seq = seq
+        event_dispatcher._remember(room, {"type": "walker", "seq": seq})
+    return room
+
+
+def seqs(events):
+    return [event["seq"] for event in events]
+
+
+# ==========================================
+# BUFFER
+# ==========================================
+@pytest.mark.parametrize("since, expected", [
+    (5, []), (4, [5]), (2, [3, 4, 5]), (1, [2, 3, 4, 5]),
+])
+def test_missed_events_within_the_buffer(room, since, expected):
+    assert seqs(get_missed_events(since, room)) == expected
+
+
+@pytest.mark.parametrize("since", [0, 6])
+def test_gap_outside_the_buffer_needs_a_resync(room, since):
+    # 0: ya salió del buffer; 6: el servidor se reinició y la secuencia volvió a empezar
+    assert get_missed_events(since, room) is None
+
+
+def test_old_events_expire(room, monkeypatch):
+    monkeypatch.setattr(event_dispatcher, "REPLAY_MAX_AGE", -1)
+    assert get_missed_events(4, room) is None
+    assert not room.replay_buffer
+
+
+# ==========================================
+# RECONEXIÓN
+# ==========================================
+async def _session(client, since=None):
+    ws = await client.ws_connect("/ws" if since is None else f"/ws?since={since}")
+    hello = await ws.receive_json(timeout=2)
+    return ws, hello
+
+
+def test_reconnect_receives_only_the_missed_events(run, app_factory):
+    async def scenario():
+        client = await app_factory()
+        try:
+            ws, hello = await _session(client)
+            await event_dispatcher.broadcast({"type": "promo", "n": 1})
+            seen = (await ws.receive_json(timeout=2))["seq"]
+            await ws.close()
+            for n in (2, 3):
+                await event_dispatcher.broadcast({"type": "promo", "n": n})
+
+            ws, hello = await _session(client, since=seen)
+            catch_up = await ws.receive_json(timeout=2)
+            await ws.close()
+
+            ws, _ = await _session(client, since=seen + 2)
+            await event_dispatcher.broadcast({"type": "promo", "n": 4})
+            live = await ws.receive_json(timeout=2)
+            await ws.close()
+            return seen, hello, catch_up, live
+        finally:
+            await client.close()
+
+    seen, hello, catch_up, live = run(scenario())
+    assert hello["last_seq"] == seen + 2
+    assert catch_up["type"] == "batch" and catch_up["catch_up"] is True
+    assert [(event["n"], event["seq"]) for event in catch_up["events"]] == [(2, seen + 1), (3, seen + 2)]
+    # Al día: sin lote de catch-up, sigue en vivo
+    assert (live["n"], live["seq"]) == (4, seen + 3)
+
+
+def test_reconnect_after_a_restart_gets_a_resync(run, app_factory):
+    async def scenario():
+        client = await app_factory()
+        try:
+            ws, hello = await _session(client, since=10 ** 9)
+            message = await ws.receive_json(timeout=2)
+            await ws.close()
+            return hello, message
+        finally:
+            await client.close()
+
+    hello, message = run(scenario())
+    assert message == {"type": "resync", "reason": "gap_too_old", "last_seq": hello["last_seq"]}
+
+
+# ==========================================
+# CONFIRMACIONES
+# ==========================================
+def test_acks_never_go_back(run, fake_clients):
+    async def scenario():
+        ws = await fake_clients()
+        room = event_dispatcher.default_room
+        for n in range(3):
+            event_dispatcher.deliver_local({"type": "promo", "n": n})
+        last = room.last_seq
+        results = [event_dispatcher.record_ack(ws, seq) for seq in (last - 1, last - 2, last + 1)]
+        return results, event_dispatcher.get_client(ws).to_dict()
+
+    results, client = run(scenario())
+    assert results == [True, True, False]
+    assert client["ack_lag"] == 1
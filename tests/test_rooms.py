@@ -0,0 +1,69 @@
+# tests/test_rooms.py
+"""Cupo de ingesta por sala: solo lo consumen los eventos válidos"""
+import uuid
+
+import pytest
+
+from backend import event_dispatcher
+
+
+@pytest.fixture
+def room_name(monkeypatch):
+    """Sala nueva con cupo para dos eventos (sin recarga durante el test)"""
+    monkeypatch.setattr(event_dispatcher, "ROOM_EVENT_BURST", 2)
+    monkeypatch.setattr(event_dispatcher, "ROOM_EVENT_RATE", 0.001)
+    return f"t-{uuid.uuid4().hex[:8]}"
+
+
+def test_invalid_requests_do_not_spend_the_room_budget(run, app_factory, room_name):
+    path = f"/rooms/{room_name}/simulate_donation"
+
+    async def scenario():
+        client = await app_factory()
+        try:
+            statuses = []
+            for kwargs in (
+                {"data": b"{not json", "headers": {"Content-Type": "application/json"}},
+                {"json": {"type": "donation", "amount": -1}},
+                {"json": {"type": "donation", "amount": "abc"}},
+                {"json": {"type": "walker", "user": "a"}},
+                {"json": {"type": "walker", "user": "b"}},
+                {"json": {"type": "walker", "user": "c"}},
+            ):
+                response = await client.post(path, **kwargs)
+                statuses.append((response.status, (await response.json())["status"]))
+            return statuses, event_dispatcher.rooms[room_name].aggregates["rejected_events"]
+        finally:
+            await client.close()
+
+    statuses, rejected = run(scenario())
+    assert statuses == [(400, "error")] * 3 + [(200, "ok")] * 2 + [(429, "error")]
+    assert rejected == 1
+
+
+def test_ws_actions_spend_the_budget_only_when_valid(run, app_factory, room_name):
+    async def scenario():
+        client = await app_factory()
+        try:
+            ws = await client.ws_connect(f"/ws/{room_name}")
+            results = []
+            for index, event in enumerate([
+                {"type": "donation", "amount": 0},
+                {"type": "walker", "user": "a"},
+                {"type": "walker", "user": "b"},
+                {"type": "walker", "user": "c"},
+            ]):
+                await ws.send_json({"type": "action", "id": index, "event": event})
+                while True:
+                    message = await ws.receive_json(timeout=2)
+                    if message.get("type") == "action_result":
+                        results.append(message.get("message", message["status"]))
+                        break
+            await ws.close()
+            return results
+        finally:
+            await client.close()
+
+    assert run(scenario()) == [
+        "Amount must be positive", "ok", "ok", "Room rate limit exceeded"
+    ]
@@ -0,0 +1,108 @@
+# tests/test_static_assets.py
+"""Frontend servido por el backend: build, ETag/304 y elección de gzip"""
+import gzip
+
+import pytest
+
+from backend import main
+from backend import static_assets
+from backend.static_assets import accepts_gzip
+
+SCRIPT = b"console.log('overlay');\n" * 100      # supera GZIP_MIN_BYTES
+
+
+@pytest.fixture
+def frontend(tmp_path, monkeypatch, app_factory):
+    """App con un frontend mínimo construido en tmp_path"""
+    source = tmp_path / "frontend"
+    (source / "js").mkdir(parents=True)
+    (source / "index.html").write_bytes(b"<html><head></head><body>overlay</body></html>")
+    (source / "js" / "app.js").write_bytes(SCRIPT)
+    monkeypatch.setattr(static_assets, "FRONTEND_DIR", source)
+    monkeypatch.setattr(static_assets, "BUILD_DIR", tmp_path / "static")
+    monkeypatch.setattr(static_assets, "assets", {})
+    monkeypatch.setattr(static_assets, "index_asset", None)
+    monkeypatch.setattr(static_assets, "build_id", "")
+    monkeypatch.setitem(main.CONFIG, "frontend", True)
+    return app_factory
+
+
+async def fetch(client, path, **headers):
+    response = await client.get(path, headers=headers, auto_decompress=False)
+    return response.status, response.headers, await response.read()
+
+
+# ==========================================
+# ACCEPT-ENCODING
+# ==========================================
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True), ("gzip, deflate, br", True), ("GZIP;q=0.5", True),
+    ("x-gzip", True), ("*", True), ("deflate, *;q=0.1", True),
+    ("", False), ("deflate, br", False), ("gzip;q=0", False), ("gzip; q=0.000", False),
+    ("*;q=0", False), ("gzip;q=0, *", False), ("*;q=0, gzip", True),
+    ("gzipx", False), ("gzip;q=abc", False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+# ==========================================
+# SERVICIO
+# ==========================================
+def test_gzip_variant_follows_accept_encoding(run, frontend):
+    async def scenario():
+        client = await frontend()
+        try:
+            path = f"{static_assets.STATIC_PREFIX}/{static_assets.build_id}/js/app.js"
+            return (
+                await fetch(client, path, **{"Accept-Encoding": "gzip"}),
+                await fetch(client, path, **{"Accept-Encoding": "gzip;q=0, deflate"}),
+            )
+        finally:
+            await client.close()
+
+    (status, headers, body), (plain_status, plain_headers, plain_body) = run(scenario())
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(body) == SCRIPT
+    assert headers["Cache-Control"] == static_assets.IMMUTABLE_CACHE
+    assert headers["Vary"] == "Accept-Encoding"
+    assert plain_status == 200 and "Content-Encoding" not in plain_headers
+    assert plain_body == SCRIPT
+    # Cada variante tiene su propio ETag
+    assert headers["ETag"] != plain_headers["ETag"]
+
+
+def test_matching_etag_gets_304(run, frontend):
+    async def scenario():
+        client = await frontend()
+        try:
+            status, headers, _ = await fetch(client, "/", **{"Accept-Encoding": "identity"})
+            etag = headers["ETag"]
+            return (
+                etag,
+                await fetch(client, "/", **{"If-None-Match": etag}),
+                await fetch(client, "/", **{"If-None-Match": '"other"'}),
+            )
+        finally:
+            await client.close()
+
+    etag, (status, headers, body), (other_status, _, other_body) = run(scenario())
+    assert status == 304 and body == b"" and headers["ETag"] == etag
+    assert other_status == 200 and b"<base href=" in other_body
+
+
+def test_old_build_gets_current_content_without_immutable_cache(run, frontend):
+    async def scenario():
+        client = await frontend()
+        try:
+            return (
+                await fetch(client, f"{static_assets.STATIC_PREFIX}/oldbuild/js/app.js", **{"Accept-Encoding": "identity"}),
+                await fetch(client, f"{static_assets.STATIC_PREFIX}/{static_assets.build_id}/missing.js"),
+            )
+        finally:
+            await client.close()
+
+    (status, headers, body), (missing, _, _) = run(scenario())
+    assert status == 200 and body == SCRIPT
+    assert headers["Cache-Control"] == static_assets.REVALIDATE_CACHE
+    assert missing == 404
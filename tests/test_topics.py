@@ -0,0 +1,126 @@
+# tests/test_topics.py
+"""Suscripciones por tipo de evento: índice tipo -> clientes y frames por grupo"""
+import pytest
+
+from backend import event_dispatcher
+from backend.event_dispatcher import parse_topics, subscribe, unsubscribe
+
+
+# ==========================================
+# VALIDACIÓN
+# ==========================================
+@pytest.mark.parametrize("raw, expected", [
+    ("donation,walker", ["donation", "walker"]), (["donation"], ["donation"]),
+    ([], []), (["donation", "*"], None), ("*", None),
+])
+def test_parse_topics(raw, expected):
+    assert parse_topics(raw) == expected
+
+
+@pytest.mark.parametrize("raw", [
+    [1], {"donation": True}, ["x"] * (event_dispatcher.MAX_TOPICS_PER_CLIENT + 1),
+    ["x" * (event_dispatcher.MAX_TOPIC_LENGTH + 1)],
+])
+def test_parse_topics_rejects(raw):
+    with pytest.raises(ValueError):
+        parse_topics(raw)
+
+
+# ==========================================
+# ÍNDICE
+# ==========================================
+def test_index_follows_subscription_changes(run, fake_clients):
+    async def scenario():
+        ws = await fake_clients()
+        room = event_dispatcher.default_room
+        steps = [(ws in room.wildcard_clients, dict(room.topic_index))]
+        subscribe(ws, ["donation", "walker"])
+        steps.append((ws in room.wildcard_clients, {topic: set(clients) for topic, clients in room.topic_index.items()}))
+        unsubscribe(ws, ["walker"])
+        steps.append((ws in room.wildcard_clients, {topic: set(clients) for topic, clients in room.topic_index.items()}))
+        subscribe(ws, None)
+        steps.append((ws in room.wildcard_clients, dict(room.topic_index)))
+        return ws, steps
+
+    ws, steps = run(scenario())
+    assert steps == [
+        (True, {}),
+        (False, {"donation": {ws}, "walker": {ws}}),
+        (False, {"donation": {ws}}),
+        (True, {}),
+    ]
+
+
+def test_unsubscribe_does_not_narrow_a_wildcard_client(run, fake_clients):
+    async def scenario():
+        ws = await fake_clients()
+        return unsubscribe(ws, ["walker"]), event_dispatcher.get_client(ws).topics
+
+    assert run(scenario()) == (None, None)
+
+
+# ==========================================
+# ENTREGA
+# ==========================================
+def test_events_reach_only_subscribed_clients(run, fake_clients):
+    async def scenario():
+        everything = await fake_clients()
+        donations = await fake_clients()
+        promos = await fake_clients()
+        subscribe(donations, ["donation"])
+        subscribe(promos, ["promo"])
+        event_dispatcher.deliver_local({"type": "donation", "user": "a", "amount": 1})
+        event_dispatcher.deliver_local({"type": "promo"})
+        return [await ws.settle() for ws in (everything, donations, promos)]
+
+    everything, donations, promos = run(scenario())
+    assert [message["type"] for message in everything] == ["donation", "promo"]
+    assert [message["type"] for message in donations] == ["donation"]
+    assert [message["type"] for message in promos] == ["promo"]
+
+
+def test_batches_are_filtered_per_subscription_group(run, fake_clients):
+    async def scenario():
+        everything = await fake_clients()
+        donations = await fake_clients()
+        both = await fake_clients()
+        subscribe(donations, ["donation"])
+        subscribe(both, ["donation", "promo"])
+        event_dispatcher.deliver_local_many([
+            {"type": "donation", "user": "a", "amount": 1},
+            {"type": "promo"},
+            {"type": "donation", "user": "b", "amount": 2},
+        ])
+        return [await ws.settle() for ws in (everything, donations, both)]
+
+    everything, donations, both = run(scenario())
+    assert [len(frame["events"]) for frame in everything + both] == [3, 3]
+    frame, = donations
+    assert [event["user"] for event in frame["events"]] == ["a", "b"]
+
+
+def test_subscribe_message_over_the_socket(run, app_factory):
+    async def scenario():
+        client = await app_factory()
+        try:
+            ws = await client.ws_connect("/ws?topics=walker")
+            await ws.receive_json(timeout=2)
+            await ws.send_json({"type": "subscribe", "topics": ["promo", "donation"]})
+            subscribed = await ws.receive_json(timeout=2)
+            await ws.send_json({"type": "unsubscribe", "topics": ["donation"]})
+            unsubscribed = await ws.receive_json(timeout=2)
+            await ws.send_json({"type": "subscribe", "topics": "x" * 100})
+            error = await ws.receive_json(timeout=2)
+            await event_dispatcher.broadcast({"type": "walker", "user": "a"})
+            await event_dispatcher.broadcast({"type": "promo"})
+            event = await ws.receive_json(timeout=2)
+            await ws.close()
+            return subscribed, unsubscribed, error, event
+        finally:
+            await client.close()
+
+    subscribed, unsubscribed, error, event = run(scenario())
+    assert subscribed == {"type": "subscribed", "topics": ["donation", "promo"]}
+    assert unsubscribed == {"type": "subscribed", "topics": ["promo"]}
+    assert error["type"] == "error"
+    assert event["type"] == "promo"
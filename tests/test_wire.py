@@ -0,0 +1,159 @@
+# tests/test_wire.py
+"""Codificador MessagePack, frames compartidos y negociación del subprotocolo"""
+import json
+
+import pytest
+from aiohttp import WSMsgType
+
+from backend import event_dispatcher
+from backend import wire
+from backend.wire import packb, unpackb
+
+
+# ==========================================
+# CODIFICACIÓN (vectores de la especificación)
+# ==========================================
+@pytest.mark.parametrize("value, encoded", [
+    (None, b"\xc0"), (True, b"\xc3"), (False, b"\xc2"),
+    (0, b"\x00"), (127, b"\x7f"), (-1, b"\xff"), (-32, b"\xe0"),
+    (128, b"\xcc\x80"), (256, b"\xcd\x01\x00"), (65536, b"\xce\x00\x01\x00\x00"),
+    (2 ** 32, b"\xcf\x00\x00\x00\x01\x00\x00\x00\x00"),
+    (-33, b"\xd0\xdf"), (-129, b"\xd1\xff\x7f"), (-32769, b"\xd2\xff\xff\x7f\xff"),
+    (-2 ** 31 - 1, b"\xd3\xff\xff\xff\xff\x7f\xff\xff\xff"),
+    (12.5, b"\xca\x41\x48\x00\x00"),
+    (0.1, b"\xcb\x3f\xb9\x99\x99\x99\x99\x99\x9a"),
+    ("", b"\xa0"), ("ñ", b"\xa2\xc3\xb1"),
+    ("x" * 32, b"\xd9\x20" + b"x" * 32),
+    ("x" * 256, b"\xda\x01\x00" + b"x" * 256),
+    (b"\x01", b"\xc4\x01\x01"),
+    ([1, 2], b"\x92\x01\x02"),
+    ({"a": 1}, b"\x81\xa1a\x01"),
+])
+def test_encoding_matches_the_spec(value, encoded):
+    assert packb(value) == encoded
+    assert unpackb(encoded) == value
+
+
+@pytest.mark.parametrize("value", [
+    [0] * 16, [0] * 70000, {str(i): i for i in range(16)}, "x" * 70000, b"y" * 70000,
+    {"type": "donation", "user": "Ana", "amount": 25.0, "seq": 12, "tags": ["a", None, True]},
+])
+def test_round_trip_with_large_headers(value):
+    assert unpackb(packb(value)) == value
+
+
+def test_tuples_encode_as_arrays():
+    assert unpackb(packb((1, "a"))) == [1, "a"]
+
+
+@pytest.mark.parametrize("value, error", [
+    ({1, 2}, TypeError), (2 ** 64, OverflowError), (-2 ** 63 - 1, OverflowError),
+])
+def test_unsupported_values(value, error):
+    with pytest.raises(error):
+        packb(value)
+
+
+# ==========================================
+# DECODIFICACIÓN DE DATOS DEL CLIENTE
+# ==========================================
+@pytest.mark.parametrize("data", [
+    b"",                       # vacío
+    b"\xcd\x01",               # entero truncado
+    b"\xa5ab",                 # str truncado
+    b"\xc4\x05ab",             # bin truncado
+    b"\x92\x01",               # array incompleto
+    b"\x01\x02",               # bytes sobrantes
+    b"\xc1",                   # código reservado
+    b"\xd4\x01\x01",           # extensiones no soportadas
+    b"\x81\x90\x01",           # clave de mapa no hasheable
+    b"\x91" * 100_000,         # anidamiento excesivo
+    b"\xa2\xff\xfe",           # UTF-8 inválido
+])
+def test_malformed_input_raises_value_error(data):
+    with pytest.raises(ValueError):
+        unpackb(data)
+
+
+# ==========================================
+# FRAMES
+# ==========================================
+def test_frame_encodes_binary_once():
+    frame = wire.Frame(json.dumps({"type": "walker", "seq": 3}))
+    first = frame.binary()
+    assert frame.binary() is first
+    assert unpackb(first) == {"type": "walker", "seq": 3}
+    assert wire.as_text(frame) is frame.text
+    assert wire.as_binary(frame) is first
+
+
+def test_plain_messages_are_encoded_per_call():
+    message = json.dumps({"type": "action_result", "status": "ok"})
+    assert wire.as_text(message) is message
+    assert unpackb(wire.as_binary(message)) == json.loads(message)
+
+
+def test_unencodable_frame_falls_back_to_text_once():
+    failures = wire.encode_failures.value
+    frame = wire.Frame(json.dumps({"type": "promo", "x": 10 ** 20}))
+    assert frame.binary() == frame.text
+    assert wire.as_binary(frame) == frame.text
+    assert wire.encode_failures.value - failures == 1
+
+
+def test_msgpack_client_survives_an_unencodable_broadcast(run, app_factory):
+    async def scenario():
+        client = await app_factory()
+        try:
+            ws = await client.ws_connect("/ws", protocols=(wire.PROTOCOL_MSGPACK,))
+            await ws.receive(timeout=2)
+            await event_dispatcher.broadcast({"type": "promo", "x": 10 ** 20})
+            await event_dispatcher.broadcast({"type": "promo", "x": 1})
+            received = [await ws.receive(timeout=2) for _ in range(2)]
+            connected = len(event_dispatcher.connected_clients)
+            await ws.close()
+            return received, connected
+        finally:
+            await client.close()
+
+    (fallback, normal), connected = run(scenario())
+    assert fallback.type == WSMsgType.TEXT and json.loads(fallback.data)["x"] == 10 ** 20
+    assert normal.type == WSMsgType.BINARY and unpackb(normal.data)["x"] == 1
+    assert connected == 1
+
+
+# ==========================================
+# NEGOCIACIÓN
+# ==========================================
+async def _session(app_factory, protocols):
+    client = await app_factory()
+    try:
+        ws = await client.ws_connect("/ws", protocols=protocols)
+        first = await ws.receive(timeout=2)
+        protocol = ws.protocol
+        # Anidamiento excesivo dentro del tope de MAX_INBOUND_BYTES
+        if protocol == wire.PROTOCOL_MSGPACK:
+            await ws.send_bytes(b"\x91" * 3000)
+        else:
+            await ws.send_str("[" * 3000)
+        reply = await ws.receive(timeout=2)
+        await ws.close()
+        return protocol, first, reply
+    finally:
+        await client.close()
+
+
+def test_msgpack_subprotocol_gets_binary_frames(run, app_factory):
+    protocol, first, reply = run(_session(app_factory, (wire.PROTOCOL_MSGPACK, wire.PROTOCOL_JSON)))
+    assert protocol == wire.PROTOCOL_MSGPACK
+    assert first.type == WSMsgType.BINARY and isinstance(unpackb(first.data), dict)
+    assert reply.type == WSMsgType.BINARY
+    assert unpackb(reply.data)["message"] == "Invalid MessagePack"
+
+
+@pytest.mark.parametrize("protocols", [(), (wire.PROTOCOL_JSON,)])
+def test_json_clients_get_text_frames(run, app_factory, protocols):
+    protocol, first, reply = run(_session(app_factory, protocols))
+    assert protocol == (protocols[0] if protocols else None)
+    assert first.type == WSMsgType.TEXT and isinstance(json.loads(first.data), dict)
+    assert json.loads(reply.data)["message"] == "Invalid JSON"
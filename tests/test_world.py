@@ -0,0 +1,148 @@
+# tests/test_world.py
+"""Mundo del servidor: entidades, snapshot inicial y deltas por tick"""
+import types
+
+import pytest
+
+from backend import event_dispatcher
+from backend import main
+from backend import world
+
+
+@pytest.fixture(autouse=True)
+def empty_world(monkeypatch):
+    monkeypatch.setattr(world, "entities", {})
+    monkeypatch.setattr(world, "object_ids", [])
+    monkeypatch.setattr(world, "_changed", set())
+    monkeypatch.setattr(world, "_removed", set())
+    for name in ("walker_count", "tick", "_next_id"):
+        monkeypatch.setattr(world, name, 0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj monotónico controlado por el test"""
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(world, "time", types.SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def kinds(entities):
+    return sorted(entity["kind"] for entity in entities)
+
+
+# ==========================================
+# DELTAS
+# ==========================================
+def test_new_entities_are_sent_once(clock):
+    world.on_event({"type": "donation", "user": "ana", "amount": 60, "seq": 1})
+    delta = world.step(0.05)
+    assert delta["type"] == "world_delta" and delta["tick"] == 1
+    assert kinds(delta["upsert"]) == ["donation", "object"] and delta["remove"] == []
+    effect = next(entity for entity in delta["upsert"] if entity["kind"] == "donation")
+    assert effect["effect"] == "super"
+    # Sin cambios no hay delta
+    assert world.step(0.05) is None
+
+
+def test_continuous_movement_is_not_a_change(clock):
+    world.on_event({"type": "walker", "user": "ana", "seq": 1})
+    walker, = world.step(0.05)["upsert"]
+    assert world.step(0.05) is None
+    assert world.snapshot()["entities"][0]["x"] != walker["x"]
+
+
+def test_reaching_the_edge_sends_the_jump(clock):
+    world.on_event({"type": "walker", "user": "ana", "seq": 1})
+    world.step(0.05)
+    # Cruza el mundo entero en un tick: llega al borde y salta
+    walker, = world.step(world.WORLD_WIDTH / world.WALKER_SPEED)["upsert"]
+    assert walker["jumping"]
+
+
+def test_expired_entities_are_removed(clock):
+    world.on_event({"type": "donation", "user": "ana", "amount": 1, "seq": 1})
+    effect_id = next(iter(world.entities))
+    world.step(0.05)
+    clock.value += 10
+    assert world.step(0.05) == {"type": "world_delta", "tick": 2, "upsert": [], "remove": [effect_id]}
+    assert kinds(world.snapshot()["entities"]) == ["object"]
+
+
+def test_object_cap_removes_the_oldest(clock, monkeypatch):
+    monkeypatch.setattr(world, "MAX_OBJECTS", 2)
+    for seq in range(3):
+        world.on_event({"type": "donation", "user": "ana", "amount": 1, "seq": seq})
+    first_object = 2    # ids: efecto 1, objeto 2, efecto 3, objeto 4...
+    assert first_object not in world.object_ids and len(world.object_ids) == 2
+    assert world.step(0.05)["remove"] == [first_object]
+
+
+def test_walker_cap(clock, monkeypatch):
+    monkeypatch.setattr(world, "MAX_WALKERS", 2)
+    for seq in range(3):
+        world.on_event({"type": "walker", "user": "ana", "seq": seq})
+    assert world.walker_count == 2 and len(world.entities) == 2
+
+
+def test_entities_are_deterministic_per_seq(clock):
+    world.on_event({"type": "walker", "user": "ana", "seq": 7})
+    first = world.snapshot()["entities"]
+    world.entities.clear()
+    world.on_event({"type": "walker", "user": "ana", "seq": 7})
+    second = world.snapshot()["entities"]
+    assert [dict(entity, id=0) for entity in first] == [dict(entity, id=0) for entity in second]
+
+
+# ==========================================
+# SNAPSHOT Y DISPATCHER
+# ==========================================
+def test_snapshot_has_every_entity(clock):
+    world.on_event({"type": "walker", "user": "ana", "seq": 1})
+    world.on_event({"type": "donation", "user": "bob", "amount": 5, "seq": 2})
+    world.step(0.05)
+    snapshot = world.snapshot()
+    assert snapshot["type"] == "world_snapshot" and snapshot["tick"] == 1
+    assert snapshot["width"] == world.WORLD_WIDTH
+    assert kinds(snapshot["entities"]) == ["donation", "object", "walker"]
+
+
+def test_install_is_idempotent():
+    try:
+        world.install()
+        world.install()
+        assert event_dispatcher.event_listeners.count(world.on_event) == 1
+        assert event_dispatcher.join_listeners.count(world.snapshot) == 1
+    finally:
+        world.uninstall()
+    assert world.on_event not in event_dispatcher.event_listeners
+    assert world.snapshot not in event_dispatcher.join_listeners
+
+
+def test_clients_get_a_snapshot_then_deltas(run, app_factory, monkeypatch):
+    monkeypatch.setitem(main.CONFIG, "world", True)
+
+    async def lifetime(walkers):
+        client = await app_factory()
+        try:
+            ws = await client.ws_connect("/ws")
+            messages = [await ws.receive_json(timeout=2) for _ in range(2)]
+            snapshot = next(message for message in messages if message["type"] == "world_snapshot")
+            for seq in range(walkers):
+                await event_dispatcher.broadcast({"type": "walker", "user": f"u{seq}"})
+            message = await ws.receive_json(timeout=2)
+            while message["type"] != "world_delta":
+                message = await ws.receive_json(timeout=2)
+            await ws.close()
+            return snapshot, message
+        finally:
+            await client.close()
+
+    snapshot, delta = run(lifetime(1))
+    assert snapshot["entities"] == [] and kinds(delta["upsert"]) == ["walker"]
+    # Una segunda app en el mismo proceso no vuelve a registrar el mundo
+    world.entities.clear()
+    world.walker_count = 0
+    snapshot, delta = run(lifetime(1))
+    assert kinds(delta["upsert"]) == ["walker"]
+    assert len(world.entities) == 1
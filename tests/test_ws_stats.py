@@ -0,0 +1,55 @@
+# tests/test_ws_stats.py
+"""/ws/stats: agregados públicos, detalle por cliente solo con token de admin"""
+import pytest
+
+from backend import instrumentation
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(instrumentation, "ADMIN_TOKEN", TOKEN)
+
+
+async def _get(app_factory, path: str, headers: dict = None):
+    client = await app_factory()
+    try:
+        ws = await client.ws_connect("/ws")
+        await ws.receive_json()
+        response = await client.get(path, headers=headers or {})
+        body = await response.json()
+        await ws.close()
+        return response.status, body
+    finally:
+        await client.close()
+
+
+def test_aggregates_are_public(run, app_factory, admin_token):
+    status, body = run(_get(app_factory, "/ws/stats"))
+    assert status == 200
+    assert body["connected_clients"] == 1
+    assert "client_page" not in body
+
+
+@pytest.mark.parametrize("path", ["/ws/stats?clients=1", "/ws/stats?client=1"])
+@pytest.mark.parametrize("headers", [None, {"Authorization": "Bearer wrong"}])
+def test_client_views_require_admin(run, app_factory, admin_token, path, headers):
+    status, body = run(_get(app_factory, path, headers))
+    assert status == 403
+    assert "ip" not in str(body)
+
+
+def test_client_views_disabled_without_configured_token(run, app_factory, monkeypatch):
+    monkeypatch.setattr(instrumentation, "ADMIN_TOKEN", None)
+    status, _ = run(_get(app_factory, "/ws/stats?clients=1", {"Authorization": "Bearer None"}))
+    assert status == 403
+
+
+def test_admin_sees_client_page(run, app_factory, admin_token):
+    status, body = run(_get(app_factory, "/ws/stats?clients=1&limit=10",
+                            {"Authorization": f"Bearer {TOKEN}"}))
+    assert status == 200
+    page = body["client_page"]
+    assert page["total"] == 1
+    assert page["clients"][0]["ip"] == "127.0.0.1"